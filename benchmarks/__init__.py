@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""Benchmark harness ของ pa_core (ดู benchmarks/run.py)"""
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""ยิงคำขอ LLM พร้อมกันหลาย thread ไปที่ mock server เพื่อตรวจ client pool, semaphore และ retry/backoff
+
+    python -m benchmarks.llm_load --requests 40 --threads 16 --error-rate 0.2
+
+รายงาน latency (p50/p99), จำนวนครั้งที่ลองใหม่, คำขอที่ล้มเหลว และจำนวนคำขอพร้อมกันสูงสุดที่ server เห็น
+(ต้องไม่เกิน PA_LLM_MAX_INFLIGHT)
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.mock_llm import serve
+from pa_core import llm
+from pa_core.profiling import start_profiler
+from pa_core.prompts import build_assist_messages
+
+def _one(i: int, stream: bool) -> dict:
+    profiler = start_profiler()
+    messages = build_assist_messages(f"แผนทดสอบ {i}")
+    start = time.perf_counter()
+    error = None
+    try:
+        if stream:
+            for _ in llm.chat_stream("mock-key", messages, use_cache=False):
+                pass
+        else:
+            llm.chat("mock-key", messages, use_cache=False)
+    except Exception as e:
+        error = type(e).__name__
+    rec = profiler.records[0] if profiler.records else {}
+    return {"ms": (time.perf_counter() - start) * 1000, "retries": rec.get("retries", 0), "error": error}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--chunk-delay", type=float, default=0.005)
+    parser.add_argument("--error-rate", type=float, default=0.2)
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--no-stream", action="store_true")
+    args = parser.parse_args(argv)
+
+    server = serve(latency=args.latency, chunk_delay=args.chunk_delay, error_rate=args.error_rate,
+                   error_status=args.error_status)
+    llm.TYPHOON_BASE_URL = server.base_url
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        results = list(pool.map(lambda i: _one(i, not args.no_stream), range(args.requests)))
+    wall = time.perf_counter() - start
+    server.shutdown()
+
+    ms = np.array([r["ms"] for r in results])
+    report = {
+        "requests": args.requests,
+        "threads": args.threads,
+        "max_inflight_limit": llm.LLM_MAX_INFLIGHT,
+        "server": server.stats,
+        "wall_s": wall,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "retries": sum(r["retries"] for r in results),
+        "failed": [r["error"] for r in results if r["error"]],
+        "clients": len(llm._CLIENTS),
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""Mock server แบบ OpenAI-compatible (/v1/chat/completions) สำหรับทดสอบ pa_core.llm โดยไม่ต้องใช้ API จริง
+
+รองรับทั้งแบบปกติและ stream=True (SSE) หน่วงเวลา token แรก/ระหว่าง chunk ได้ และสุ่มตอบ 429/5xx ได้
+เพื่อทดสอบ retry/backoff (หรือตอบ error เสมอเมื่อ messages มีข้อความ fail_marker) GET /stats คืนจำนวนคำขอ, error ที่ส่งไป และจำนวนคำขอพร้อมกันสูงสุดที่เห็น
+
+    python -m benchmarks.mock_llm --port 8765 --error-rate 0.2
+    PA_LLM_BASE_URL=http://127.0.0.1:8765/v1 streamlit run pa_ai_bot.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pa_core.prompts import ASSIST_SECTIONS
+
+SIXW2H_ANSWER = ("Who: หน่วยรับตรวจ\nWhom: ประชาชนในพื้นที่\nWhat: โครงการตัวอย่าง\nWhere: ทั่วประเทศ\n"
+                 "When: ปีงบประมาณ 2567\nWhy: ผลการดำเนินงานล่าช้า\nHow: ตรวจเอกสารและสัมภาษณ์\nHow Much: 10 ล้านบาท")
+ASSIST_ANSWER = "\n\n".join(f"<{tag}>\nตัวอย่าง{tag}\n</{tag}>" for _, tag in ASSIST_SECTIONS)
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, chunk_delay=0.0, error_rate=0.0, error_status=429, seed=0,
+                 fail_marker=None):
+        super().__init__(address, _Handler)
+        self.fail_marker = fail_marker
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "inflight": 0, "max_inflight": 0}
+
+    def handle_error(self, request, client_address):
+        # client ปิด connection ที่ค้างใน pool (เช่น ตอนจบ process) เป็นเรื่องปกติ ไม่ต้องพิมพ์ traceback
+        pass
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def log_message(self, *args):
+        pass
+
+    def _finish(self):
+        # ลดตัวนับก่อนส่งไบต์สุดท้าย เพื่อไม่ให้ client เริ่มคำขอถัดไปได้ก่อนที่ตัวนับจะลดลง
+        with self.server.lock:
+            self.server.stats["inflight"] -= 1
+
+    def _send_json(self, status, payload, headers=None, finish=False):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        if finish:
+            self._finish()
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        with self.server.lock:
+            self._send_json(200, dict(self.server.stats))
+
+    def do_POST(self):
+        srv = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt = json.dumps(body.get("messages", []), ensure_ascii=False)
+        with srv.lock:
+            srv.stats["requests"] += 1
+            srv.stats["inflight"] += 1
+            srv.stats["max_inflight"] = max(srv.stats["max_inflight"], srv.stats["inflight"])
+            fail = srv.rng.random() < srv.error_rate or bool(srv.fail_marker and srv.fail_marker in prompt)
+            if fail:
+                srv.stats["errors"] += 1
+        if fail:
+            self._send_json(srv.error_status, {"error": {"message": "mock error", "type": "mock"}},
+                            {"Retry-After": "0"}, finish=True)
+            return
+        time.sleep(srv.latency)
+        tags = [tag for _, tag in ASSIST_SECTIONS if f"<{tag}>" in prompt]
+        if len(tags) == 1:  # โหมดสร้างแยกส่วน (build_section_messages)
+            text = f"<{tags[0]}>\nตัวอย่าง{tags[0]}\n</{tags[0]}>"
+        else:
+            text = ASSIST_ANSWER if tags else SIXW2H_ANSWER
+        if body.get("stream"):
+            self._stream(body, text)
+        else:
+            self._send_json(200, {
+                "id": "mock", "object": "chat.completion", "created": int(time.time()), "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            }, finish=True)
+
+    def _stream(self, body, text):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        def send(payload: str):
+            data = payload.encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+        for i in range(0, len(text), 8):
+            chunk = {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": body.get("model"),
+                     "choices": [{"index": 0, "delta": {"content": text[i:i + 8]}, "finish_reason": None}]}
+            send(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+            time.sleep(self.server.chunk_delay)
+        self._finish()
+        send("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+def serve(port: int = 0, **options) -> MockLLMServer:
+    """เริ่ม mock server ใน thread พื้นหลัง (port=0 = สุ่มพอร์ตว่าง) ใช้ .base_url และ .shutdown()"""
+    server = MockLLMServer(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.3, help="วินาทีก่อนตอบ/ก่อน token แรก")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="วินาทีระหว่าง chunk ของ stream")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="สัดส่วนคำขอที่ตอบ error")
+    parser.add_argument("--error-status", type=int, default=429)
+    args = parser.parse_args(argv)
+    server = MockLLMServer(("127.0.0.1", args.port), latency=args.latency, chunk_delay=args.chunk_delay,
+                           error_rate=args.error_rate, error_status=args.error_status)
+    print(f"mock LLM ที่ {server.base_url}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""Benchmark ของ pa_core บน FindingsLibrary สังเคราะห์หลายขนาด
+
+วัด load_findings (CSV/XLSX ครั้งแรกที่แปลงเป็น Parquet และครั้งต่อไปที่อ่านจาก Parquet),
+การสร้างดัชนี (เวลา fit, peak RSS, ขนาด vocabulary/nnz, เวลาโหลดจากดิสก์)
+และ latency ของการค้นหา (p50/p99) พร้อม recall@k ต่อ backend แล้วเขียนผลเป็น JSON
+
+    python -m benchmarks.run --sizes 10000 100000 1000000
+    python -m benchmarks.run --sizes 10000 --analyzers word thai_char --baseline old.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.synthetic import make_findings, make_queries
+from pa_core.profiling import current_rss
+
+class Stage:
+    """จับเวลาและ peak RSS (สุ่มอ่านทุก 5 ms ใน thread แยก) ของช่วงโค้ดหนึ่ง"""
+
+    def __enter__(self):
+        self.start_rss = self.peak_rss = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        self.start = time.perf_counter()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(0.005):
+            self.peak_rss = max(self.peak_rss, current_rss())
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
+        self._stop.set()
+        self._thread.join()
+        self.peak_rss = max(self.peak_rss, current_rss())
+        self.peak_mb = (self.peak_rss - self.start_rss) / 1e6
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def _percentiles(latencies_ms) -> dict:
+    arr = np.asarray(latencies_ms)
+    return {"p50_ms": float(np.percentile(arr, 50)), "p99_ms": float(np.percentile(arr, 99)),
+            "mean_ms": float(arr.mean())}
+
+def _index_stats(vec, X) -> dict:
+    if hasattr(vec, "doc_freq"):
+        vocab = int(np.count_nonzero(vec.doc_freq))
+    else:
+        vocab = len(vec.vocabulary_)
+    return {"vocab": vocab, "nnz": int(X.nnz),
+            "index_mb": (X.data.nbytes + X.indices.nbytes + X.indptr.nbytes) / 1e6}
+
+def bench_size(n: int, args, workdir: str) -> list:
+    from pa_core import findings as core_findings
+    from pa_core import index as core_index
+    from pa_core.facets import FacetIndex
+    from pa_core.findings import load_findings
+    from pa_core.ranking import build_ranking_engine, recall_at_k
+
+    results = []
+    def record(stage, **metrics):
+        row = {"rows": n, "stage": stage, **metrics}
+        results.append(row)
+        print(json.dumps(row, ensure_ascii=False), flush=True)
+
+    with Stage() as st:
+        df = make_findings(n, seed=args.seed)
+    record("generate", seconds=st.seconds)
+
+    csv_path = os.path.join(workdir, f"findings-{n}.csv")
+    df.to_csv(csv_path, index=False)
+    core_findings.FINDINGS_STORE_DIR = tempfile.mkdtemp(dir=workdir, prefix="store-")
+    # ครั้งแรกอ่าน CSV และแปลงเป็น Parquet ครั้งต่อไปอ่านจาก Parquet
+    with Stage() as st:
+        loaded = load_findings(base_path=csv_path)
+    record("load_csv", seconds=st.seconds, peak_rss_mb=st.peak_mb,
+           df_mb=loaded.memory_usage(deep=True).sum() / 1e6)
+    with Stage() as st:
+        loaded = load_findings(base_path=csv_path)
+    df_mb = loaded.memory_usage(deep=True).sum() / 1e6
+    record("load_parquet", seconds=st.seconds, peak_rss_mb=st.peak_mb, df_mb=df_mb,
+           per_100k_rows_mb=df_mb * 100000 / n)
+
+    if n <= args.xlsx_max_rows:
+        xlsx_path = os.path.join(workdir, f"findings-{n}.xlsx")
+        df.to_excel(xlsx_path, index=False, sheet_name="Data")
+        with Stage() as st:
+            load_findings(base_path=None, uploaded=xlsx_path)
+        record("load_xlsx", seconds=st.seconds, peak_rss_mb=st.peak_mb)
+
+    queries, rows = make_queries(loaded, args.queries, seed=args.seed + 1)
+    # ตัวกรองตัวอย่าง: 5 ปีล่าสุด และความรุนแรง >= 4
+    with Stage() as st:
+        facets = FacetIndex.from_findings(loaded)
+    years = facets.values("year")
+    filters = {"year": facets.values_between("year", years[-1] - 4, years[-1]),
+               "severity": facets.values_between("severity", 4, 5)}
+    t = time.perf_counter()
+    facet_rows = facets.select(filters)
+    select_ms = (time.perf_counter() - t) * 1000
+    t = time.perf_counter()
+    facets.counts("unit", filters)
+    record("facets", seconds=st.seconds, select_ms=select_ms, counts_ms=(time.perf_counter() - t) * 1000,
+           selected_rows=len(facet_rows))
+    for analyzer in args.analyzers:
+        core_index.INDEX_DIR = tempfile.mkdtemp(dir=workdir, prefix=f"index-{analyzer}-")
+        core_index.reset_index_caches()
+        with Stage() as st:
+            vec, X = core_index.build_tfidf_index(loaded, analyzer)
+        record("index_fit", analyzer=analyzer, mode=core_index.INDEX_MODE, seconds=st.seconds,
+               peak_rss_mb=st.peak_mb, **_index_stats(vec, X))
+
+        core_index.reset_index_caches()
+        with Stage() as st:
+            core_index.build_tfidf_index(loaded, analyzer)
+        record("index_load", analyzer=analyzer, mode=core_index.INDEX_MODE, seconds=st.seconds)
+
+        for backend in args.backends:
+            with Stage() as st:
+                engine = build_ranking_engine(loaded, analyzer=analyzer, backend=backend)
+            latencies = []
+            for q in queries:
+                t = time.perf_counter()
+                engine.search(q, top_k=args.top_k)
+                latencies.append((time.perf_counter() - t) * 1000)
+            record("search", analyzer=analyzer, backend=backend, engine_build_s=st.seconds,
+                   **_percentiles(latencies), **{f"recall@{args.top_k}": recall_at_k(engine, queries, rows, args.top_k)})
+            latencies = []
+            for q in queries:
+                t = time.perf_counter()
+                engine.search(q, top_k=args.top_k, rows=facet_rows)
+                latencies.append((time.perf_counter() - t) * 1000)
+            record("search_filtered", analyzer=analyzer, backend=backend, selected_rows=len(facet_rows),
+                   **_percentiles(latencies))
+    return results
+
+def compare(results: list, baseline_path: str) -> None:
+    """พิมพ์อัตราส่วน (ปัจจุบัน / baseline) ของตัวชี้วัดที่เป็นเวลาและหน่วยความจำ"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    def key(r):
+        return (r["rows"], r["stage"], r.get("analyzer"), r.get("backend"))
+    base = {key(r): r for r in baseline}
+    print(f"\n--- เทียบกับ {baseline_path} (ค่า > 1 = ช้าลง/ใช้มากขึ้น) ---")
+    for r in results:
+        b = base.get(key(r))
+        if b is None:
+            continue
+        ratios = {m: r[m] / b[m] for m in r
+                  if m.endswith(("_s", "seconds", "_ms", "_mb")) and isinstance(b.get(m), (int, float)) and b[m]}
+        print(key(r), {m: round(v, 2) for m, v in ratios.items()})
+
+def main(argv=None):
+    from pa_core.analyzers import DEFAULT_ANALYZER
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--analyzers", nargs="+", default=[DEFAULT_ANALYZER])
+    parser.add_argument("--backends", nargs="+", default=["sparse", "lsa"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--xlsx-max-rows", type=int, default=100_000,
+                        help="ข้ามการวัด XLSX เมื่อจำนวนแถวเกินค่านี้ (การเขียน XLSX ขนาดใหญ่ช้ามาก)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="ไฟล์ JSON ผลลัพธ์ (ค่าเริ่มต้น benchmarks/results/)")
+    parser.add_argument("--baseline", default=None, help="ไฟล์ JSON ผลครั้งก่อนเพื่อเปรียบเทียบ")
+    args = parser.parse_args(argv)
+
+    commit = _git_commit()
+    results = []
+    with tempfile.TemporaryDirectory(prefix="pa-bench-") as workdir:
+        for n in args.sizes:
+            results.extend(bench_size(n, args, workdir))
+
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "default_analyzer": DEFAULT_ANALYZER,
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join("benchmarks", "results",
+                                         f"report-{commit or 'local'}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nบันทึกผลที่ {output}")
+    if args.baseline:
+        compare(results, args.baseline)
+
+if __name__ == "__main__":
+    main()
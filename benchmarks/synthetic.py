@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""สร้าง FindingsLibrary สังเคราะห์ตามโครงสร้างของไฟล์แม่แบบ (FINDINGS_COLUMNS)
+
+ข้อความเป็นคำภาษาไทยด้านการตรวจสอบต่อกันโดยไม่เว้นวรรคภายในวลี (เว้นวรรคระหว่างวลีแบบภาษาไทยจริง)
+แต่ละข้อตรวจพบผูกกับ "หัวข้อ" หนึ่งหัวข้อ ทำให้คำศัพท์กระจุกตัวและค้นหาเจอกันได้เหมือนข้อมูลจริง
+"""
+import numpy as np
+import pandas as pd
+
+from pa_core.findings import FINDINGS_COLUMNS
+
+WORDS = (
+    "การ จัดซื้อ จัดจ้าง งบประมาณ โครงการ แผนงาน ไม่เป็นไปตาม แผน ล่าช้า ขาด ระบบ ควบคุม ภายใน "
+    "ติดตาม ประเมินผล หน่วยงาน ข้อมูล บุคลากร เบิกจ่าย สัญญา พัสดุ ครุภัณฑ์ ก่อสร้าง ซ่อมแซม "
+    "บำรุงรักษา ไม่ครบถ้วน ไม่ถูกต้อง ไม่ทันเวลา เป้าหมาย ตัวชี้วัด ผลสัมฤทธิ์ ประสิทธิภาพ ประสิทธิผล "
+    "ความคุ้มค่า ประชาชน ผู้รับบริการ ท้องถิ่น จังหวัด อำเภอ ตำบล หมู่บ้าน เกษตรกร ผู้สูงอายุ "
+    "โรงเรียน นักเรียน โรงพยาบาล สาธารณสุข ถนน แหล่งน้ำ ชลประทาน ไฟฟ้า ประปา อาคาร ที่ดิน "
+    "คณะกรรมการ ตรวจรับ กำหนด ราคากลาง ผู้รับจ้าง ค่าปรับ ขยายเวลา เอกสาร หลักฐาน อนุมัติ "
+    "ระเบียบ กฎหมาย มาตรฐาน คู่มือ การปฏิบัติงาน ฐานข้อมูล สารสนเทศ ซ้ำซ้อน คลาดเคลื่อน "
+    "ใช้ประโยชน์ ไม่คุ้มค่า ชำรุด เสียหาย สูญหาย ทิ้งร้าง ค้างจ่าย เงินอุดหนุน รายได้ รายจ่าย "
+    "บัญชี การเงิน ตรวจสอบ ประชาสัมพันธ์ ฝึกอบรม ส่งเสริม พัฒนา อาชีพ รายได้ครัวเรือน "
+    "สิ่งแวดล้อม ขยะ น้ำเสีย ป่าไม้ ภัยแล้ง อุทกภัย ความปลอดภัย ยาเสพติด สวัสดิการ "
+    "การประสานงาน บูรณาการ ความรับผิดชอบ กำกับดูแล รายงาน ผลการดำเนินงาน ความเสี่ยง"
+).split()
+UNITS = [f"กรม{w}" for w in ["บัญชีกลาง", "ทางหลวง", "ชลประทาน", "ส่งเสริมการเกษตร", "อนามัย",
+                            "การปกครอง", "ส่งเสริมการปกครองท้องถิ่น", "ป่าไม้", "พัฒนาชุมชน", "โยธาธิการ"]]
+PROGRAMS = [f"โครงการ{w}" for w in ["พัฒนาแหล่งน้ำ", "ถนนปลอดภัย", "ยกระดับรายได้เกษตรกร", "โรงเรียนคุณภาพ",
+                                   "สุขภาพผู้สูงอายุ", "บริหารจัดการขยะ", "ป้องกันอุทกภัย", "ชุมชนเข้มแข็ง",
+                                   "เศรษฐกิจฐานราก", "รัฐบาลดิจิทัล", "ฟื้นฟูป่า", "ไฟฟ้าชนบท"]]
+CAUSE_CATEGORIES = ["คน", "ระบบ/กระบวนการ", "งบประมาณ", "กฎระเบียบ", "ข้อมูล", "ภายนอก"]
+N_TOPICS = 200
+
+PHRASES_PER_TOPIC = 2000
+TEXT_FIELDS = {  # คอลัมน์ -> ช่วงจำนวนวลีต่อแถว [ต่ำสุด, สูงสุด)
+    "issue_title": (1, 3),
+    "cause_detail": (2, 5),
+    "issue_detail": (4, 10),
+    "recommendation": (2, 6),
+    "outcomes_impact": (1, 4),
+}
+
+def _phrase_pool(rng, topics, size, words_per_phrase=(2, 6)):
+    """วลีของทุกหัวข้อต่อกันเป็น array เดียว (วลีของหัวข้อ t อยู่ที่ [t*size, (t+1)*size))"""
+    pool = []
+    for topic_words in topics:
+        lengths = rng.integers(*words_per_phrase, size)
+        total = int(lengths.sum())
+        # ส่วนใหญ่มาจากคำของหัวข้อ ที่เหลือเป็นคำทั่วไป
+        words = np.where(rng.random(total) < 0.7, rng.choice(topic_words, total), rng.choice(WORDS, total))
+        words = words.tolist()
+        bounds = np.concatenate([[0], np.cumsum(lengths)]).tolist()
+        pool.extend("".join(words[s:e]) for s, e in zip(bounds, bounds[1:]))
+    return np.array(pool, dtype=object)
+
+def _text_column(rng, pool, topic_of, n_phrases):
+    counts = rng.integers(*n_phrases, len(topic_of))
+    picks = np.repeat(topic_of * PHRASES_PER_TOPIC, counts) + rng.integers(0, PHRASES_PER_TOPIC, int(counts.sum()))
+    phrases = pool[picks]
+    bounds = np.concatenate([[0], np.cumsum(counts)]).tolist()
+    return [" ".join(phrases[s:e]) for s, e in zip(bounds, bounds[1:])]
+
+def make_findings(n: int, seed: int = 0) -> pd.DataFrame:
+    """DataFrame สังเคราะห์ n แถว คอลัมน์ตาม FINDINGS_COLUMNS
+
+    วลีสุ่มไว้ล่วงหน้าเป็นคลังต่อหัวข้อ แล้วแต่ละแถวหยิบวลีจากคลังของหัวข้อตัวเอง (สร้าง 1M แถวได้ในไม่กี่วินาที)
+    """
+    rng = np.random.default_rng(seed)
+    topics = [rng.choice(WORDS, 8, replace=False) for _ in range(N_TOPICS)]
+    pool = _phrase_pool(rng, topics, PHRASES_PER_TOPIC)
+    topic_of = rng.zipf(1.5, n) % N_TOPICS
+    df = pd.DataFrame({
+        "finding_id": [f"F-{i:07d}" for i in range(n)],
+        "unit": rng.choice(UNITS, n),
+        "program": rng.choice(PROGRAMS, n),
+        "year": rng.integers(2555, 2569, n),
+        "cause_category": rng.choice(CAUSE_CATEGORIES, n),
+        "severity": rng.integers(1, 6, n),
+        **{col: _text_column(rng, pool, topic_of, k) for col, k in TEXT_FIELDS.items()},
+    })
+    return df[FINDINGS_COLUMNS]
+
+def make_queries(findings_df: pd.DataFrame, n: int, seed: int = 1):
+    """คำค้นแบบถอดความ (paraphrase) จาก issue_detail: สลับลำดับวลีและตัดออกบางส่วน
+
+    คืน (queries, rows) โดย rows คือตำแหน่งแถวต้นทางของแต่ละคำค้น (ใช้วัด recall@k)
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(findings_df), size=min(n, len(findings_df)), replace=False)
+    queries = []
+    for r in rows:
+        phrases = findings_df["issue_detail"].iat[r].split()
+        rng.shuffle(phrases)
+        queries.append(" ".join(phrases[:max(1, int(len(phrases) * 0.6))]))
+    return queries, rows
@@ -1,153 +1,282 @@
 # -*- coding: utf-8 -*-
 import streamlit as st
 import pandas as pd
+import numpy as np
 from io import BytesIO
 from datetime import datetime
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from openai import OpenAI
 import os
-import io
+import re
+import secrets
+import sqlite3
+import time
+from pa_core import ranking as core_ranking
+from pa_core.facets import FacetIndex
+from pa_core.analyzers import DEFAULT_ANALYZER
+from pa_core.findings import (
+    FINDINGS_DB_PATH, FindingsView, MergeReport, columnar_available, create_excel_template, ingest_findings_file,
+    ingested_path, library_version, load_findings_file, overlay_findings, source_hash,
+)
+from pa_core.llm import chat_stream, stream_many
+from pa_core.plan_db import ASSIST_KEYS, get_plan_db
+from pa_core.plan_store import PlanTables
+from pa_core.llm_cache import get_response_cache
+from pa_core.search_cache import get_search_cache
+from pa_core.context import build_plan_context
+from pa_core.profiling import start_profiler, stage
+from pa_core.prompts import (
+    build_6w2h_prompt, parse_6w2h, build_assist_messages, AssistStreamParser,
+    ASSIST_SECTIONS, ASSIST_SECTION_MAX_TOKENS, build_section_messages, parse_section,
+)
+from pa_core.ranking import RANKING_WEIGHTS, RANKING_BACKENDS, plan_queries
 # จากเดิมมี from PyPDF2 import PdfReader แต่ถูกลบออกแล้วเนื่องจากไม่มีการใช้ Chatbot
 
 # ตั้งค่าหน้าเพจ
 st.set_page_config(page_title="Planning Studio (+ Issue Suggestions)", page_icon="🧭", layout="wide")
 
+# จับเวลาแต่ละขั้นตอนของ rerun นี้ (ดูได้ที่ sidebar เมื่อเปิด ?debug=1 หรือ PA_DEBUG=1 และใน log JSON-lines)
+profiler = start_profiler()
+DEBUG_PANEL = os.environ.get("PA_DEBUG") == "1" or st.query_params.get("debug") == "1"
+
 # ----------------- Session Init -----------------
-def init_state():
-    ss = st.session_state
-    ss.setdefault("plan", {
-        "plan_id": "PLN-" + datetime.now().strftime("%y%m%d-%H%M%S"),
+def empty_plan():
+    return {
+        # ต่อท้ายด้วยเลขสุ่ม เพราะหลาย session อาจเริ่มแผนใหม่ในวินาทีเดียวกันและใช้ฐานข้อมูลแผนร่วมกัน
+        "plan_id": "PLN-" + datetime.now().strftime("%y%m%d-%H%M%S") + "-" + secrets.token_hex(2),
         "plan_title": "",
         "program_name": "",
         "who": "", "what": "", "where": "", "when": "", "why": "", "how": "", "how_much": "", "whom": "",
         "objectives": "", "scope": "", "assumptions": "", "status": "Draft"
-    })
-    ss.setdefault("logic_items", pd.DataFrame(columns=["item_id","plan_id","type","description","metric","unit","target","source"]))
-    ss.setdefault("methods", pd.DataFrame(columns=["method_id","plan_id","type","tool_ref","sampling","questions","linked_issue","data_source","frequency"]))
-    ss.setdefault("kpis", pd.DataFrame(columns=["kpi_id","plan_id","level","name","formula","numerator","denominator","unit","baseline","target","frequency","data_source","quality_requirements"]))
-    ss.setdefault("risks", pd.DataFrame(columns=["risk_id","plan_id","description","category","likelihood","impact","mitigation","hypothesis"]))
-    ss.setdefault("audit_issues", pd.DataFrame(columns=["issue_id","plan_id","title","rationale","linked_kpi","proposed_methods","source_finding_id","issue_detail", "recommendation"]))
+    }
+
+def init_state():
+    ss = st.session_state
+    ss.setdefault("plan", empty_plan())
+    # logic_items, methods, kpis, risks, audit_issues (คอลัมน์ตาม pa_core.plan_store.PLAN_TABLES)
+    # ถ้ามี plan_db แถวที่เพิ่มถูกบันทึกลง SQLite ทันที
+    ss.setdefault("plan_tables", PlanTables(ss["plan"]["plan_id"], plan_db))
     ss.setdefault("gen_issues", "")
     ss.setdefault("gen_findings", "")
     ss.setdefault("gen_report", "")
     ss.setdefault("issue_results", pd.DataFrame())
+    ss.setdefault("batch_results", pd.DataFrame())
     # เพิ่ม state สำหรับเก็บค่า Seed อ้างอิงและข้อความค้นหา
     ss.setdefault("ref_seed", "") 
     ss.setdefault("issue_query_text", "")
     # ลบ state ที่เกี่ยวข้องกับ Chatbot ออกทั้งหมด
 
-def next_id(prefix, df, col):
-    if df.empty: return f"{prefix}-001"
-    nums = []
-    for x in df[col]:
-        try:
-            nums.append(int(str(x).split("-")[-1]))
-        except:
-            pass
-    n = max(nums) + 1 if nums else 1
-    return f"{prefix}-{n:03d}"
+# ----------------- Saved Plans (SQLite) -----------------
+# ช่อง 6W2H ที่มี key ของ widget ต้องล้างค่าเดิมเมื่อเปลี่ยนแผน ไม่เช่นนั้น widget จะแสดงค่าของแผนก่อน
+PLAN_WIDGET_KEYS = ["who_input", "whom_input", "what_input", "where_input", "when_input", "why_input", "how_input",
+                    "how_much_input"]
+
+def open_plan_db():
+    """PlanDB ของ process หรือ None ถ้าเปิดไม่ได้ (เช่น ดิสก์อ่านอย่างเดียว) แผนจะอยู่เฉพาะใน session เหมือนเดิม"""
+    try:
+        return get_plan_db()
+    except (sqlite3.Error, OSError):
+        return None
+
+def switch_plan(new_plan: dict, assist: dict = None):
+    ss = st.session_state
+    ss["plan"] = new_plan
+    ss["plan_tables"] = PlanTables(new_plan["plan_id"], plan_db)
+    for key in ASSIST_KEYS:
+        ss[key] = (assist or {}).get(key, "")
+    for key in PLAN_WIDGET_KEYS:
+        ss.pop(key, None)
+    ss.pop("download_cache", None)
+    ss["plan_saved"] = dict(new_plan) if assist is not None else None
+    ss["issue_results"] = pd.DataFrame()
+    ss["batch_results"] = pd.DataFrame()
+    ss["issue_query_text"] = ""
+
+def open_saved_plan(plan_id):
+    # ตารางของแผนยังไม่ถูกอ่านตอนนี้ PlanTables อ่านจาก db ทีละตารางเมื่อถูกใช้ครั้งแรก
+    saved = plan_db.get_plan(plan_id)
+    if saved is not None:
+        switch_plan(dict(empty_plan(), **saved), plan_db.load_assist(plan_id))
+
+def save_plan_state(action, *args) -> bool:
+    try:
+        action(*args)
+        return True
+    except (sqlite3.Error, OSError) as e:
+        st.warning(f"บันทึกแผนไม่สำเร็จ (ข้อมูลยังอยู่ในหน้านี้): {e}")
+        return False
+
+def df_download_link(df: pd.DataFrame, version, filename: str, label: str):
+    # CSV สร้างใหม่เฉพาะเมื่อข้อมูลเปลี่ยน (version) ไม่ใช่ทุก rerun
+    memo = st.session_state.setdefault("download_cache", {})
+    if filename not in memo or memo[filename][0] != version:
+        buf = BytesIO()
+        with stage(f"download.{filename}"):
+            df.to_csv(buf, index=False, encoding="utf-8-sig")
+        memo[filename] = (version, buf.getvalue())
+    st.download_button(label, data=memo[filename][1], file_name=filename, mime="text/csv")
 
-def df_download_link(df: pd.DataFrame, filename: str, label: str):
-    buf = BytesIO()
-    df.to_csv(buf, index=False, encoding="utf-8-sig")
-    st.download_button(label, data=buf.getvalue(), file_name=filename, mime="text/csv")
+@st.cache_resource(show_spinner=False)
+def excel_template() -> bytes:
+    # แม่แบบขึ้นกับ FINDINGS_COLUMNS เท่านั้น สร้างครั้งเดียวต่อ process
+    with stage("excel_template"):
+        return create_excel_template()
 
 # ----------------- Findings Loader & Search -----------------
-@st.cache_data(show_spinner=False)
-def load_findings(uploaded=None):
+# ตรรกะทั้งหมดอยู่ใน pa_core (ใช้ได้โดยไม่ต้องมี Streamlit) ส่วนนี้เป็นเพียง cache และข้อความแจ้งผู้ใช้
+# library หลักโหลดครั้งเดียวต่อ process และแชร์ให้ทุก session (cache_resource คืน object เดิม ไม่ pickle/คัดลอก
+# ทุก rerun เหมือน cache_data) ห้ามแก้ DataFrame นี้ ไฟล์ที่อัปโหลดเก็บเป็น overlay ของแถวที่เพิ่ม/แก้ไขเท่านั้น
+# cache คีย์ด้วย hash เนื้อหาของไฟล์หลักและไฟล์ที่อัปโหลด (ไม่ hash ตัว UploadedFile)
+@st.cache_resource(show_spinner=False)
+def load_base_findings(base_hash):
+    # stage นี้เกิดเฉพาะเมื่อ cache miss
+    with stage("findings.read"):
+        findings_df, _ = load_findings_file(FINDINGS_DB_PATH, FINDINGS_DB_PATH, content_hash=base_hash)
+    return findings_df
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def load_findings(base_hash=None, upload_hash=None, _uploaded=None):
+    with stage("findings.overlay"):
+        return _read_findings(base_hash, upload_hash, _uploaded)
+
+def _read_findings(base_hash, upload_hash, uploaded):
     findings_df = pd.DataFrame()
+    report = MergeReport()
 
-    # 1. Try to load the pre-existing database file
-    findings_db_path = "FindingsLibrary.csv"
-    if os.path.exists(findings_db_path):
+    # 1. Try to load the pre-existing database file (shared by every session)
+    if base_hash:
         try:
-            findings_df = pd.read_csv(findings_db_path)
+            findings_df = load_base_findings(base_hash)
         except Exception as e:
             st.error(f"เกิดข้อผิดพลาดในการอ่านไฟล์ FindingsLibrary.csv: {e}")
-            findings_df = pd.DataFrame()
+            findings_df, base_hash = pd.DataFrame(), None
+    base_version = library_version(base_hash) if base_hash else ""
+    view = FindingsView(findings_df, base_version=base_version)
 
-    # 2. If a new file is uploaded, combine it with the existing data
+    # 2. If a new file is uploaded, upsert it as this upload's overlay on top of the shared library
     if uploaded is not None:
         try:
-            if uploaded.name.endswith('.csv'):
-                uploaded_df = pd.read_csv(uploaded)
-            elif uploaded.name.endswith(('.xlsx', '.xls')):
-                xls = pd.ExcelFile(uploaded)
-                if "Data" in xls.sheet_names:
-                    uploaded_df = pd.read_excel(xls, sheet_name="Data")
-                    st.success("อ่านข้อมูลจากชีต 'Data' เรียบร้อยแล้ว")
-                else:
-                    st.warning("ไม่พบชีตชื่อ 'Data' ในไฟล์ที่อัปโหลด จะอ่านจากชีตแรกแทน")
-                    uploaded_df = pd.read_excel(xls, sheet_name=0)
+            uploaded_df, sheet = load_findings_file(uploaded, uploaded.name, content_hash=upload_hash)
+            if sheet == "Data":
+                st.success("อ่านข้อมูลจากชีต 'Data' เรียบร้อยแล้ว")
+            elif sheet is not None:
+                st.warning("ไม่พบชีตชื่อ 'Data' ในไฟล์ที่อัปโหลด จะอ่านจากชีตแรกแทน")
 
-            if not uploaded_df.empty:
-                findings_df = pd.concat([findings_df, uploaded_df], ignore_index=True)
-                st.success(f"อัปโหลดไฟล์ '{uploaded.name}' และรวมกับฐานข้อมูลเดิมแล้ว")
+            view, report = overlay_findings(findings_df, uploaded_df, base_version)
+            st.success(
+                f"รวมไฟล์ '{uploaded.name}' กับฐานข้อมูลเดิมแล้ว: เพิ่ม {report.added} · ปรับปรุง {report.updated} "
+                f"· ซ้ำ {report.duplicates} รายการ"
+            )
         except Exception as e:
             st.error(f"เกิดข้อผิดพลาดในการอ่านไฟล์ที่อัปโหลด: {e}")
+            upload_hash = None
 
-    # 3. Clean and return the combined dataframe
-    if not findings_df.empty:
-        for c in ["issue_title","issue_detail","cause_detail","recommendation","program","unit"]:
-            if c in findings_df.columns:
-                findings_df[c] = findings_df[c].fillna("")
-        if "year" in findings_df.columns:
-            findings_df["year"] = pd.to_numeric(findings_df["year"], errors="coerce").fillna(0).astype(int)
-        if "severity" in findings_df.columns:
-            findings_df["severity"] = pd.to_numeric(findings_df["severity"], errors="coerce").fillna(3).clip(1,5).astype(int)
+    # 3. ทั้งสองส่วนผ่านการทำความสะอาดและแปลงชนิดตาม schema ตอนแปลงเป็น Parquet แล้ว
+    report.version = library_version(*[h for h in (base_hash, upload_hash) if h])
+    return view, report
 
-    return findings_df
+def upload_content_hash(uploaded):
+    """hash ของไฟล์ที่อัปโหลด จำไว้ต่อ file_id เพื่อไม่ต้องอ่านไฟล์ใหม่ทุก rerun"""
+    if uploaded is None:
+        return None
+    memo = st.session_state.get("upload_hash")
+    if memo is None or memo[0] != uploaded.file_id:
+        memo = st.session_state["upload_hash"] = (uploaded.file_id, source_hash(uploaded))
+    return memo[1]
 
 @st.cache_resource(show_spinner=False)
-def build_tfidf_index(findings_df: pd.DataFrame):
-    texts = (findings_df["issue_title"].fillna("") + " " +
-             findings_df["issue_detail"].fillna("") + " " +
-             findings_df["cause_detail"].fillna("") + " " +
-             findings_df["recommendation"].fillna(""))
-    vec = TfidfVectorizer(max_features=20000, ngram_range=(1,2))
-    X = vec.fit_transform(texts)
-    return vec, X
-
-def search_candidates(query_text, findings_df, vec, X, top_k=8):
-    qv = vec.transform([query_text])
-    sims = cosine_similarity(qv, X)[0]
-    out = findings_df.copy()
-    out["sim_score"] = sims
-    if "year" in out.columns and out["year"].max() != out["year"].min():
-        out["year_norm"] = (out["year"] - out["year"].min()) / (out["year"].max() - out["year"].min())
-    else:
-        out["year_norm"] = 0.0
-    out["sev_norm"] = out.get("severity", 3) / 5
-    out["score"] = out["sim_score"]*0.65 + out["sev_norm"]*0.25 + out["year_norm"]*0.10
-    cols = [
-        "finding_id","year","unit","program","issue_title","issue_detail",
-        "cause_category","cause_detail","recommendation","outcomes_impact","severity","score"
-    ]
-    cols = [c for c in cols if c in out.columns] + ["sim_score"]
-    return out.sort_values("score", ascending=False).head(top_k)[cols]
-    
-# Function to create an empty Excel template
-def create_excel_template():
-    df = pd.DataFrame(columns=[
-        "finding_id", "issue_title", "unit", "program", "year", 
-        "cause_category", "cause_detail", "issue_detail", "recommendation", 
-        "outcomes_impact", "severity"
-    ])
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False, sheet_name='FindingsLibrary')
-    processed_data = output.getvalue()
-    return processed_data
+def build_base_engine(_findings, version: str, analyzer: str = DEFAULT_ANALYZER, backend: str = "sparse"):
+    # คีย์ด้วย version ของ library แทนการ hash DataFrame ทั้งก้อนทุก rerun (แชร์ทุก session)
+    return core_ranking.build_ranking_engine(_findings, analyzer=analyzer, backend=backend, version=version or None)
+
+def build_ranking_engine(_findings, version: str, analyzer: str = DEFAULT_ANALYZER, backend: str = "sparse"):
+    # แคชเฉพาะ engine ของ library หลัก การซ้อนแถวที่อัปโหลด (และกรณีไม่มี library หลัก) อยู่ใน pa_core.ranking
+    if not isinstance(_findings, FindingsView):
+        return build_base_engine(_findings, version, analyzer, backend)
+    # engine ที่ซ้อนแถวของ session จำไว้ใน session ต่อ (version, analyzer, backend) เพื่อไม่ต้องสร้างใหม่ทุก rerun
+    key = (version, analyzer, backend)
+    memo = st.session_state.get("ranking_engine")
+    if memo is None or memo[0] != key:
+        base = None if _findings.base.empty else build_base_engine(_findings.base, _findings.base_version,
+                                                                   analyzer, backend)
+        engine = core_ranking.build_ranking_engine(_findings, analyzer=analyzer, backend=backend, version=version,
+                                                   base_engine=base)
+        memo = st.session_state["ranking_engine"] = (key, engine)
+    return memo[1]
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def build_facet_index(_findings, version: str):
+    with stage("facets.build"):
+        return FacetIndex.from_findings(_findings)
+
+# ----------------- Facet Filters -----------------
+FACET_LABELS = {"unit": "หน่วยรับตรวจ", "program": "โครงการ/แผนงาน", "cause_category": "หมวดสาเหตุ"}
+
+def known_years(facets) -> list:
+    """ปีที่ใช้เป็นช่วงของ slider: ไม่รวม 0 (ไม่ทราบปี) ซึ่งถูกรวมในผลค้นหาจนกว่าผู้ใช้จะปรับช่วงปี"""
+    return [y for y in facets.values("year") if y] if "year" in facets else []
+
+def read_facet_filters(facets) -> dict:
+    """ตัวกรองจากค่าของ widget ใน state (อ่านก่อนวาด เพื่อให้จำนวนต่อค่าตรงกับตัวกรองปัจจุบัน)"""
+    ss = st.session_state
+    filters = {}
+    years = known_years(facets)
+    if ss.get("f_year") and len(years) > 1 and tuple(ss["f_year"]) != (years[0], years[-1]):
+        filters["year"] = facets.values_between("year", *ss["f_year"])
+    severities = facets.values("severity") if "severity" in facets else []
+    if ss.get("f_severity") is not None and len(severities) > 1 and ss["f_severity"] > severities[0]:
+        filters["severity"] = facets.values_between("severity", ss["f_severity"], severities[-1])
+    for col in FACET_LABELS:
+        if ss.get(f"f_{col}"):
+            filters[col] = ss[f"f_{col}"]
+    return filters
+
+def facet_filter_panel(facets, n_total: int):
+    """วาดตัวกรอง คืน (ตัวกรอง, ตำแหน่งแถวที่ผ่านตัวกรอง หรือ None ถ้าไม่กรอง)"""
+    ss = st.session_state
+    # ค่าที่ค้างจาก library ก่อนหน้าอาจไม่มีใน library นี้แล้ว
+    for col in ("year", "severity"):
+        values = known_years(facets) if col == "year" else facets.values(col) if col in facets else []
+        picked = ss.get(f"f_{col}")
+        if picked is not None and (len(values) < 2 or any(v < values[0] or v > values[-1] for v in np.atleast_1d(picked))):
+            ss.pop(f"f_{col}")
+    for col in FACET_LABELS:
+        if ss.get(f"f_{col}") and col in facets:
+            known = set(facets.values(col))
+            if any(v not in known for v in ss[f"f_{col}"]):
+                ss[f"f_{col}"] = [v for v in ss[f"f_{col}"] if v in known]
+
+    filters = read_facet_filters(facets)
+    with st.expander("🔍 กรองข้อมูลก่อนค้นหา (ปี / หน่วยงาน / โครงการ / หมวดสาเหตุ / ความรุนแรง)", expanded=bool(filters)):
+        f1, f2 = st.columns(2)
+        years = known_years(facets)
+        if len(years) > 1:
+            unknown = facets.counts("year").get(0, 0)
+            f1.slider("ปี", years[0], years[-1], (years[0], years[-1]), key="f_year",
+                      help=f"รวม {unknown:,} รายการที่ไม่ทราบปี จนกว่าจะปรับช่วงปี" if unknown else None)
+        severities = facets.values("severity") if "severity" in facets else []
+        if len(severities) > 1:
+            f2.slider("ความรุนแรงตั้งแต่", severities[0], severities[-1], severities[0], key="f_severity")
+        for col, label in FACET_LABELS.items():
+            if col in facets:
+                # จำนวนของแต่ละค่าคิดภายใต้ตัวกรองของคอลัมน์อื่น
+                counts = facets.counts(col, filters)
+                st.multiselect(label, facets.values(col), format_func=lambda v, c=counts: f"{v} ({c[v]:,})",
+                               key=f"f_{col}")
+    filters = read_facet_filters(facets)
+    with stage("facets.select"):
+        rows = facets.select(filters)
+    if rows is not None:
+        st.caption(f"ตรงตามตัวกรอง {len(rows):,} จาก {n_total:,} รายการ")
+    return filters, rows
 
 # ----------------- App UI -----------------
+plan_db = open_plan_db()
 init_state()
 plan = st.session_state["plan"]
-logic_df = st.session_state["logic_items"]
-methods_df = st.session_state["methods"]
-kpis_df = st.session_state["kpis"]
-risks_df = st.session_state["risks"]
-audit_issues_df = st.session_state["audit_issues"]
+# DataFrame ของแต่ละตารางสร้างเมื่อตารางเปลี่ยนเท่านั้น (ใช้อ่าน/แสดงผล ห้ามแก้ไข)
+# แต่ละส่วนอ่านเฉพาะตารางที่ใช้ ตารางของแผนที่เปิดจาก db จึงถูกอ่านเมื่อเปิดส่วนนั้นครั้งแรก
+tables = st.session_state["plan_tables"]
+if tables.save_error is not None:
+    st.warning(f"บันทึกรายการล่าสุดลงฐานข้อมูลแผนไม่สำเร็จ (ข้อมูลยังอยู่ในหน้านี้): {tables.save_error}")
 
 st.title("🧭 Planning Studio – Performance Audit")
 
@@ -233,22 +362,57 @@ h4 { color: #007bff !important; border-bottom: 2px solid #e0e0e0; padding-bottom
 """, unsafe_allow_html=True)
 # ----------------- END: Custom CSS -----------------
 
-# ----------------- Tab Definitions -----------------
-# **ลบ tab_chatbot ออกจากรายการ**
-tab_plan, tab_logic, tab_method, tab_kpi, tab_risk, tab_issue, tab_preview, tab_assist = st.tabs([
-    "1. ระบุ แผน & 6W2H", 
-    "2. ระบุ Logic Model", 
-    "3. ระบุ Methods", 
-    "4. ระบุ KPIs", 
-    "5. ระบุ Risks", 
-    "6. ค้นหาข้อตรวจพบที่ผ่านมา", 
-    "7. สรุปข้อมูล (Preview)", 
-    # **เปลี่ยนชื่อ Tab 8**
-    "🤖 ให้ PA Assist ช่วยแนะนำประเด็นการตรวจสอบ ✨✨" 
-]) 
+# ----------------- Section Definitions -----------------
+# แต่ละส่วนเป็นฟังก์ชัน เรียกตามส่วนที่เลือกด้านล่าง (หลังนิยามครบทุกส่วน)
+SECTIONS = {
+    "plan": "1. ระบุ แผน & 6W2H",
+    "logic": "2. ระบุ Logic Model",
+    "methods": "3. ระบุ Methods",
+    "kpis": "4. ระบุ KPIs",
+    "risks": "5. ระบุ Risks",
+    "issues": "6. ค้นหาข้อตรวจพบที่ผ่านมา",
+    "preview": "7. สรุปข้อมูล (Preview)",
+    "assist": "🤖 ให้ PA Assist ช่วยแนะนำประเด็นการตรวจสอบ ✨✨",
+}
+# sections (ค่าเริ่มต้น): รันเฉพาะส่วนที่เลือก · tabs: st.tabs แบบเดิม รันทุกแท็บทุก rerun
+NAV_MODE = os.environ.get("PA_NAV", "sections")
+# widget ของส่วนที่ไม่ได้แสดงถูก Streamlit ล้างค่าทิ้ง ค่าเหล่านี้จึงถูกคัดลอกเป็น state ปกติก่อนออกจากส่วนนั้น
+SECTION_STATE_KEYS = {
+    "plan": ("uploaded_text", "api_key_6w2h"),
+    "issues": ("issue_query_text", "rank_backend", "w_sim", "w_sev", "w_rec", "issue_top_k", "issue_page",
+               "batch_top_k", "batch_dedupe", "f_year", "f_severity", "f_unit", "f_program", "f_cause_category"),
+    "assist": ("api_key_assist", "assist_parallel"),
+}
+ISSUE_CARD_KEY_RE = re.compile(r"(rat|kpi|mth)_\d+$")  # ช่องกรอกของการ์ดผลลัพธ์ (render_issue_card)
+
+def keep_section_state(active_section: str):
+    ss = st.session_state
+    for section, names in SECTION_STATE_KEYS.items():
+        if section == active_section:
+            continue
+        for key in [k for k in ss if k in names or (section == "issues" and ISSUE_CARD_KEY_RE.match(k))]:
+            ss[key] = ss[key]
 
 # ----------------- Tab 1: ระบุ แผน & 6W2H -----------------
-with tab_plan:
+def plan_section():
+    if plan_db is not None:
+        with st.expander("📂 เปิดแผนที่บันทึกไว้"), stage("plan_db.list"):
+            saved_plans = plan_db.list_plans()
+            if not saved_plans:
+                st.caption("ยังไม่มีแผนที่บันทึกไว้ (แผนจะถูกบันทึกอัตโนมัติเมื่อเริ่มกรอกข้อมูล)")
+            else:
+                plan_labels = {
+                    p["plan_id"]: f"{p['plan_id']} · {p['plan_title'] or '(ไม่มีชื่อแผน)'} · "
+                                  f"แก้ไขล่าสุด {datetime.fromtimestamp(p['updated_at']):%d/%m/%Y %H:%M}"
+                    for p in saved_plans
+                }
+                open_id = st.selectbox("แผนที่บันทึกไว้", list(plan_labels), format_func=plan_labels.get, key="open_plan_id")
+                o1, o2 = st.columns(2)
+                with o1:
+                    st.button("📂 เปิดแผนนี้", on_click=open_saved_plan, args=(open_id,), key="open_plan_button")
+                with o2:
+                    st.button("🆕 เริ่มแผนใหม่", on_click=lambda: switch_plan(empty_plan()), key="new_plan_button")
+
     st.subheader("ข้อมูลแผน (Plan) - กรุณาระบุข้อมูล")
     with st.container(border=True):
         c1, c2, c3 = st.columns([2,2,1])
@@ -273,7 +437,13 @@ with tab_plan:
         st.markdown("💡 **ยังไม่มี API Key?** คลิก [ที่นี่](https://playground.opentyphoon.ai/settings/api-key) เพื่อรับ key ฟรี!")
         api_key_6w2h = st.text_input("กรุณากรอก API Key เพื่อใช้บริการ AI:", type="password", key="api_key_6w2h")
 
-        if st.button("🚀 สร้าง 6W2H จากข้อความ", type="primary", key="6w2h_button"):
+        b6w, b6r = st.columns([2, 1])
+        with b6w:
+            clicked_6w2h = st.button("🚀 สร้าง 6W2H จากข้อความ", type="primary", key="6w2h_button")
+        with b6r:
+            regen_6w2h = st.button("🔁 สร้างใหม่", key="6w2h_regen_button",
+                                   help="ขอคำตอบใหม่จาก AI แทนคำตอบที่เคยสร้างไว้สำหรับข้อความเดียวกัน")
+        if clicked_6w2h or regen_6w2h:
             if not uploaded_text:
                 st.error("กรุณาวางข้อความในช่องก่อน")
             elif not api_key_6w2h:
@@ -281,53 +451,23 @@ with tab_plan:
             else:
                 with st.spinner("กำลังประมวลผล..."):
                     try:
-                        user_prompt = f"""
-จากข้อความด้านล่างนี้ กรุณาสรุปและแยกแยะข้อมูลให้เป็น 6W2H ได้แก่ Who, Whom, What, Where, When, Why, How, และ How much โดยให้อยู่ในรูปแบบ key-value ที่ชัดเจน
-ข้อความ:
----
-{uploaded_text}
----
-รูปแบบที่ต้องการ:
-Who: [ข้อความ]
-Whom: [ข้อความ]
-What: [ข้อความ]
-Where: [ข้อความ]
-When: [ข้อความ]
-Why: [ข้อความ]
-How: [ข้อความ]
-How Much: [ข้อความ]
-"""
-                        client = OpenAI(
-                            api_key=api_key_6w2h,
-                            base_url="https://api.opentyphoon.ai/v1"
-                        )
                         # **แก้ไข: ลบ repetition_penalty ออก**
-                        response = client.chat.completions.create(
-                            model="typhoon-v2.1-12b-instruct",
-                            messages=[{"role": "user", "content": user_prompt}],
+                        stream = chat_stream(
+                            api_key_6w2h,
+                            [{"role": "user", "content": build_6w2h_prompt(uploaded_text)}],
                             temperature=0.7,
                             max_tokens=1024,
                             top_p=0.9,
+                            refresh=regen_6w2h,
                         )
-                        llm_output = response.choices[0].message.content
-                        
-                        with st.expander("แสดงผลลัพธ์จาก AI"):
-                            st.write(llm_output)
-
-                        lines = llm_output.strip().split('\n')
-                        for line in lines:
-                            if ':' in line:
-                                key, value = line.split(':', 1)
-                                normalized_key = key.strip().lower().replace(' ', '_')
-                                value = value.strip()
-                                if normalized_key == 'how_much': st.session_state.plan['how_much'] = value
-                                elif normalized_key == 'whom': st.session_state.plan['whom'] = value
-                                elif normalized_key == 'who': st.session_state.plan['who'] = value
-                                elif normalized_key == 'what': st.session_state.plan['what'] = value
-                                elif normalized_key == 'where': st.session_state.plan['where'] = value
-                                elif normalized_key == 'when': st.session_state.plan['when'] = value
-                                elif normalized_key == 'why': st.session_state.plan['why'] = value
-                                elif normalized_key == 'how': st.session_state.plan['how'] = value
+                        with st.expander("แสดงผลลัพธ์จาก AI", expanded=True):
+                            # แสดงคำตอบทีละส่วนตามที่ได้รับ
+                            st.write_stream(stream)
+                            st.caption("ใช้คำตอบที่เคยสร้างไว้ (กด 🔁 สร้างใหม่ เพื่อขอคำตอบใหม่)" if stream.cached
+                                       else f"เวลาถึง token แรก {stream.ttft_ms or 0:.0f} ms")
+                        llm_output = stream.text
+
+                        st.session_state.plan.update(parse_6w2h(llm_output))
 
                         st.success("สร้าง 6W2H เรียบร้อยแล้ว! กรุณาตรวจสอบข้อมูลแล้วคัดลอกไปวางตามรายละเอียดด้านล่าง")
                         st.balloons()
@@ -350,7 +490,8 @@ How Much: [ข้อความ]
             st.session_state.plan["how_much"] = st.text_input("How much (เท่าไร)", value=st.session_state.plan["how_much"], key="how_much_input")
 
 # ----------------- Tab 2: Logic Model -----------------
-with tab_logic:
+def logic_section():
+    logic_df = tables["logic_items"].frame()
     st.subheader("ระบุข้อมูล Logic Model: Input → Activities → Output → Outcome → Impact")
     st.dataframe(logic_df, use_container_width=True, hide_index=True)
     with st.expander("➕ เพิ่มรายการใน Logic Model"):
@@ -366,17 +507,16 @@ with tab_logic:
             with colC:
                 source = st.text_input("แหล่งข้อมูล", value="", key="logic_source")
                 if st.button("เพิ่ม Logic Item", type="primary"):
-                    new_row = pd.DataFrame([{
-                        "item_id": next_id("LG", logic_df, "item_id"),
-                        "plan_id": plan["plan_id"],
-                        "type": typ, "description": desc, "metric": metric,
-                        "unit": unit, "target": target, "source": source
-                    }])
-                    st.session_state["logic_items"] = pd.concat([logic_df, new_row], ignore_index=True)
+                    tables["logic_items"].append(
+                        plan_id=plan["plan_id"],
+                        type=typ, description=desc, metric=metric,
+                        unit=unit, target=target, source=source
+                    )
                     st.rerun()
 
 # ----------------- Tab 3: Methods -----------------
-with tab_method:
+def methods_section():
+    methods_df = tables["methods"].frame()
     st.subheader("ระบุวิธีการเก็บข้อมูล (Methods)")
     st.dataframe(methods_df, use_container_width=True, hide_index=True)
     with st.expander("➕ เพิ่ม Method"):
@@ -393,18 +533,17 @@ with tab_method:
                 data_source = st.text_input("แหล่งข้อมูล", value="", key="method_data_source")
                 frequency = st.text_input("ความถี่", value="ครั้งเดียว", key="method_frequency")
                 if st.button("เพิ่ม Method", type="primary", key="add_method_btn"):
-                    new_row = pd.DataFrame([{
-                        "method_id": next_id("MT", methods_df, "method_id"),
-                        "plan_id": plan["plan_id"],
-                        "type": mtype, "tool_ref": tool_ref, "sampling": sampling,
-                        "questions": questions, "linked_issue": linked_issue,
-                        "data_source": data_source, "frequency": frequency
-                    }])
-                    st.session_state["methods"] = pd.concat([methods_df, new_row], ignore_index=True)
+                    tables["methods"].append(
+                        plan_id=plan["plan_id"],
+                        type=mtype, tool_ref=tool_ref, sampling=sampling,
+                        questions=questions, linked_issue=linked_issue,
+                        data_source=data_source, frequency=frequency
+                    )
                     st.rerun()
 
 # ----------------- Tab 4: KPIs -----------------
-with tab_kpi:
+def kpis_section():
+    kpis_df = tables["kpis"].frame()
     st.subheader("ระบุตัวชี้วัด (KPIs)")
     st.dataframe(kpis_df, use_container_width=True, hide_index=True)
     with st.expander("➕ เพิ่ม KPI เอง"):
@@ -425,19 +564,18 @@ with tab_kpi:
                 data_src = st.text_input("แหล่งข้อมูล", value="", key="kpi_data_source")
                 quality = st.text_input("ข้อกำหนดคุณภาพข้อมูล", value="ถูกต้อง/ทันเวลา", key="kpi_quality")
                 if st.button("เพิ่ม KPI", type="primary", key="add_kpi_btn"):
-                    new_row = pd.DataFrame([{
-                        "kpi_id": next_id("KPI", kpis_df, "kpi_id"),
-                        "plan_id": plan["plan_id"],
-                        "level": level, "name": name, "formula": formula,
-                        "numerator": numerator, "denominator": denominator, "unit": unit,
-                        "baseline": baseline, "target": target, "frequency": freq,
-                        "data_source": data_src, "quality_requirements": quality
-                    }])
-                    st.session_state["kpis"] = pd.concat([kpis_df, new_row], ignore_index=True)
+                    tables["kpis"].append(
+                        plan_id=plan["plan_id"],
+                        level=level, name=name, formula=formula,
+                        numerator=numerator, denominator=denominator, unit=unit,
+                        baseline=baseline, target=target, frequency=freq,
+                        data_source=data_src, quality_requirements=quality
+                    )
                     st.rerun()
 
 # ----------------- Tab 5: Risks -----------------
-with tab_risk:
+def risks_section():
+    risks_df = tables["risks"].frame()
     st.subheader("ระบุความเสี่ยง (Risks)")
     st.dataframe(risks_df, use_container_width=True, hide_index=True)
     with st.expander("➕ เพิ่ม Risk"):
@@ -453,38 +591,149 @@ with tab_risk:
                 mitigation = st.text_area("มาตรการลดความเสี่ยง")
                 hypothesis = st.text_input("สมมุติฐานที่ต้องทดสอบ")
                 if st.button("เพิ่ม Risk", type="primary", key="add_risk_btn"):
-                    new_row = pd.DataFrame([{
-                        "risk_id": next_id("RSK", risks_df, "risk_id"),
-                        "plan_id": plan["plan_id"],
-                        "description": desc, "category": category,
-                        "likelihood": likelihood, "impact": impact,
-                        "mitigation": mitigation, "hypothesis": hypothesis
-                    }])
-                    st.session_state["risks"] = pd.concat([risks_df, new_row], ignore_index=True)
+                    tables["risks"].append(
+                        plan_id=plan["plan_id"],
+                        description=desc, category=category,
+                        likelihood=likelihood, impact=impact,
+                        mitigation=mitigation, hypothesis=hypothesis
+                    )
                     st.rerun()
 
+# ----------------- Issue Suggestions: ผลลัพธ์ & ประเด็นในแผน -----------------
+# st.fragment (Streamlit >= 1.37, experimental_fragment ใน 1.33-1.36): ปุ่มและช่องกรอกในส่วนนี้ rerun เฉพาะส่วนนี้
+# เวอร์ชันเก่ากว่านั้นทำงานเหมือนเดิม (rerun ทั้งหน้า)
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
+ISSUE_PAGE_SIZE = 5
+ISSUE_MAX_RESULTS = 50
+
+def add_issue_to_plan(row: dict, i: int):
+    # callback ของปุ่ม ทำงานก่อน rerun ของ fragment ตารางด้านล่างจึงเห็นแถวใหม่ในรอบเดียว
+    ss = st.session_state
+    tables["audit_issues"].append(
+        plan_id=plan.get("plan_id", ""),
+        title=row.get("issue_title", "(ไม่มีชื่อประเด็น)"),
+        rationale=ss.get(f"rat_{i}", ""),
+        linked_kpi=ss.get(f"kpi_{i}", ""),
+        proposed_methods=ss.get(f"mth_{i}", ""),
+        source_finding_id=row.get("finding_id", ""),
+        issue_detail=row.get("issue_detail", ""),
+        recommendation=row.get("recommendation", ""),
+    )
+    st.toast("เพิ่มประเด็นเข้าแผนแล้ว ✅")
+
+def render_issue_card(i: int, row: dict):
+    with st.container(border=True):
+        title_txt = row.get("issue_title", "(ไม่มีชื่อประเด็น)")
+        unit_txt = row.get("unit", "-")
+        prog_txt = row.get("program", "-")
+        year_txt = int(row["year"]) if "year" in row and str(row["year"]).isdigit() else row.get("year", "-")
+        st.markdown(f"**{title_txt}** \nหน่วย: {unit_txt} • โครงการ: {prog_txt} • ปี {year_txt}")
+        cause_cat = row.get("cause_category", "-")
+        cause_detail = row.get("cause_detail", "-")
+        st.caption(f"สาเหตุ: *{cause_cat}* — {cause_detail}")
+
+        with st.expander("รายละเอียด/ข้อเสนอแนะ (เดิม)"):
+            st.write(row.get("issue_detail", "-"))
+            st.caption("ข้อเสนอแนะเดิม: " + (row.get("recommendation", "") or "-"))
+            impact = row.get("outcomes_impact", "-")
+            sim = row.get("sim_score", 0)
+            score = row.get("score", 0)
+
+            st.markdown(f"**ผลกระทบที่อาจเกิดขึ้น:** {impact}  •  <span style='color:red;'>**คะแนนความเกี่ยวข้อง**</span>: {score:.3f} (<span style='color:blue;'>**Similarity Score**</span>={sim:.3f})", unsafe_allow_html=True)
+            st.caption("💡 **คำอธิบาย:** **คะแนนความเกี่ยวข้อง** (ยิ่งสูงยิ่งดี) = ความคล้ายคลึงของข้อความ + ความรุนแรงของปัญหา + ความใหม่ของข้อมูล")
+            st.caption("**Similarity Score** คือค่าความคล้ายคลึงระหว่างข้อความในแผนงานของคุณกับรายงานเก่า (0.000 - 1.000)")
+
+        c1, c2 = st.columns([3,1])
+        with c1:
+            default_rat = f"อ้างอิงกรณีเดิม ปี {year_txt} | หน่วย: {unit_txt}"
+            st.text_area("เหตุผลที่ควรตรวจ (สำหรับแผนนี้)", key=f"rat_{i}", value=default_rat)
+            st.text_input("KPI ที่เกี่ยว (ถ้ามี)", key=f"kpi_{i}")
+            st.text_input("วิธีเก็บข้อมูลที่เสนอ", key=f"mth_{i}", value="สัมภาษณ์/สังเกต/ตรวจเอกสาร")
+
+        with c2:
+            st.button("➕ เพิ่มเข้าแผน", key=f"add_{i}", type="secondary", on_click=add_issue_to_plan, args=(row, i))
+
+@fragment
+def issue_results_panel():
+    with stage("issue_results_panel"):
+        results = st.session_state.get("issue_results", pd.DataFrame())
+        if not results.empty:
+            st.divider()
+            st.subheader("ผลลัพธ์การค้นหา")
+            # วาดทีละหน้า: จำนวน widget ต่อรอบคงที่ไม่ว่าจะมีผลลัพธ์กี่รายการ
+            pages = -(-len(results) // ISSUE_PAGE_SIZE)
+            page = st.number_input(f"หน้า (ทั้งหมด {pages} หน้า)", min_value=1, max_value=pages, value=1,
+                                   key="issue_page") if pages > 1 else 1
+            first = (page - 1) * ISSUE_PAGE_SIZE
+            rows = results.iloc[first:first + ISSUE_PAGE_SIZE].to_dict("records")
+            for offset, row in enumerate(rows):
+                render_issue_card(first + offset, row)
+
+        st.divider()
+        st.markdown("### ประเด็นที่ถูกเพิ่มเข้าแผน")
+        st.dataframe(tables["audit_issues"].frame(), use_container_width=True, hide_index=True)
+
 # ----------------- Tab 6: ค้นหาข้อตรวจพบที่ผ่านมา -----------------
-with tab_issue:
+def issues_section():
+    logic_df, kpis_df, risks_df = (tables[name].frame() for name in ("logic_items", "kpis", "risks"))
     st.subheader("🔎 แนะนำประเด็นตรวจจากรายงานเก่า (Issue Suggestions)")
     st.write("***กรุณาอัพโหลดฐานข้อมูล (ถ้าไม่มีจะใช้ฐานข้อมูลในระบบ)***")
 
     
+    template_bytes = excel_template()
     with st.container(border=True):
         st.download_button(
             label="⬇️ ดาวน์โหลดไฟล์แม่แบบ FindingsLibrary.xlsx",
-            data=create_excel_template(),
+            data=template_bytes,
             file_name="FindingsLibrary.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
-        uploaded = st.file_uploader("อัปโหลด FindingsLibrary.csv หรือ .xlsx", type=["csv", "xlsx", "xls"])
-    
-    findings_df = load_findings(uploaded=uploaded)
+        # ไฟล์ที่อัปโหลดจำไว้ใน state เอง เพราะ file_uploader ลืมไฟล์เมื่อส่วนนี้ไม่ได้แสดง (โหมด sections)
+        st.file_uploader("อัปโหลด FindingsLibrary.csv หรือ .xlsx", type=["csv", "xlsx", "xls"], key="findings_upload",
+                         on_change=lambda: st.session_state.update(active_upload=st.session_state["findings_upload"]))
+        uploaded = st.session_state.get("active_upload")
+        if uploaded is not None and st.session_state.get("findings_upload") is None:
+            u1, u2 = st.columns([4, 1])
+            u1.caption(f"ใช้ไฟล์ที่อัปโหลดไว้: {uploaded.name}")
+            u2.button("ล้างไฟล์", key="clear_upload", on_click=lambda: st.session_state.pop("active_upload", None))
+        upload_hash = upload_content_hash(uploaded)
+        # แปลงไฟล์ใหม่เป็น Parquet ทีละช่วงพร้อมแถบความคืบหน้า (ไฟล์ที่เคยแปลงแล้วข้ามขั้นนี้)
+        if upload_hash and columnar_available() and not ingested_path(upload_hash):
+            label = f"กำลังแปลงไฟล์ '{uploaded.name}'..."
+            bar = st.progress(0.0, text=label)
+            try:
+                ingest_findings_file(uploaded, uploaded.name, content_hash=upload_hash,
+                                     progress=lambda fraction, rows: bar.progress(fraction, text=f"{label} {rows:,} แถว"))
+            except Exception as e:
+                st.error(f"เกิดข้อผิดพลาดในการอ่านไฟล์ที่อัปโหลด: {e}")
+                uploaded = upload_hash = st.session_state["active_upload"] = None
+            bar.empty()
     
-    if findings_df.empty:
+    try:
+        with stage("load_findings"):
+            base_hash = source_hash(FINDINGS_DB_PATH) if os.path.exists(FINDINGS_DB_PATH) else None
+            findings, merge_report = load_findings(base_hash, upload_hash, uploaded)
+    except Exception as e:
+        st.error(f"เกิดข้อผิดพลาดในการโหลดฐานข้อมูล Findings: {e}")
+        return
+
+    if findings.empty:
         st.info("ไม่พบข้อมูล Findings ที่จะนำมาใช้ โปรดอัปโหลดไฟล์ หรือตรวจสอบว่ามีไฟล์ FindingsLibrary.csv อยู่ในโฟลเดอร์เดียวกัน")
     else:
-        st.success(f"พบข้อมูล Findings ทั้งหมด {len(findings_df)} รายการ")
-        vec, X = build_tfidf_index(findings_df)
+        st.success(f"พบข้อมูล Findings ทั้งหมด {len(findings)} รายการ")
+        st.caption(f"เวอร์ชันคลังข้อมูล: `{merge_report.version}`")
+        backend = st.radio(
+            "วิธีค้นหา", list(RANKING_BACKENDS), format_func=RANKING_BACKENDS.get, horizontal=True, key="rank_backend",
+            help="LSA ใช้เวกเตอร์ความหมายแบบย่อ จับคำที่เขียนต่างกันได้ดีกว่า (ความเร็วใกล้เคียงกับ TF-IDF)"
+        )
+        try:
+            with stage("ranking_engine", backend=backend):
+                engine = build_ranking_engine(findings, merge_report.version, backend=backend)
+                facets = build_facet_index(findings, merge_report.version)
+        except Exception as e:
+            # ไฟล์ที่อัปโหลดเสียไฟล์เดียวไม่ควรทำให้ทั้งหน้าใช้ไม่ได้
+            st.error(f"สร้างดัชนีค้นหาไม่สำเร็จ โปรดตรวจสอบไฟล์ที่อัปโหลด: {e}")
+            return
         
         seed = f"""
 Who:{plan.get('who','')} What:{plan.get('what','')} Where:{plan.get('where','')}
@@ -531,94 +780,72 @@ Outcomes:{' | '.join(logic_df[logic_df['type']=='Outcome']['description'].tolist
                 type="secondary"
             )
         
+        with st.expander("⚙️ ปรับน้ำหนักการจัดอันดับ"):
+            w1, w2, w3 = st.columns(3)
+            with w1:
+                w_sim = st.slider("ความคล้ายคลึงของข้อความ", 0.0, 1.0, RANKING_WEIGHTS["sim"], 0.05, key="w_sim")
+            with w2:
+                w_sev = st.slider("ความรุนแรงของปัญหา", 0.0, 1.0, RANKING_WEIGHTS["severity"], 0.05, key="w_sev")
+            with w3:
+                w_rec = st.slider("ความใหม่ของข้อมูล", 0.0, 1.0, RANKING_WEIGHTS["recency"], 0.05, key="w_rec")
+        weights = {"sim": w_sim, "severity": w_sev, "recency": w_rec}
+        facet_filters, facet_rows = facet_filter_panel(facets, len(findings))
+
+        issue_top_k = st.number_input("จำนวนผลลัพธ์", min_value=1, max_value=ISSUE_MAX_RESULTS, value=8, key="issue_top_k")
+
         # The search button logic
         if st.button("ค้นหาประเด็นที่ใกล้เคียง", type="primary", key="search_button_fix"):
             # Ensure we use the value stored in the session state for the search
             search_value = st.session_state.get("issue_query_text", seed)
-            results = search_candidates(search_value, findings_df, vec, X, top_k=8)
-            st.session_state["issue_results"] = results
-            st.success(f"พบประเด็นที่เกี่ยวข้อง {len(results)} รายการ")
+            if facet_rows is not None and not len(facet_rows):
+                st.warning("ไม่มีข้อตรวจพบที่ตรงตามตัวกรอง")
+            else:
+                with stage("search", backend=backend, filters=sorted(facet_filters),
+                           rows=len(findings) if facet_rows is None else len(facet_rows)) as rec:
+                    # คำค้น/น้ำหนัก/ตัวกรองเดิมบน library เดิม (ของทุก session) ได้ผลจากแคชทันที
+                    results, rec["cache_hit"] = get_search_cache().search(
+                        engine, search_value, top_k=int(issue_top_k), weights=weights, rows=facet_rows,
+                        filters=facet_filters, version=(merge_report.version, DEFAULT_ANALYZER, backend))
+                st.session_state["issue_results"] = results
+                st.session_state.pop("issue_page", None)  # กลับไปหน้าแรก
+                st.success(f"พบประเด็นที่เกี่ยวข้อง {len(results)} รายการ")
             
-        results = st.session_state.get("issue_results", pd.DataFrame())
-        
-        if not results.empty:
-            st.divider()
-            st.subheader("ผลลัพธ์การค้นหา")
-            for i, row in results.reset_index(drop=True).iterrows():
-                with st.container(border=True):
-                    title_txt = row.get("issue_title", "(ไม่มีชื่อประเด็น)")
-                    unit_txt = row.get("unit", "-")
-                    prog_txt = row.get("program", "-")
-                    year_txt = int(row["year"]) if "year" in row and str(row["year"]).isdigit() else row.get("year", "-")
-                    st.markdown(f"**{title_txt}** \nหน่วย: {unit_txt} • โครงการ: {prog_txt} • ปี {year_txt}")
-                    cause_cat = row.get("cause_category", "-")
-                    cause_detail = row.get("cause_detail", "-")
-                    st.caption(f"สาเหตุ: *{cause_cat}* — {cause_detail}")
-    
-                    with st.expander("รายละเอียด/ข้อเสนอแนะ (เดิม)"):
-                        st.write(row.get("issue_detail", "-"))
-                        st.caption("ข้อเสนอแนะเดิม: " + (row.get("recommendation", "") or "-"))
-                        impact = row["outcomes_impact"] if "outcomes_impact" in row else "-"
-                        sim = row["sim_score"] if "sim_score" in row else 0
-                        score = row["score"] if "score" in row else 0
-                        
-                        st.markdown(f"**ผลกระทบที่อาจเกิดขึ้น:** {impact}  •  <span style='color:red;'>**คะแนนความเกี่ยวข้อง**</span>: {score:.3f} (<span style='color:blue;'>**Similarity Score**</span>={sim:.3f})", unsafe_allow_html=True)
-                        st.caption("💡 **คำอธิบาย:** **คะแนนความเกี่ยวข้อง** (ยิ่งสูงยิ่งดี) = ความคล้ายคลึงของข้อความ + ความรุนแรงของปัญหา + ความใหม่ของข้อมูล")
-                        st.caption("**Similarity Score** คือค่าความคล้ายคลึงระหว่างข้อความในแผนงานของคุณกับรายงานเก่า (0.000 - 1.000)")
-    
-                    c1, c2 = st.columns([3,1])
-                    with c1:
-                        default_rat = f"อ้างอิงกรณีเดิม ปี {year_txt} | หน่วย: {unit_txt}"
-                        st.text_area("เหตุผลที่ควรตรวจ (สำหรับแผนนี้)", key=f"rat_{i}", value=default_rat)
-                        st.text_input("KPI ที่เกี่ยว (ถ้ามี)", key=f"kpi_{i}")
-                        st.text_input("วิธีเก็บข้อมูลที่เสนอ", key=f"mth_{i}", value="สัมภาษณ์/สังเกต/ตรวจเอกสาร")
-    
-                    with c2:
-                        if st.button("➕ เพิ่มเข้าแผน", key=f"add_{i}", type="secondary"):
-                            rationale_val = st.session_state.get(f"rat_{i}", "")
-                            linked_kpi_val = st.session_state.get(f"kpi_{i}", "")
-                            proposed_methods_val = st.session_state.get(f"mth_{i}", "")
-                            issue_detail_val = row.get("issue_detail", "")
-                            recommendation_val = row.get("recommendation", "")
-    
-                            cols = ["issue_id","plan_id","title","rationale","linked_kpi","proposed_methods","source_finding_id","issue_detail","recommendation"]
-                            
-                            if "audit_issues" not in st.session_state or not isinstance(st.session_state["audit_issues"], pd.DataFrame):
-                                st.session_state["audit_issues"] = pd.DataFrame(columns=cols)
-                            
-                            for c in cols:
-                                if c not in st.session_state["audit_issues"].columns:
-                                    st.session_state["audit_issues"][c] = pd.Series(dtype="object")
-                            
-                            curr = st.session_state["audit_issues"]
-                            new_id = next_id("ISS", curr, "issue_id")
-    
-                            title_val = title_txt
-                            finding_id = row.get("finding_id", "")
-    
-                            new = pd.DataFrame([{
-                                "issue_id": new_id,
-                                "plan_id": plan.get("plan_id",""),
-                                "title": title_val,
-                                "rationale": rationale_val,
-                                "linked_kpi": linked_kpi_val,
-                                "proposed_methods": proposed_methods_val,
-                                "source_finding_id": finding_id,
-                                "issue_detail": issue_detail_val,
-                                "recommendation": recommendation_val
-                            }])
-    
-                            st.session_state["audit_issues"] = pd.concat([st.session_state["audit_issues"], new], ignore_index=True)
-                            st.success("เพิ่มประเด็นเข้าแผนแล้ว ✅")
-                            st.rerun()
-                            
-        if not st.session_state.get("issue_results", pd.DataFrame()).empty:
-            st.divider()
-        st.markdown("### ประเด็นที่ถูกเพิ่มเข้าแผน")
-        st.dataframe(st.session_state["audit_issues"], use_container_width=True, hide_index=True)
+        # ผลลัพธ์และตารางประเด็นในแผน rerun เฉพาะส่วนของตัวเอง (ไม่โหลด findings/ค้นหา/วาดแท็บอื่นใหม่)
+        issue_results_panel()
+
+        st.divider()
+        st.subheader("ค้นหาแยกตามรายการในแผน (Logic Model / KPI / Risk)")
+        queries = plan_queries(logic_df, kpis_df, risks_df)
+        if queries.empty:
+            st.caption("ยังไม่มีรายการใน Logic Model / KPIs / Risks ให้ค้นหา")
+        else:
+            b1, b2, b3 = st.columns([1, 2, 2])
+            with b1:
+                batch_k = st.number_input("จำนวนต่อรายการ", min_value=1, max_value=10, value=3, key="batch_top_k")
+            with b2:
+                batch_dedupe = st.checkbox("ไม่แนะนำข้อตรวจพบซ้ำข้ามรายการ", key="batch_dedupe")
+            with b3:
+                if st.button(f"ค้นหาทั้ง {len(queries)} รายการ", key="batch_search_button"):
+                    if facet_rows is not None and not len(facet_rows):
+                        st.warning("ไม่มีข้อตรวจพบที่ตรงตามตัวกรอง")
+                    else:
+                        with stage("search_batch", backend=backend, queries=len(queries)):
+                            st.session_state["batch_results"] = engine.search_batch(
+                                queries, top_k=int(batch_k), weights=weights, dedupe=batch_dedupe, rows=facet_rows
+                            )
+
+        batch_results = st.session_state.get("batch_results", pd.DataFrame())
+        if not batch_results.empty:
+            show_cols = [c for c in ["rank","finding_id","issue_title","unit","year","severity","score","sim_score"] if c in batch_results.columns]
+            for (qid, src, qtext), grp in batch_results.groupby(["query_id","source","query_text"], sort=False):
+                with st.expander(f"{src} • {qid}: {qtext[:80]}"):
+                    st.dataframe(grp[show_cols], use_container_width=True, hide_index=True)
+
 
 # ----------------- Tab 7: สรุปข้อมูล (Preview) -----------------
-with tab_preview:
+def preview_section():
+    logic_df, methods_df, kpis_df, risks_df, audit_issues_df = tables.frames(
+        "logic_items", "methods", "kpis", "risks", "audit_issues").values()
     st.subheader("สรุปแผน (Preview)")
     with st.container(border=True):
         st.markdown(f"**Plan ID:** {plan['plan_id']}  \n**ชื่อแผนงาน:** {plan['plan_title']}  \n**โครงการ:** {plan['program_name']}  \n**หน่วยรับตรวจ:** {plan['who']}")
@@ -639,27 +866,26 @@ with tab_preview:
     c1, c2 = st.columns(2)
     with c1:
         st.markdown("### Logic Model")
-        st.dataframe(st.session_state["logic_items"], use_container_width=True, hide_index=True)
-        df_download_link(st.session_state["logic_items"], "logic_items.csv", "⬇️ ดาวน์โหลด Logic Items (CSV)")
+        st.dataframe(logic_df, use_container_width=True, hide_index=True)
+        df_download_link(logic_df, tables["logic_items"].version, "logic_items.csv", "⬇️ ดาวน์โหลด Logic Items (CSV)")
     with c2:
         st.markdown("### Methods")
-        st.dataframe(st.session_state["methods"], use_container_width=True, hide_index=True)
-        df_download_link(st.session_state["methods"], "methods.csv", "⬇️ ดาวน์โหลด Methods (CSV)")
+        st.dataframe(methods_df, use_container_width=True, hide_index=True)
+        df_download_link(methods_df, tables["methods"].version, "methods.csv", "⬇️ ดาวน์โหลด Methods (CSV)")
 
     c3, c4 = st.columns(2)
     with c3:
         st.markdown("### KPIs")
-        st.dataframe(st.session_state["kpis"], use_container_width=True, hide_index=True)
-        df_download_link(st.session_state["kpis"], "kpis.csv", "⬇️ ดาวน์โหลด KPIs (CSV)")
+        st.dataframe(kpis_df, use_container_width=True, hide_index=True)
+        df_download_link(kpis_df, tables["kpis"].version, "kpis.csv", "⬇️ ดาวน์โหลด KPIs (CSV)")
     with c4:
         st.markdown("### Risks")
-        st.dataframe(st.session_state["risks"], use_container_width=True, hide_index=True)
-        df_download_link(st.session_state["risks"], "risks.csv", "⬇️ ดาวน์โหลด Risks (CSV)")
+        st.dataframe(risks_df, use_container_width=True, hide_index=True)
+        df_download_link(risks_df, tables["risks"].version, "risks.csv", "⬇️ ดาวน์โหลด Risks (CSV)")
 
     st.markdown("### Audit Issues ที่เพิ่มเข้ามา")
-    if not st.session_state["audit_issues"].empty:
-        display_issues_df = st.session_state["audit_issues"].copy()
-        display_issues_df = display_issues_df.rename(columns={
+    if not audit_issues_df.empty:
+        display_issues_df = audit_issues_df.rename(columns={
             "issue_id": "รหัสประเด็น",
             "title": "ชื่อประเด็น",
             "rationale": "เหตุผลที่ควรตรวจ",
@@ -671,131 +897,210 @@ with tab_preview:
     else:
         st.info("ยังไม่มีประเด็นการตรวจสอบที่เพิ่มเข้ามาในแผน")
 
-    if not st.session_state["audit_issues"].empty:
-        df_download_link(st.session_state["audit_issues"], "audit_issues.csv", "⬇️ ดาวน์โหลด Audit Issues (CSV)")
+    if not audit_issues_df.empty:
+        df_download_link(audit_issues_df, tables["audit_issues"].version, "audit_issues.csv", "⬇️ ดาวน์โหลด Audit Issues (CSV)")
 
     st.divider()
-    plan_df = pd.DataFrame([plan])
-    df_download_link(plan_df, "plan.csv", "⬇️ ดาวน์โหลด Plan (CSV)")
+    df_download_link(pd.DataFrame([plan]), tuple(plan.items()), "plan.csv", "⬇️ ดาวน์โหลด Plan (CSV)")
     st.success("พร้อมเชื่อม Glide / Sheets ต่อได้ทันที")
     
 # ----------------- Tab 8: ให้ PA Assist ช่วยแนะนำประเด็นการตรวจสอบ -----------------
-with tab_assist:
+def assist_section():
     st.subheader("💡 PA Audit Assist (ขับเคลื่อนด้วย LLM)")
     st.write("🤖 สร้างคำแนะนำประเด็นการตรวจสอบจาก AI")
     st.markdown("💡 **ยังไม่มี API Key?** คลิก [ที่นี่](https://playground.opentyphoon.ai/settings/api-key) เพื่อรับ key ฟรี!")
     api_key = st.text_input("กรุณากรอก API Key เพื่อใช้บริการ AI:", type="password", key="api_key_assist")
 
-    if st.button("🚀 สร้างคำแนะนำจาก AI", type="primary", key="llm_assist_button"):
+    ba1, ba2 = st.columns([2, 1])
+    with ba1:
+        assist_clicked = st.button("🚀 สร้างคำแนะนำจาก AI", type="primary", key="llm_assist_button")
+    with ba2:
+        assist_regen = st.button("🔁 สร้างใหม่", key="llm_assist_regen_button",
+                                 help="ขอคำแนะนำใหม่จาก AI แทนคำตอบที่เคยสร้างไว้สำหรับแผนเดียวกัน")
+    assist_parallel = st.toggle("⚡ สร้างทั้ง 3 ส่วนพร้อมกัน", key="assist_parallel",
+                                help="ส่งคำขอแยกส่วนละหนึ่งคำขอพร้อมกัน เสร็จเร็วขึ้นเหลือประมาณเวลาของส่วนที่ช้าที่สุด "
+                                     "แต่ใช้ token ขาเข้ามากขึ้น (ส่งข้อมูลแผนไปทั้ง 3 คำขอ)")
+
+    # ข้อมูลแผนที่จะส่งให้ AI แบบกระชับ ไม่เกินงบ token (PA_PLAN_CONTEXT_TOKENS)
+    with stage("prompt.plan_context") as rec:
+        plan_ctx = build_plan_context(plan, tables.frames("logic_items", "audit_issues", "kpis", "risks"))
+        rec["tokens"] = plan_ctx.tokens
+    section_labels = {"plan": "แผน/6W2H", "audit_issues": "ประเด็น", "logic_items": "Logic Model", "kpis": "KPIs", "risks": "ความเสี่ยง"}
+    st.caption(
+        f"ข้อมูลแผนที่ส่งให้ AI ≈ {plan_ctx.tokens:,} / {plan_ctx.budget:,} token · "
+        + " · ".join(
+            f"{section_labels[name]} {r['tokens']:,}" + (f" ({r['rows']}/{r['total_rows']} แถว)" if r["total_rows"] else "")
+            for name, r in plan_ctx.report.items()
+        )
+        + (" · ตัดบางแถวเพื่อให้อยู่ในงบ" if plan_ctx.truncated else "")
+    )
+    assist_status = st.empty()
+
+    # กล่องผลลัพธ์สร้างไว้ก่อน เพื่อเติมข้อความระหว่าง stream ได้ทันทีที่แต่ละส่วนมาถึง
+    assist_boxes = {}
+    for key, heading, height in [
+        ("gen_issues", "ประเด็นการตรวจสอบที่ควรให้ความสำคัญ", 200),
+        ("gen_findings", "ข้อตรวจพบที่คาดว่าจะพบ (พร้อมระดับโอกาส)", 200),
+        ("gen_report", "ร่างรายงานตรวจสอบ (Preview)", 400),
+    ]:
+        st.markdown(f"<h4 style='color:blue;'>{heading}</h4>", unsafe_allow_html=True)
+        assist_boxes[key] = (st.empty(), height)
+
+    def render_assist_box(key, text):
+        box, height = assist_boxes[key]
+        box.markdown(f"<div style='background-color: #f0f2f6; border: 1px solid #ccc; padding: 10px; border-radius: 5px; height: {height}px; overflow-y: scroll;'>{text}</div>", unsafe_allow_html=True)
+
+    for key in assist_boxes:
+        render_assist_box(key, st.session_state.get(key, ""))
+
+    def assist_error_message(e):
+        # ปรับปรุงการแสดงข้อผิดพลาด API
+        error_type = type(e).__name__
+        if "APIError" in error_type or error_type in ("AuthenticationError", "RateLimitError", "APIConnectionError", "APITimeoutError"):
+            return f"เกิดข้อผิดพลาดในการเชื่อมต่อ API: ({error_type}) โปรดตรวจสอบ API Key หรือขีดจำกัดการใช้งาน (Rate Limit) ของคุณ\nรายละเอียด: {e}"
+        return f"เกิดข้อผิดพลาดขณะทำงาน: ({error_type}) โปรดลองอีกครั้ง\nรายละเอียด: {e}"
+
+    if assist_clicked or assist_regen:
         if not api_key:
-            st.error("กรุณากรอก API Key ก่อนใช้งาน")
+            assist_status.error("กรุณากรอก API Key ก่อนใช้งาน")
+        elif assist_parallel:
+            # หนึ่งคำขอต่อส่วน ส่งพร้อมกัน แต่ละส่วนเก็บผลทันทีที่เสร็จ ส่วนที่ล้มเหลวไม่กระทบส่วนอื่น
+            with assist_status, st.spinner("กำลังสร้างคำแนะนำ (3 ส่วนพร้อมกัน)..."):
+                started = time.perf_counter()
+                plan_summary = plan_ctx.text
+                section_requests = {
+                    key: {"messages": build_section_messages(plan_summary, key), "max_tokens": ASSIST_SECTION_MAX_TOKENS[key]}
+                    for key in assist_boxes
+                }
+                parsers = {key: AssistStreamParser() for key in assist_boxes}
+                failed, reused = {}, 0
+                last_render = 0.0
+                pending = set()
+                for key, kind, value in stream_many(api_key, section_requests, temperature=0.7, top_p=0.9, refresh=assist_regen):
+                    if kind == "delta":
+                        parsers[key].feed(value)
+                        pending.add(key)
+                    elif kind == "done":
+                        st.session_state[key] = parse_section(value.text, key)
+                        render_assist_box(key, st.session_state[key])
+                        pending.discard(key)
+                        reused += value.cached
+                    else:
+                        # คงข้อความเดิมของส่วนที่ล้มเหลวไว้
+                        failed[key] = value
+                        render_assist_box(key, st.session_state[key])
+                        pending.discard(key)
+                    if pending and time.perf_counter() - last_render > 0.1:
+                        for k in pending:
+                            render_assist_box(k, parsers[k].sections[k])
+                        pending.clear()
+                        last_render = time.perf_counter()
+
+                elapsed = time.perf_counter() - started
+                if failed:
+                    headings = dict(ASSIST_SECTIONS)
+                    assist_status.error(
+                        f"สร้างได้ {len(assist_boxes) - len(failed)} จาก {len(assist_boxes)} ส่วน "
+                        f"(ส่วนที่ไม่สำเร็จ: {', '.join(headings[k] for k in failed)})\n"
+                        + assist_error_message(next(iter(failed.values())))
+                    )
+                elif reused == len(assist_boxes):
+                    assist_status.success("ใช้คำแนะนำที่เคยสร้างไว้สำหรับแผนนี้ ✅ (กด 🔁 สร้างใหม่ เพื่อขอคำแนะนำใหม่)")
+                else:
+                    assist_status.success(f"สร้างคำแนะนำจาก AI เรียบร้อยแล้ว ✅ ({elapsed:.1f} วินาที)")
         else:
-            with st.spinner("กำลังสร้างคำแนะนำ..."):
+            with assist_status, st.spinner("กำลังสร้างคำแนะนำ..."):
+                parser = AssistStreamParser()
                 try:
-                    issues_for_llm = st.session_state['audit_issues'][['title', 'rationale']]
-                    plan_summary = f"""
-ชื่อแผน/เรื่องที่จะตรวจ: {plan['plan_title']}
-ชื่อโครงการ/แผนงาน: {plan['program_name']}
-วัตถุประสงค์: {plan['objectives']}
-ขอบเขต: {plan['scope']}
-สมมุติฐาน/ข้อจำกัด: {plan['assumptions']}
----
-6W2H:
-ใคร (Who): {plan['who']}
-ถึงใคร (Whom): {plan['whom']}
-ทำอะไร (What): {plan['what']}
-ที่ไหน (Where): {plan['where']}
-เมื่อใด (When): {plan['when']}
-ทำไม (Why): {plan['why']}
-อย่างไร (How): {plan['how']}
-เท่าไร (How much): {plan['how_much']}
----
-Logic Model:
-{st.session_state['logic_items'].to_string()}
----
-ประเด็นที่เพิ่มจากรายงานเก่า:
-{issues_for_llm.to_string()}
-"""
-                    user_prompt = f"""
-จากข้อมูลแผนการตรวจสอบด้านล่างนี้ กรุณาช่วยสร้างคำแนะนำ 3 อย่าง ได้แก่
-1. ประเด็นการตรวจสอบที่ควรให้ความสำคัญ
-2. ข้อตรวจพบที่คาดว่าจะพบ (พร้อมระบุระดับโอกาสที่จะเจอ: สูง/กลาง/ต่ำ)
-3. ร่างรายงานตรวจสอบที่จะเจอ
----
-{plan_summary}
----
-กรุณาสร้างคำตอบตามรูปแบบด้านล่างนี้เท่านั้น:
-<ประเด็นการตรวจสอบที่ควรให้ความสำคัญ>
-[ข้อความสำหรับส่วนที่ 1]
-</ประเด็นการตรวจสอบที่ควรให้ความสำคัญ>
-
-<ข้อตรวจพบที่คาดว่าจะพบ>
-[ข้อความสำหรับส่วนที่ 2]
-</ข้อตรวจพบที่คาดว่าจะพบ>
-
-<ร่างรายงานตรวจสอบที่จะเจอ>
-[ข้อความสำหรับส่วนที่ 3]
-</ร่างรายงานตรวจสอบที่จะเจอ>
-"""
+                    started = time.perf_counter()
+                    plan_summary = plan_ctx.text
+                    messages = build_assist_messages(plan_summary)
 
-                    client = OpenAI(
-                        api_key=api_key,
-                        base_url="https://api.opentyphoon.ai/v1"
-                    )
-                    
-                    messages = [
-                        {"role": "system", "content": "คุณคือผู้เชี่ยวชาญด้านการตรวจสอบผลสัมฤทธิ์และประสิทธิภาพการดำเนินงาน (Performance Audit) กรุณาตอบโดยมุ่งเน้นการสร้างคำแนะนำตามรูปแบบที่ต้องการเท่านั้น"},
-                        {"role": "user", "content": user_prompt}
-                    ]
-                    
                     # **แก้ไข: ลบ repetition_penalty ออก**
-                    response = client.chat.completions.create(
-                        model="typhoon-v2.1-12b-instruct",
-                        messages=messages,
+                    stream = chat_stream(
+                        api_key,
+                        messages,
                         temperature=0.7,
                         max_tokens=2048,
                         top_p=0.9,
+                        refresh=assist_regen,
                     )
+                    last_render = 0.0
+                    pending = set()
+                    for delta in stream:
+                        pending.update(parser.feed(delta))
+                        # วาดใหม่ไม่เกิน ~10 ครั้ง/วินาที ยกเว้นเมื่อส่วนใดปิดแท็กครบแล้ว
+                        if pending and (pending & parser.complete or time.perf_counter() - last_render > 0.1):
+                            for key in pending:
+                                render_assist_box(key, parser.sections[key])
+                            pending.clear()
+                            last_render = time.perf_counter()
 
-                    full_response = response.choices[0].message.content
+                    for key, text in parser.sections.items():
+                        st.session_state[key] = text
+                        render_assist_box(key, text)
 
-                    issue_start = full_response.find("<ประเด็นการตรวจสอบที่ควรให้ความสำคัญ>") + len("<ประเด็นการตรวจสอบที่ควรให้ความสำคัญ>")
-                    issue_end = full_response.find("</ประเด็นการตรวจสอบที่ควรให้ความสำคัญ>")
-                    issues_text = full_response[issue_start:issue_end].strip()
-                    
-                    finding_start = full_response.find("<ข้อตรวจพบที่คาดว่าจะพบ>") + len("<ข้อตรวจพบที่คาดว่าจะพบ>")
-                    finding_end = full_response.find("</ข้อตรวจพบที่คาดว่าจะพบ>")
-                    findings_text = full_response[finding_start:finding_end].strip()
-
-                    report_start = full_response.find("<ร่างรายงานตรวจสอบที่จะเจอ>") + len("<ร่างรายงานตรวจสอบที่จะเจอ>")
-                    report_end = full_response.find("</ร่างรายงานตรวจสอบที่จะเจอ>")
-                    report_text = full_response[report_start:report_end].strip()
+                    if stream.cached:
+                        assist_status.success("ใช้คำแนะนำที่เคยสร้างไว้สำหรับแผนนี้ ✅ (กด 🔁 สร้างใหม่ เพื่อขอคำแนะนำใหม่)")
+                    else:
+                        elapsed = time.perf_counter() - started
+                        assist_status.success(f"สร้างคำแนะนำจาก AI เรียบร้อยแล้ว ✅ ({elapsed:.1f} วินาที, เวลาถึง token แรก {stream.ttft_ms or 0:.0f} ms)")
 
-                    st.session_state["gen_issues"] = issues_text
-                    st.session_state["gen_findings"] = findings_text
-                    st.session_state["gen_report"] = report_text
+                except Exception as e:
+                    assist_status.error(assist_error_message(e))
+                    # เก็บส่วนที่ได้ครบแล้วก่อนเกิดข้อผิดพลาดไว้ ล้างเฉพาะส่วนที่ยังไม่ครบ
+                    for key in assist_boxes:
+                        st.session_state[key] = parser.sections[key] if key in parser.complete else ""
+                        render_assist_box(key, st.session_state[key])
+        # เก็บคำแนะนำไว้กับแผน เปิดแผนครั้งหน้าไม่ต้องเรียก AI ใหม่
+        if api_key and plan_db is not None:
+            save_plan_state(plan_db.save_assist, plan["plan_id"], {key: st.session_state[key] for key in ASSIST_KEYS})
 
-                    st.success("สร้างคำแนะนำจาก AI เรียบร้อยแล้ว ✅")
+# ----------------- Navigation -----------------
+SECTION_FUNCS = {"plan": plan_section, "logic": logic_section, "methods": methods_section, "kpis": kpis_section,
+                 "risks": risks_section, "issues": issues_section, "preview": preview_section, "assist": assist_section}
+if NAV_MODE == "tabs":
+    for key, tab in zip(SECTIONS, st.tabs(list(SECTIONS.values()))):
+        with tab, stage(f"tab.{key}"):
+            SECTION_FUNCS[key]()
+else:
+    active_section = st.radio("ส่วนของแผน", list(SECTIONS), format_func=SECTIONS.get, horizontal=True,
+                              key="active_section", label_visibility="collapsed")
+    keep_section_state(active_section)
+    with stage(f"tab.{active_section}"):
+        SECTION_FUNCS[active_section]()
 
-                except Exception as e:
-                    # ปรับปรุงการแสดงข้อผิดพลาด API
-                    error_type = type(e).__name__
-                    if "APIError" in error_type or "AuthenticationError" in error_type:
-                         error_message = f"เกิดข้อผิดพลาดในการเชื่อมต่อ API: ({error_type}) โปรดตรวจสอบ API Key หรือขีดจำกัดการใช้งาน (Rate Limit) ของคุณ\nรายละเอียด: {e}"
-                    else:
-                         error_message = f"เกิดข้อผิดพลาดขณะทำงาน: ({error_type}) โปรดลองอีกครั้ง\nรายละเอียด: {e}"
-                         
-                    st.error(error_message)
-                    st.session_state["gen_issues"] = ""
-                    st.session_state["gen_findings"] = ""
-                    st.session_state["gen_report"] = ""
-
-    st.markdown("<h4 style='color:blue;'>ประเด็นการตรวจสอบที่ควรให้ความสำคัญ</h4>", unsafe_allow_html=True)
-    st.markdown(f"<div style='background-color: #f0f2f6; border: 1px solid #ccc; padding: 10px; border-radius: 5px; height: 200px; overflow-y: scroll;'>{st.session_state.get('gen_issues', '')}</div>", unsafe_allow_html=True)
-    
-    st.markdown("<h4 style='color:blue;'>ข้อตรวจพบที่คาดว่าจะพบ (พร้อมระดับโอกาส)</h4>", unsafe_allow_html=True)
-    st.markdown(f"<div style='background-color: #f0f2f6; border: 1px solid #ccc; padding: 10px; border-radius: 5px; height: 200px; overflow-y: scroll;'>{st.session_state.get('gen_findings', '')}</div>", unsafe_allow_html=True)
+# ----------------- Save Plan -----------------
+# บันทึกข้อมูลแผนเมื่อเปลี่ยนจากที่บันทึกล่าสุด (แผนที่ยังว่างทั้งหมดไม่บันทึก) แถวของตารางบันทึกทันทีที่เพิ่มแล้ว
+plan_snapshot = dict(plan)
+if plan_db is not None and plan_snapshot != st.session_state.get("plan_saved") and (
+        any(v for k, v in plan_snapshot.items() if k not in ("plan_id", "status")) or any(len(t) for t in tables.tables.values())
+        or any(st.session_state[k] for k in ASSIST_KEYS)):
+    with stage("plan_db.save_plan"):
+        if save_plan_state(plan_db.save_plan, plan_snapshot):
+            st.session_state["plan_saved"] = plan_snapshot
 
-    st.markdown("<h4 style='color:blue;'>ร่างรายงานตรวจสอบ (Preview)</h4>", unsafe_allow_html=True)
-    st.markdown(f"<div style='background-color: #f0f2f6; border: 1px solid #ccc; padding: 10px; border-radius: 5px; height: 400px; overflow-y: scroll;'>{st.session_state.get('gen_report', '')}</div>", unsafe_allow_html=True)
+# ----------------- Profiling -----------------
+run_profile = profiler.write_log(plan_id=plan["plan_id"], llm_cache=get_response_cache().stats(),
+                                 search_cache=get_search_cache().stats())
+profile_history = st.session_state.setdefault("profile_history", [])
+profile_history.append({"total_ms": run_profile["total_ms"], "rss_mb": run_profile["rss_mb"]})
+del profile_history[:-50]
 
+if DEBUG_PANEL:
+    with st.sidebar:
+        st.markdown("### 🐞 เวลาแต่ละขั้นตอน (rerun นี้)")
+        st.caption(f"รวม {run_profile['total_ms']:.0f} ms • RSS {run_profile['rss_mb']:.0f} MB "
+                   f"(เปลี่ยน {run_profile['rss_delta_mb']:+.1f} MB)")
+        llm_cache_stats = get_response_cache().stats()
+        st.caption(f"แคชคำตอบ AI (process นี้): hit {llm_cache_stats['hits']} • miss {llm_cache_stats['misses']} "
+                   f"({llm_cache_stats['hit_rate']:.0%})")
+        search_cache_stats = get_search_cache().stats()
+        st.caption(f"แคชผลการค้นหา (process นี้): hit {search_cache_stats['hits']} • miss {search_cache_stats['misses']} "
+                   f"({search_cache_stats['hit_rate']:.0%}) • {search_cache_stats['entries']} รายการ")
+        stages_df = pd.DataFrame(run_profile["stages"])
+        if not stages_df.empty:
+            stages_df["stage"] = ["\u2003" * d + name for d, name in zip(stages_df["depth"], stages_df["stage"])]
+            st.dataframe(stages_df.drop(columns="depth").round(2), use_container_width=True, hide_index=True)
+        st.markdown("##### เวลารวมของ rerun ล่าสุด (ms)")
+        st.line_chart(pd.DataFrame(profile_history)["total_ms"])
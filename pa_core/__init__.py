@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""แกนของ PA.AI Planning Studio ที่ไม่ขึ้นกับ Streamlit
+
+ใช้ได้จาก CLI, batch job หรือ benchmark เช่น::
+
+    from pa_core import load_findings, build_ranking_engine
+    engine = build_ranking_engine(load_findings("FindingsLibrary.csv"))
+    engine.search("การจัดซื้อจัดจ้างล่าช้า", top_k=8)
+
+ชื่อด้านล่าง import แบบ lazy (โมดูลย่อยถูกโหลดเมื่อถูกเรียกใช้ครั้งแรก)
+เพื่อให้ `import pa_core` เร็ว และไม่ดึง sklearn/openai เข้ามาถ้าไม่ได้ใช้
+"""
+import importlib
+
+_EXPORTS = {
+    "FINDINGS_COLUMNS": "findings",
+    "load_findings": "findings",
+    "read_findings_file": "findings",
+    "clean_findings": "findings",
+    "create_excel_template": "findings",
+    "ANALYZERS": "analyzers",
+    "DEFAULT_ANALYZER": "analyzers",
+    "build_tfidf_index": "index",
+    "IncrementalIndex": "index",
+    "RANKING_WEIGHTS": "ranking",
+    "RankingEngine": "ranking",
+    "LsaRankingEngine": "ranking",
+    "build_ranking_engine": "ranking",
+    "search_candidates": "ranking",
+    "plan_queries": "ranking",
+    "FACET_COLUMNS": "facets",
+    "FacetIndex": "facets",
+    "recall_at_k": "ranking",
+    "build_6w2h_prompt": "prompts",
+    "parse_6w2h": "prompts",
+    "build_plan_summary": "prompts",
+    "build_assist_messages": "prompts",
+    "build_plan_context": "context",
+    "count_tokens": "context",
+    "parse_assist_sections": "prompts",
+    "AssistStreamParser": "prompts",
+    "build_section_messages": "prompts",
+    "parse_section": "prompts",
+    "chat": "llm",
+    "chat_stream": "llm",
+    "stream_many": "llm",
+    "get_response_cache": "llm_cache",
+    "SearchCache": "search_cache",
+    "get_search_cache": "search_cache",
+    "start_profiler": "profiling",
+    "stage": "profiling",
+    "profiled": "profiling",
+}
+
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""Thai-aware text analyzers และ token cache สำหรับดัชนี FindingsLibrary
+
+ภาษาไทยไม่มีช่องว่างระหว่างคำ analyzer แบบ word ของ sklearn จึงได้ "คำ" เป็นทั้งวลี
+โมดูลนี้มี analyzer ที่เลือกได้ (ANALYZERS) แต่ละตัวรับข้อความดิบและคืน list ของ feature
+"""
+import itertools
+import os
+import pickle
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+_THAI_DIGITS = str.maketrans("๐๑๒๓๔๕๖๗๘๙", "0123456789")
+_ZERO_WIDTH_RE = re.compile("[\u200b-\u200d\ufeff]")
+_RUN_RE = re.compile(r"[\u0e01-\u0e5b]+|[^\W_]+")
+_LEGACY_TOKEN_RE = re.compile(r"(?u)\b\w\w+\b")
+
+def normalize_text(text: str) -> str:
+    """NFC, ตัวพิมพ์เล็ก, เลขไทย -> อารบิก, ลบ zero-width และแก้การพิมพ์ผิดที่พบบ่อย (เ+เ, ํ+า)"""
+    text = unicodedata.normalize("NFC", text)
+    text = _ZERO_WIDTH_RE.sub("", text).replace("เเ", "แ").replace("\u0e4d\u0e32", "\u0e33")
+    return text.lower().translate(_THAI_DIGITS)
+
+def _with_bigrams(tokens):
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+def analyze_word(text: str):
+    """analyzer เดิม (เทียบเท่า TfidfVectorizer(ngram_range=(1,2))) เก็บไว้เพื่อเปรียบเทียบ"""
+    return _with_bigrams(_LEGACY_TOKEN_RE.findall(text.lower()))
+
+def analyze_thai_char(text: str, n: int = 3):
+    """ช่วงอักษรไทย -> character n-grams (เติมช่องว่างหัวท้ายแบบ char_wb), ภาษาอังกฤษ/ตัวเลข -> ทั้งคำ"""
+    out = []
+    for run in _RUN_RE.findall(normalize_text(text)):
+        if "\u0e01" <= run[0] <= "\u0e5b":
+            padded = f" {run} "
+            out.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        elif len(run) > 1:
+            out.append(run)
+    return out
+
+def analyze_thai_word(text: str):
+    """ตัดคำไทยด้วย PyThaiNLP (newmm) + bigram ของคำ (ต้องติดตั้ง pythainlp: ไม่สลับไปใช้ analyzer อื่นเอง
+    เพื่อให้ดัชนีชื่อ thai_word มีความหมายเดียวกันทุกเครื่อง)"""
+    from pythainlp.tokenize import word_tokenize
+    words = [w for w in word_tokenize(normalize_text(text), engine="newmm", keep_whitespace=False)
+             if _RUN_RE.search(w)]
+    return _with_bigrams(words)
+
+ANALYZERS = {
+    "word": analyze_word,
+    "thai_char": analyze_thai_char,
+    "thai_word": analyze_thai_word,
+}
+
+# ค่าเริ่มต้นคงที่ (ไม่ขึ้นกับว่ามี PyThaiNLP หรือไม่) ดัชนี, คีย์แคช และผล benchmark จึงตรงกันทุกเครื่องที่ใช้ข้อมูลเดียวกัน
+DEFAULT_ANALYZER = os.environ.get("PA_ANALYZER", "thai_char")
+if DEFAULT_ANALYZER not in ANALYZERS:
+    raise ValueError(f"PA_ANALYZER ต้องเป็นหนึ่งใน {sorted(ANALYZERS)} (ได้ {DEFAULT_ANALYZER!r})")
+
+def _pretokenized(tokens):
+    return tokens
+
+def row_keys(texts: pd.Series) -> np.ndarray:
+    """hash (uint64) ของข้อความแต่ละแถว ใช้เป็นคีย์ของ token cache และตรวจว่าแถวเดิมยังอยู่ครบ"""
+    return pd.util.hash_pandas_object(texts, index=False, categorize=False).to_numpy()
+
+# แคชเฉพาะ analyzer ที่ตัดคำช้า (พจนานุกรม) ตัวอื่นตัดใหม่เร็วกว่าการเก็บ token ของทุกแถวไว้ในหน่วยความจำ
+CACHED_ANALYZERS = {"thai_word"}
+TOKEN_CACHE_MAX_ROWS = int(os.environ.get("PA_TOKEN_CACHE_ROWS", "500000"))
+_SEP = "\x1f"
+
+class TokenStore:
+    """แคช token ของแต่ละแถวโดยใช้ hash ของข้อความแถวเป็นคีย์ เพื่อให้ index ใหม่ตัดคำเฉพาะแถวที่เพิ่ม/เปลี่ยน
+
+    token ของแถวเก็บเป็นสตริงเดียวคั่นด้วย \x1f (ประหยัดกว่า list ของ str หลายเท่า) และเก็บไม่เกิน
+    TOKEN_CACHE_MAX_ROWS แถวล่าสุดที่ใช้ ไฟล์บนดิสก์เป็น log ของ pickle หลายช่วงต่อกัน
+    save() เขียนต่อท้ายเฉพาะแถวใหม่ (เขียนใหม่ทั้งไฟล์เมื่อมีการตัดแถวเก่าทิ้ง)
+    """
+
+    def __init__(self, analyzer: str, path: str, max_rows: int = TOKEN_CACHE_MAX_ROWS):
+        self.analyzer = analyzer
+        self.path = path
+        self.max_rows = max_rows
+        self.tokens = {}
+        self.pending = {}
+        self._truncate = False
+        if analyzer in CACHED_ANALYZERS and os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    while True:
+                        self.tokens.update(pickle.load(f))
+            except EOFError:
+                pass
+            except (OSError, pickle.UnpicklingError):
+                # ไฟล์เสียบางส่วน -> ใช้เท่าที่อ่านได้ และเริ่มไฟล์ใหม่เมื่อ save
+                self._truncate = True
+            # ไฟล์รุ่นก่อนเก็บ token เป็น list -> แปลงเป็นสตริงและเขียนใหม่ทั้งไฟล์เมื่อ save
+            if any(isinstance(v, list) for v in itertools.islice(self.tokens.values(), 1)):
+                self.tokens = {k: _SEP.join(v) if isinstance(v, list) else v for k, v in self.tokens.items()}
+                self._truncate = True
+            self._evict()
+
+    def tokenize(self, texts: pd.Series, keys=None):
+        """iterator ของ token ต่อแถว (lazy: ไม่ถือ token ของทุกแถวไว้พร้อมกัน ใช้ป้อน vectorizer ได้ทันที)"""
+        fn = ANALYZERS[self.analyzer]
+        if self.analyzer not in CACHED_ANALYZERS:
+            return map(fn, texts)
+        if keys is None:
+            keys = row_keys(texts)
+        return self._tokenize_cached(texts, keys, fn)
+
+    def _tokenize_cached(self, texts, keys, fn):
+        tokens = self.tokens
+        for key, text in zip(keys.tolist(), texts):
+            joined = tokens.pop(key, None)
+            if joined is None:
+                toks = fn(text)
+                joined = self.pending[key] = _SEP.join(toks)
+            else:
+                toks = joined.split(_SEP) if joined else []
+            # ใส่กลับท้าย dict = ใช้ล่าสุด (ลำดับของ dict ใช้เป็น LRU)
+            tokens[key] = joined
+            yield toks
+        self._evict()
+
+    def _evict(self) -> None:
+        excess = len(self.tokens) - self.max_rows
+        if excess <= 0:
+            return
+        for key in list(itertools.islice(self.tokens, excess)):
+            del self.tokens[key]
+            self.pending.pop(key, None)
+        self._truncate = True
+
+    def save(self) -> None:
+        if not (self.pending or self._truncate):
+            return
+        mode = "wb" if self._truncate else "ab"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            payload = pickle.dumps(self.tokens if self._truncate else self.pending,
+                                   protocol=pickle.HIGHEST_PROTOCOL)
+            with open(self.path, mode) as f:
+                f.write(payload)
+            self.pending = {}
+            self._truncate = False
+        except OSError:
+            pass
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""ประกอบข้อมูลแผน (6W2H, Logic Model, KPIs, Risks, ประเด็นตรวจสอบ) เป็นบริบทของ prompt ภายในงบ token
+
+แต่ละตารางเขียนเป็นรายการบรรทัดละแถว เฉพาะคอลัมน์ที่มีความหมายและไม่ว่าง (ไม่มี index, ช่องว่างเติม, NaN)
+ถ้าเกินงบ จะตัดแถวท้ายของแต่ละส่วนตามลำดับความสำคัญ และสรุปแถวที่ตัดเป็นจำนวนต่อประเภทแทน
+
+    ctx = build_plan_context(plan, {"logic_items": logic_df, "audit_issues": issues_df}, budget=3000)
+    ctx.text      # ข้อความที่ใส่ใน prompt
+    ctx.report    # {"plan": {"tokens": 210, "rows": 0, "total_rows": 0}, "logic_items": {...}, ...}
+"""
+import math
+import os
+import re
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+PLAN_CONTEXT_TOKENS = int(os.environ.get("PA_PLAN_CONTEXT_TOKENS", "3000"))
+MAX_FIELD_CHARS = 400  # ข้อความยาวในช่องเดียว (เช่น วัตถุประสงค์ที่วางมาทั้งหน้า) ถูกตัดที่ความยาวนี้
+
+PLAN_FIELDS = [
+    ("plan_title", "ชื่อแผน/เรื่องที่จะตรวจ"),
+    ("program_name", "ชื่อโครงการ/แผนงาน"),
+    ("objectives", "วัตถุประสงค์"),
+    ("scope", "ขอบเขต"),
+    ("assumptions", "สมมุติฐาน/ข้อจำกัด"),
+    ("who", "ใคร (Who)"),
+    ("whom", "ถึงใคร (Whom)"),
+    ("what", "ทำอะไร (What)"),
+    ("where", "ที่ไหน (Where)"),
+    ("when", "เมื่อใด (When)"),
+    ("why", "ทำไม (Why)"),
+    ("how", "อย่างไร (How)"),
+    ("how_much", "เท่าไร (How much)"),
+]
+
+@dataclass(frozen=True)
+class TableSpec:
+    heading: str
+    columns: tuple        # คอลัมน์ที่ใส่ในบรรทัด ตามลำดับ (คอลัมน์แรกเป็นข้อความหลัก)
+    group_by: str = ""    # คอลัมน์ที่ใช้สรุปแถวที่ถูกตัด
+    weight: float = 1.0   # สัดส่วนงบในรอบแรก
+
+# เรียงตามลำดับความสำคัญ: งบที่เหลือในรอบสองให้ส่วนที่อยู่ก่อน
+TABLE_SPECS = {
+    "audit_issues": TableSpec("ประเด็นที่เพิ่มจากรายงานเก่า", ("title", "rationale"), weight=2.0),
+    "logic_items": TableSpec("Logic Model", ("description", "type", "metric", "target", "unit"), group_by="type", weight=2.0),
+    "kpis": TableSpec("KPIs", ("name", "level", "target", "unit"), group_by="level"),
+    "risks": TableSpec("ความเสี่ยง", ("description", "likelihood", "impact"), group_by="category"),
+}
+
+_PIECE_RE = re.compile(r"[\u0E00-\u0E7F]+|[A-Za-z]+|\d+|\S")
+
+def count_tokens(text: str) -> int:
+    """ประมาณจำนวน token (ไม่ต้องโหลด tokenizer): ไทย ~2.5 ตัวอักษร/token, อังกฤษ ~4 ตัวอักษร/token,
+    ตัวเลข ~3 หลัก/token, เครื่องหมายอื่นตัวละ 1 token ค่าที่ได้ตั้งใจให้สูงกว่าจริงเล็กน้อย
+    """
+    total = 0
+    for piece in _PIECE_RE.findall(text):
+        c = piece[0]
+        if "\u0E00" <= c <= "\u0E7F":
+            total += math.ceil(len(piece) / 2.5)
+        elif c.isalpha():
+            total += math.ceil(len(piece) / 4)
+        elif c.isdigit():
+            total += math.ceil(len(piece) / 3)
+        else:
+            total += 1
+    return total
+
+def _clean(value, limit: int = MAX_FIELD_CHARS) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    text = " ".join(str(value).split())
+    return text if limit is None or len(text) <= limit else text[:limit].rstrip() + "…"
+
+def _row_lines(df: pd.DataFrame, columns) -> list:
+    """หนึ่งบรรทัดต่อแถว: "- ข้อความหลัก | คอลัมน์: ค่า | ..." ข้ามคอลัมน์ที่ไม่มีหรือว่าง (แถวที่ว่างทั้งแถวได้ "")"""
+    columns = [c for c in columns if c in df.columns]
+    lines = []
+    for values in df[columns].itertuples(index=False, name=None):
+        parts = []
+        for col, value in zip(columns, values):
+            text = _clean(value)
+            if text:
+                parts.append(text if not parts else f"{col}: {text}")
+        lines.append("- " + " | ".join(parts) if parts else "")
+    return lines
+
+def _omitted_note(df: pd.DataFrame, spec: TableSpec, start: int) -> str:
+    rest = df.iloc[start:]
+    note = f"(และอีก {len(rest)} รายการ"
+    if spec.group_by in rest.columns:
+        counts = rest[spec.group_by].map(_clean).replace("", "-").value_counts()
+        note += ": " + ", ".join(f"{k} {v}" for k, v in counts.items())
+    return note + ")"
+
+@dataclass
+class PlanContext:
+    text: str
+    budget: int
+    report: dict = field(default_factory=dict)
+
+    @property
+    def tokens(self) -> int:
+        return sum(r["tokens"] for r in self.report.values())
+
+    @property
+    def truncated(self) -> bool:
+        return any(r["rows"] < r["total_rows"] for r in self.report.values())
+
+def _plan_header(plan: dict, budget: int, counter) -> tuple:
+    """ส่วนหัวของแผนที่ไม่เกิน budget token คืน (ข้อความ, จำนวนช่องที่ไม่ถูกตัดเพราะงบ, จำนวนช่องที่มีค่า)
+
+    ถ้าเกินงบ ลดความยาวสูงสุดต่อช่องลงเท่ากันทุกช่อง (ช่องยาวถูกตัดก่อน) ถ้ายังเกินจึงตัดช่องท้ายออก
+    """
+    fields = [(label, _clean(plan.get(key), limit=None)) for key, label in PLAN_FIELDS]
+    fields = [(label, value) for label, value in fields if value]
+
+    def render(items, limit):
+        return "\n".join(f"{label}: {_clean(value, limit)}" for label, value in items)
+
+    header = render(fields, MAX_FIELD_CHARS)
+    if counter(header) <= budget:
+        return header, len(fields), len(fields)
+    lo, hi = 0, MAX_FIELD_CHARS
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if counter(render(fields, mid)) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    items = fields
+    while items and counter(render(items, max(lo, 1))) > budget:
+        items = items[:-1]
+    limit = max(lo, 1)
+    return render(items, limit), sum(len(v) <= limit for _, v in items), len(fields)
+
+def build_plan_context(plan: dict, tables: dict, budget: int = PLAN_CONTEXT_TOKENS, counter=count_tokens) -> PlanContext:
+    """บริบทของแผนที่ไม่เกิน budget token (ตามตัวนับ counter) พร้อมรายงาน token/จำนวนแถวต่อส่วน
+
+    tables: {ชื่อใน TABLE_SPECS: DataFrame} ส่วนหัวของแผนใส่ก่อนและนับรวมในงบ (ถ้าเกินงบจะถูกตัด ดู _plan_header)
+    รอบแรกแบ่งงบที่เหลือให้แต่ละตารางตาม weight รอบสองให้งบที่เหลือแก่ตารางตามลำดับใน TABLE_SPECS
+    แถวที่ไม่ได้ใส่ถูกสรุปเป็นหนึ่งบรรทัด ตารางที่แม้แต่หัวข้อกับบรรทัดสรุปก็ไม่พอใส่จะไม่ถูกใส่เลย (rows = 0)
+    """
+    header, full_fields, n_fields = _plan_header(plan, budget, counter)
+    report = {"plan": {"tokens": counter(header), "rows": 0, "total_rows": 0}}
+    if full_fields < n_fields:
+        # ส่วนหัวถูกตัด: รายงานเป็นจำนวนช่องที่ใส่ครบ / ช่องที่มีค่า
+        report["plan"].update(rows=full_fields, total_rows=n_fields)
+
+    sections = []
+    for name, spec in TABLE_SPECS.items():
+        df = tables.get(name)
+        if df is None or df.empty:
+            continue
+        lines = _row_lines(df, spec.columns)
+        df = df[[bool(line) for line in lines]]
+        lines = [line for line in lines if line]
+        if lines:
+            sections.append((name, spec, df, lines, [counter(line) + 1 for line in lines]))
+
+    # เผื่อหัวข้อและบรรทัดสรุปของแต่ละส่วนไว้ก่อน ตามลำดับความสำคัญ ส่วนที่เผื่อไม่พอถูกข้าม
+    remaining = budget - report["plan"]["tokens"]
+    skipped = []
+    for section in list(sections):
+        name, spec, df, lines, _ = section
+        overhead = counter(f"---\n{spec.heading}:") + counter(_omitted_note(df, spec, 0))
+        if overhead > remaining:
+            sections.remove(section)
+            skipped.append((name, len(lines)))
+        else:
+            remaining -= overhead
+    kept = {name: 0 for name, *_ in sections}
+    total_weight = sum(spec.weight for _, spec, *_ in sections) or 1.0
+    for pass_no in (1, 2):
+        available = remaining
+        for name, spec, _, _, costs in sections:
+            limit = available * spec.weight / total_weight if pass_no == 1 else remaining
+            used = 0
+            while kept[name] < len(costs) and used + costs[kept[name]] <= limit:
+                used += costs[kept[name]]
+                kept[name] += 1
+            remaining -= used
+
+    parts = [header]
+    for name, spec, df, lines, costs in sections:
+        body = lines[:kept[name]]
+        if kept[name] < len(lines):
+            body.append(_omitted_note(df, spec, kept[name]))
+        section = f"---\n{spec.heading}:\n" + "\n".join(body)
+        parts.append(section)
+        report[name] = {"tokens": counter(section), "rows": kept[name], "total_rows": len(lines)}
+    for name, total_rows in skipped:
+        report[name] = {"tokens": 0, "rows": 0, "total_rows": total_rows}
+    return PlanContext(text="\n".join(parts), budget=budget, report=report)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""ตัวกรอง findings ตามค่าของคอลัมน์ (ปี, หน่วยงาน, โครงการ, หมวดสาเหตุ, ความรุนแรง) ก่อนคำนวณคะแนน
+
+สร้างครั้งเดียวต่อ library: แต่ละคอลัมน์เก็บรหัสของค่ารายแถว และ inverted index (ตำแหน่งแถวที่เรียงแล้วต่อค่า)
+การกรองรวมตำแหน่งของค่าที่เลือกในคอลัมน์เดียวกัน แล้วหาส่วนร่วมข้ามคอลัมน์ (เริ่มจากชุดที่เล็กที่สุด)
+engine.search(..., rows=ตำแหน่งที่ได้) จึงคูณเฉพาะแถวที่ผ่านตัวกรอง
+
+    facets = FacetIndex.from_findings(findings)
+    rows = facets.select({"year": facets.values_between("year", 2563, 2567), "severity": [4, 5]})
+    engine.search("การจัดซื้อจัดจ้างล่าช้า", top_k=8, rows=rows)
+    facets.counts("unit", filters)   # จำนวนแถวต่อหน่วยงาน ภายใต้ตัวกรองของคอลัมน์อื่น
+"""
+import numpy as np
+import pandas as pd
+
+FACET_COLUMNS = ("year", "unit", "program", "cause_category", "severity")
+
+class Facet:
+    """ค่าของคอลัมน์หนึ่งคอลัมน์: values (เรียงแล้ว), codes รายแถว (-1 = ไม่มีค่า/ถูกซ่อน), postings ต่อค่า"""
+    __slots__ = ("values", "codes", "postings", "totals")
+
+    def __init__(self, series: pd.Series, excluded: np.ndarray = None):
+        codes, values = pd.factorize(series, sort=True)
+        codes = codes.astype(np.int32, copy=False)
+        if excluded is not None and len(excluded):
+            codes[excluded] = -1
+        self.values = values.tolist()
+        self.codes = codes
+        # argsort แบบ stable: ตำแหน่งของแต่ละค่าเรียงจากน้อยไปมากอยู่แล้ว
+        order = np.argsort(codes, kind="stable").astype(np.int64)
+        self.totals = np.bincount(codes + 1, minlength=len(self.values) + 1)[1:]
+        bounds = np.concatenate([[0], np.cumsum(self.totals)]) + int((codes < 0).sum())
+        self.postings = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.values))]
+
+class FacetIndex:
+    """inverted index ของ FACET_COLUMNS ตำแหน่งแถวตรงกับตำแหน่งที่ engine ใช้ (ลำดับของ FindingsView ถ้าเป็น view)"""
+
+    def __init__(self, columns: dict, n_rows: int, excluded: np.ndarray = None):
+        self.n_rows = n_rows
+        self.facets = {name: Facet(series, excluded) for name, series in columns.items()}
+
+    @classmethod
+    def from_findings(cls, findings, columns=FACET_COLUMNS) -> "FacetIndex":
+        """findings เป็น DataFrame หรือ FindingsView (แถวของ base ที่ถูกแทนที่จะไม่ผ่านตัวกรองใด ๆ)"""
+        from .findings import FindingsView
+        if isinstance(findings, FindingsView):
+            parts = [df for df in (findings.base, findings.rows) if len(df)]
+            n = sum(len(df) for df in parts)
+            # base อาจว่างและไม่มีคอลัมน์ (ไม่มีไฟล์หลัก) หรือขาดบางคอลัมน์ -> แถวของส่วนนั้นไม่มีค่า
+            cols = {c: pd.concat([df[c] if c in df.columns else pd.Series(None, index=range(len(df)), dtype=object)
+                                  for df in parts], ignore_index=True)
+                    for c in columns if any(c in df.columns for df in parts)}
+            return cls(cols, n, findings.hidden)
+        return cls({c: findings[c].reset_index(drop=True) for c in columns if c in findings.columns}, len(findings))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.facets
+
+    def values(self, name: str) -> list:
+        return self.facets[name].values
+
+    def values_between(self, name: str, lo, hi) -> list:
+        """ค่าของคอลัมน์ตัวเลข (ปี, ความรุนแรง) ที่อยู่ในช่วง [lo, hi]"""
+        return [v for v in self.facets[name].values if lo <= v <= hi]
+
+    def _rows_for(self, name: str, selected) -> np.ndarray:
+        facet = self.facets[name]
+        pos = {v: i for i, v in enumerate(facet.values)}
+        parts = [facet.postings[pos[v]] for v in selected if v in pos]
+        if len(parts) == 1:
+            return parts[0]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+    def select(self, filters: dict, skip: str = None):
+        """ตำแหน่งแถว (เรียงแล้ว) ที่ผ่านทุกตัวกรอง หรือ None ถ้าไม่มีตัวกรอง (ทุกแถว)
+
+        filters: {คอลัมน์: ค่าที่เลือก} ค่าว่าง/None = ไม่กรองคอลัมน์นั้น คอลัมน์ที่ไม่มีใน index ถูกข้าม
+        skip: ไม่ใช้ตัวกรองของคอลัมน์นี้ (ใช้นับจำนวนของคอลัมน์นั้นเอง)
+        """
+        active = [(k, v) for k, v in (filters or {}).items() if v and k != skip and k in self.facets]
+        if not active:
+            return None
+        sets = sorted((self._rows_for(k, v) for k, v in active), key=len)
+        rows = sets[0]
+        for other in sets[1:]:
+            if not len(rows):
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+    def counts(self, name: str, filters: dict = None) -> dict:
+        """{ค่า: จำนวนแถว} ของคอลัมน์นี้ ภายใต้ตัวกรองของคอลัมน์อื่น (ไม่รวมตัวกรองของคอลัมน์นี้เอง)"""
+        facet = self.facets[name]
+        rows = self.select(filters, skip=name)
+        if rows is None:
+            totals = facet.totals
+        else:
+            totals = np.bincount(facet.codes[rows] + 1, minlength=len(facet.values) + 1)[1:]
+        return dict(zip(facet.values, totals.tolist()))
@@ -0,0 +1,475 @@
+# -*- coding: utf-8 -*-
+"""อ่านและทำความสะอาด FindingsLibrary (CSV/XLSX) โดยไม่ขึ้นกับ Streamlit"""
+import hashlib
+import io
+import itertools
+import json
+import os
+import tempfile
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .profiling import stage
+
+FINDINGS_DB_PATH = "FindingsLibrary.csv"
+FINDINGS_COLUMNS = [
+    "finding_id", "issue_title", "unit", "program", "year",
+    "cause_category", "cause_detail", "issue_detail", "recommendation",
+    "outcomes_impact", "severity"
+]
+
+def read_findings_file(file, name: str):
+    """อ่านไฟล์ CSV หรือ Excel (ชีต 'Data' ถ้ามี ไม่เช่นนั้นชีตแรก)
+
+    คืน (DataFrame, ชื่อชีตที่อ่าน) โดยชื่อชีตเป็น None สำหรับ CSV
+    """
+    if name.endswith(".csv"):
+        return pd.read_csv(file), None
+    if name.endswith((".xlsx", ".xls")):
+        xls = pd.ExcelFile(file)
+        sheet = "Data" if "Data" in xls.sheet_names else xls.sheet_names[0]
+        return pd.read_excel(xls, sheet_name=sheet), sheet
+    raise ValueError(f"ไม่รองรับไฟล์ชนิดนี้: {name}")
+
+def clean_findings(findings_df: pd.DataFrame) -> pd.DataFrame:
+    """เติมค่าว่างของคอลัมน์ข้อความ และแปลง year/severity เป็นตัวเลข (severity อยู่ในช่วง 1-5, ปีที่เกินช่วง int16 เป็น 0)"""
+    if findings_df.empty:
+        return findings_df
+    for c in ["issue_title","issue_detail","cause_detail","recommendation","program","unit"]:
+        if c in findings_df.columns:
+            findings_df[c] = findings_df[c].fillna("")
+    if "year" in findings_df.columns:
+        year = pd.to_numeric(findings_df["year"], errors="coerce")
+        # ปีที่เกินช่วงของ INT_DTYPES["year"] (เช่น พิมพ์วันที่ทั้งวันลงช่องปี) ถือว่าไม่ทราบปี เหมือนค่าที่อ่านไม่ได้
+        findings_df["year"] = year.where(_in_int_range(year, INT_DTYPES["year"])).fillna(0).astype(int)
+    if "severity" in findings_df.columns:
+        findings_df["severity"] = pd.to_numeric(findings_df["severity"], errors="coerce").fillna(3).clip(1,5).astype(int)
+    return findings_df
+
+# ----------------- Streaming Ingest -----------------
+# เพดานหน่วยความจำโดยประมาณของข้อมูลหนึ่งช่วงระหว่างแปลงไฟล์ (MB) จำนวนแถวต่อช่วงคำนวณจากขนาดแถวจริง
+INGEST_MEMORY_MB = float(os.environ.get("PA_INGEST_MEMORY_MB", "128"))
+INGEST_MIN_CHUNK_ROWS = 1000
+# ระหว่างแปลง ข้อมูลหนึ่งช่วงมีอยู่หลายสำเนาพร้อมกัน (ดิบ, หลัง _conform, Arrow table, buffer ของ Parquet) วัดจริงราว 6 เท่า
+_INGEST_COPIES = 6
+
+def _chunk_rows(sample: pd.DataFrame, memory_mb: float) -> int:
+    per_row = sample.memory_usage(deep=True).sum() / max(1, len(sample))
+    return max(INGEST_MIN_CHUNK_ROWS, int(memory_mb * 1e6 / _INGEST_COPIES / max(per_row, 1.0)))
+
+def _iter_csv(file, memory_mb: float):
+    own = isinstance(file, (str, os.PathLike))
+    f = open(file, "rb") if own else file
+    try:
+        total = os.fstat(f.fileno()).st_size if own else len(f.getbuffer()) if hasattr(f, "getbuffer") else 0
+        # ทุกคอลัมน์อ่านเป็นข้อความ ชนิดจึงเหมือนกันทุกช่วง (year/severity แปลงทีหลังใน clean_findings)
+        with pd.read_csv(f, dtype=str, iterator=True) as reader:
+            size = INGEST_MIN_CHUNK_ROWS
+            while True:
+                try:
+                    df = reader.get_chunk(size)
+                except StopIteration:
+                    break
+                yield df, min(1.0, f.tell() / total) if total else 0.0
+                size = _chunk_rows(df, memory_mb)
+    finally:
+        if own:
+            f.close()
+
+def _iter_xlsx(ws, memory_mb: float):
+    total = max(1, (ws.max_row or 1) - 1)
+    rows = ws.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = [str(h).strip() if h is not None else f"Unnamed: {i}" for i, h in enumerate(header)]
+    width, done, size = len(columns), 0, INGEST_MIN_CHUNK_ROWS
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            break
+        done += len(batch)
+        batch = [(row + (None,) * width)[:width] for row in batch if any(v not in (None, "") for v in row)]
+        df = pd.DataFrame(batch, columns=columns, dtype=object)
+        yield df, min(1.0, done / total)
+        size = _chunk_rows(df, memory_mb)
+
+def iter_findings_chunks(file, name: str, memory_mb: float = None):
+    """อ่านไฟล์ CSV/XLSX ทีละช่วงโดยไม่โหลดทั้งไฟล์ คืน (ชื่อชีต, iterator ของ (DataFrame ดิบ, สัดส่วนที่อ่านแล้ว))
+
+    CSV ใช้ read_csv แบบ iterator, XLSX ใช้ openpyxl แบบ read-only (iter_rows) ชีต 'Data' ถ้ามี ไม่เช่นนั้นชีตแรก
+    จำนวนแถวต่อช่วงปรับตามขนาดแถวจริงให้ข้อมูลหนึ่งช่วงไม่เกิน memory_mb (ค่าเริ่มต้น INGEST_MEMORY_MB)
+    """
+    memory_mb = memory_mb or INGEST_MEMORY_MB
+    if name.endswith(".csv"):
+        return None, _iter_csv(file, memory_mb)
+    if name.endswith(".xlsx"):
+        from openpyxl import load_workbook
+        wb = load_workbook(file, read_only=True, data_only=True)
+        sheet = "Data" if "Data" in wb.sheetnames else wb.sheetnames[0]
+
+        def chunks():
+            try:
+                yield from _iter_xlsx(wb[sheet], memory_mb)
+            finally:
+                wb.close()
+        return sheet, chunks()
+    # .xls (openpyxl อ่านไม่ได้) อ่านทั้งไฟล์ครั้งเดียว
+    df, sheet = read_findings_file(file, name)
+    return sheet, iter([(df, 1.0)])
+
+# ----------------- Columnar Store -----------------
+# ไฟล์ต้นฉบับ (CSV/XLSX) ถูกแปลงเป็น Parquet ครั้งเดียว เก็บไว้ที่ <FINDINGS_STORE_DIR>/<hash ของไบต์ไฟล์>.parquet
+# การโหลดครั้งต่อไปอ่านเฉพาะคอลัมน์ที่ต้องใช้จาก Parquet ถ้าไม่มี pyarrow จะอ่านไฟล์ต้นฉบับตรง ๆ เหมือนเดิม
+FINDINGS_STORE_DIR = os.environ.get("PA_FINDINGS_STORE_DIR", ".findings_store")
+STORE_FORMAT_VERSION = 2
+_NUMERIC_DEFAULTS = {"year": 0, "severity": 3}
+# dtype ในหน่วยความจำ: ป้ายที่ซ้ำกันมากเป็น category, ตัวเลขเป็น int ขนาดเล็ก, ข้อความยาวเป็น string แบบ Arrow
+CATEGORY_COLUMNS = ["unit", "program", "cause_category"]
+INT_DTYPES = {"year": "int16", "severity": "int8"}
+
+def _in_int_range(values: pd.Series, dtype: str) -> pd.Series:
+    info = np.iinfo(dtype)
+    return values.between(info.min, info.max)
+
+def columnar_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def findings_schema(extra_columns=()):
+    """schema ของ FindingsLibrary: year int16, severity int8 ที่เหลือเป็นข้อความ (คอลัมน์เพิ่มเติมเก็บเป็นข้อความ)
+
+    CATEGORY_COLUMNS เก็บเป็นข้อความธรรมดา (Parquet เข้ารหัสแบบ dictionary อยู่แล้ว) และอ่านกลับเป็น category
+    """
+    import pyarrow as pa
+    fields = [(c, getattr(pa, INT_DTYPES[c])() if c in INT_DTYPES else pa.string()) for c in FINDINGS_COLUMNS]
+    return pa.schema(fields + [(c, pa.string()) for c in extra_columns])
+
+def compact_findings(findings_df: pd.DataFrame) -> pd.DataFrame:
+    """แปลง dtype ให้ตรงกับที่อ่านจาก Parquet (ใช้หลัง concat/แก้ไขแถว หรือเมื่อไม่มี pyarrow)"""
+    for c in findings_df.columns:
+        if c in INT_DTYPES:
+            values = findings_df[c]
+            if not isinstance(values.dtype, np.dtype) or values.dtype != INT_DTYPES[c]:
+                # astype ของ numpy ไม่ตรวจ overflow ค่าที่เกินช่วงจะวนเป็นตัวเลขอื่นเงียบ ๆ -> ใช้ค่าเริ่มต้นแทน
+                values = pd.to_numeric(values, errors="coerce")
+                values = values.where(_in_int_range(values, INT_DTYPES[c]), _NUMERIC_DEFAULTS[c])
+            findings_df[c] = values.astype(INT_DTYPES[c])
+        elif c in CATEGORY_COLUMNS:
+            findings_df[c] = findings_df[c].astype("category")
+        elif columnar_available():
+            findings_df[c] = findings_df[c].astype(pd.StringDtype("pyarrow"))
+    return findings_df
+
+def file_content_hash(file) -> str:
+    """sha256 ของไบต์ไฟล์ (path หรือ file object เช่น UploadedFile/BytesIO ตำแหน่งอ่านถูกคืนค่าเดิม)"""
+    h = hashlib.sha256()
+    h.update(f"v{STORE_FORMAT_VERSION}".encode())
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    elif hasattr(file, "getbuffer"):
+        h.update(file.getbuffer())
+    else:
+        pos = file.tell()
+        file.seek(0)
+        h.update(file.read())
+        file.seek(pos)
+    return h.hexdigest()[:32]
+
+def _source_hash(path: str, store_dir: str) -> str:
+    """file_content_hash ของไฟล์บนดิสก์ จำไว้ใน sources.json ตาม (path, ขนาด, mtime) เพื่อไม่ต้องอ่านไฟล์ใหญ่ซ้ำทุกครั้ง"""
+    st = os.stat(path)
+    source = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+    manifest_path = os.path.join(store_dir, "sources.json")
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    if source not in manifest:
+        manifest = {k: v for k, v in manifest.items() if not k.startswith(os.path.abspath(path) + "|")}
+        manifest[source] = file_content_hash(path)
+        try:
+            os.makedirs(store_dir, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=store_dir, prefix=".tmp-", suffix=".json")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False)
+            os.replace(tmp, manifest_path)
+        except OSError:
+            pass
+    return manifest[source]
+
+def _conform(findings_df: pd.DataFrame) -> pd.DataFrame:
+    """เติมคอลัมน์ที่ขาดให้ครบ FINDINGS_COLUMNS แล้วแปลงชนิดให้ตรง findings_schema()"""
+    findings_df = clean_findings(findings_df)
+    for c in FINDINGS_COLUMNS:
+        if c not in findings_df.columns:
+            findings_df[c] = _NUMERIC_DEFAULTS.get(c, "")
+    extras = [c for c in findings_df.columns if c not in FINDINGS_COLUMNS]
+    for c in FINDINGS_COLUMNS + extras:
+        if c not in _NUMERIC_DEFAULTS:
+            findings_df[c] = findings_df[c].fillna("").astype(str)
+    return findings_df[FINDINGS_COLUMNS + extras]
+
+def source_hash(file, store_dir: str = None) -> str:
+    """file_content_hash ของไฟล์ (path บนดิสก์ใช้ค่าที่จำไว้ใน sources.json ถ้าไฟล์ไม่เปลี่ยน)"""
+    if isinstance(file, (str, os.PathLike)):
+        return _source_hash(file, store_dir or FINDINGS_STORE_DIR)
+    return file_content_hash(file)
+
+def ingested_path(content_hash: str, store_dir: str = None):
+    """path ของ Parquet ที่แปลงไว้แล้วสำหรับไฟล์ที่มี hash นี้ หรือ None ถ้ายังไม่เคยแปลง"""
+    path = os.path.join(store_dir or FINDINGS_STORE_DIR, f"{content_hash}.parquet")
+    return path if os.path.exists(path) else None
+
+def ingest_findings_file(file, name: str, store_dir: str = None, content_hash: str = None,
+                         memory_mb: float = None, progress=None):
+    """แปลงไฟล์ CSV/XLSX เป็น Parquet (ถ้ายังไม่เคยแปลงไฟล์ที่เนื้อหาเดียวกัน) คืน (path ของ Parquet, ชื่อชีต)
+
+    อ่านและเขียนทีละช่วง (row group) ตาม iter_findings_chunks หน่วยความจำจึงไม่โตตามขนาดไฟล์
+    progress(สัดส่วน 0-1, จำนวนแถวที่อ่านแล้ว) ถูกเรียกหลังแต่ละช่วง
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    store_dir = store_dir or FINDINGS_STORE_DIR
+    path = os.path.join(store_dir, f"{content_hash or source_hash(file, store_dir)}.parquet")
+    if os.path.exists(path):
+        sheet = (pq.read_schema(path).metadata or {}).get(b"pa_sheet", b"").decode() or None
+        return path, sheet
+    with stage("findings.convert", source=os.path.splitext(name)[1].lstrip(".")) as rec:
+        if hasattr(file, "seek"):
+            file.seek(0)
+        sheet, chunks = iter_findings_chunks(file, name, memory_mb)
+        os.makedirs(store_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=store_dir, prefix=".tmp-", suffix=".parquet")
+        os.close(fd)
+        writer, rows, schema = None, 0, None
+        try:
+            for df, fraction in chunks:
+                df = _conform(df)
+                if writer is None:
+                    extras = [c for c in df.columns if c not in FINDINGS_COLUMNS]
+                    schema = findings_schema(extras).with_metadata(
+                        {"pa_sheet": sheet or "", "pa_source": os.path.basename(name)})
+                    writer = pq.ParquetWriter(tmp, schema, compression="lz4")
+                writer.write_table(pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False))
+                rows += len(df)
+                if progress is not None:
+                    progress(fraction, rows)
+            if writer is None:  # ไฟล์ไม่มีข้อมูล
+                schema = findings_schema().with_metadata({"pa_sheet": sheet or "", "pa_source": os.path.basename(name)})
+                pq.write_table(schema.empty_table(), tmp, compression="lz4")
+            else:
+                writer.close()
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        rec["rows"] = rows
+    return path, sheet
+
+def read_columnar(path: str, columns=FINDINGS_COLUMNS) -> pd.DataFrame:
+    """อ่านเฉพาะ columns (ที่มีอยู่ในไฟล์) จาก Parquet"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    names = set(pq.read_schema(path).names)
+    columns = [c for c in columns if c in names]
+    arrow_strings = {pa.string(): pd.StringDtype("pyarrow"), pa.large_string(): pd.StringDtype("pyarrow")}
+    with stage("findings.read_parquet"):
+        table = pq.read_table(path, columns=columns, read_dictionary=[c for c in CATEGORY_COLUMNS if c in columns])
+        # dictionary -> category, string -> string แบบ Arrow (ไม่สร้าง object ของ Python ทีละค่า)
+        return table.to_pandas(types_mapper=arrow_strings.get)
+
+def load_findings_file(file, name: str, columns=FINDINGS_COLUMNS, content_hash: str = None):
+    """อ่านไฟล์ findings หนึ่งไฟล์ผ่าน columnar store คืน (DataFrame ที่ทำความสะอาดแล้ว, ชื่อชีต)"""
+    if not columnar_available():
+        df, sheet = read_findings_file(file, name)
+        df = _conform(df)
+        return compact_findings(df[[c for c in columns if c in df.columns]]), sheet
+    path, sheet = ingest_findings_file(file, name, content_hash=content_hash)
+    return read_columnar(path, columns), sheet
+
+# ----------------- Merge / Library Version -----------------
+# คอลัมน์ที่ใช้ทำคีย์ของแถวที่ไม่มี finding_id (ข้อความหลักหลัง normalize)
+KEY_TEXT_COLUMNS = ["issue_title", "issue_detail", "cause_detail", "unit", "program", "year"]
+
+@dataclass
+class MergeReport:
+    """ผลการรวมไฟล์ที่อัปโหลดเข้ากับ library: จำนวนแถวที่เพิ่ม/แก้ไข/ซ้ำ และ version ของ library หลังรวม"""
+    added: int = 0
+    updated: int = 0
+    duplicates: int = 0
+    version: str = ""
+
+def library_version(*content_hashes) -> str:
+    """ID ของ library ที่ได้จากการรวมไฟล์ตามลำดับ (hash ของไฟล์ต้นฉบับ) เนื้อหาเดิม = ID เดิมเสมอ"""
+    h = hashlib.sha256(f"library-v{STORE_FORMAT_VERSION}".encode())
+    for content_hash in content_hashes:
+        h.update(b"|" + content_hash.encode())
+    return h.hexdigest()[:16]
+
+def finding_keys(findings_df: pd.DataFrame) -> pd.Series:
+    """คีย์ของแต่ละแถว: "id:<finding_id>" หรือ "text:<hash>" ของข้อความหลักที่ normalize แล้ว ถ้าไม่มี ID"""
+    from .analyzers import normalize_text
+    ids = findings_df["finding_id"].fillna("").astype(str).str.strip() if "finding_id" in findings_df.columns \
+        else pd.Series("", index=findings_df.index)
+    keys = ("id:" + ids).astype(object)
+    missing = (ids == "").to_numpy()
+    if missing.any():
+        cols = [c for c in KEY_TEXT_COLUMNS if c in findings_df.columns]
+        text = findings_df.loc[missing, cols].astype(str).agg("\x1f".join, axis=1)
+        text = text.map(lambda t: " ".join(normalize_text(t).split()))
+        keys[missing] = "text:" + pd.Series(
+            pd.util.hash_pandas_object(text, index=False, categorize=False).to_numpy(), index=text.index
+        ).map("{:016x}".format)
+    return keys
+
+def _match_findings(base_df: pd.DataFrame, new_df: pd.DataFrame):
+    """จับคู่แถวของ new_df กับ base_df ตาม finding_keys คืน (แถวของ new_df ที่ต้องใช้, ตำแหน่งใน base หรือ -1, report)
+
+    แถวที่คืนมีเฉพาะแถวใหม่และแถวที่เนื้อหาเปลี่ยน (ซ้ำกันเองในไฟล์เก็บแถวสุดท้าย เหมือนเดิมทุกคอลัมน์นับเป็นซ้ำ)
+    """
+    report = MergeReport()
+    if new_df.empty:
+        return new_df.iloc[:0], np.empty(0, dtype=np.int64), report
+    new_keys = finding_keys(new_df)
+    keep = ~new_keys.duplicated(keep="last").to_numpy()
+    report.duplicates = int((~keep).sum())
+    new_df, new_keys = new_df[keep], new_keys[keep]
+    if base_df.empty:
+        report.added = len(new_df)
+        return new_df.reset_index(drop=True), np.full(len(new_df), -1, dtype=np.int64), report
+
+    base_keys = finding_keys(base_df)
+    base_pos = pd.Series(np.arange(len(base_df)), index=base_keys.to_numpy())
+    base_pos = base_pos[~base_pos.index.duplicated(keep="last")]
+    pos = base_pos.reindex(new_keys.to_numpy()).fillna(-1).astype(np.int64).to_numpy()
+    matched = pos >= 0
+
+    new_df = new_df.reindex(columns=list(base_df.columns))
+    row_hash = lambda df: pd.util.hash_pandas_object(df.astype(str), index=False, categorize=False).to_numpy()
+    same = np.zeros(len(new_df), dtype=bool)
+    if matched.any():
+        same[matched] = row_hash(new_df[matched]) == row_hash(base_df.iloc[pos[matched]])
+    report.duplicates += int(same.sum())
+    report.updated = int((matched & ~same).sum())
+    report.added = int((~matched).sum())
+    return new_df[~same].reset_index(drop=True), pos[~same], report
+
+def merge_findings(base_df: pd.DataFrame, new_df: pd.DataFrame):
+    """upsert new_df เข้า base_df ตาม finding_keys คืน (DataFrame ที่รวมแล้ว, MergeReport ที่ยังไม่มี version)
+
+    แถวที่คีย์ใหม่ต่อท้าย (ลำดับเดิมของ base ไม่เปลี่ยน ดัชนีแบบ incremental จึงเติมได้โดยไม่ fit ใหม่)
+    แถวที่คีย์ตรงแต่เนื้อหาต่างแทนที่แถวเดิม แถวที่เหมือนเดิมทุกคอลัมน์ หรือซ้ำกันเองในไฟล์ (เก็บแถวสุดท้าย) นับเป็นซ้ำ
+    """
+    view, report = overlay_findings(base_df, new_df)
+    if view.base is base_df and not len(view.rows):
+        return base_df, report
+    return view.to_frame(), report
+
+# ----------------- Shared Library / Session Overlay -----------------
+class FindingsView:
+    """library ที่ session เห็น = base ที่แชร์กันทั้ง process (อ่านอย่างเดียว ห้ามแก้) + แถวของ session เอง
+
+    rows คือแถวจากไฟล์ที่อัปโหลด (เพิ่มใหม่หรือแก้ไข) และ base_pos คือตำแหน่งใน base ที่แถวนั้นแทนที่ (-1 = แถวใหม่)
+    ตำแหน่งแถวของ view: 0..len(base)-1 เป็นแถวของ base (แถวที่ถูกแทนที่ยังอยู่แต่ถูกซ่อน) ตามด้วยแถวของ rows
+    หน่วยความจำของแต่ละ session จึงเท่ากับขนาดไฟล์ที่อัปโหลด ไม่ใช่ขนาดของ library
+    """
+
+    def __init__(self, base: pd.DataFrame, rows: pd.DataFrame = None, base_pos: np.ndarray = None,
+                 base_version: str = ""):
+        self.base = base
+        self.rows = rows if rows is not None else base.iloc[:0]
+        self.base_pos = base_pos if base_pos is not None else np.full(len(self.rows), -1, dtype=np.int64)
+        self.base_version = base_version
+
+    def __len__(self):
+        return len(self.base) + int((self.base_pos < 0).sum())
+
+    @property
+    def empty(self) -> bool:
+        return len(self) == 0
+
+    @property
+    def columns(self):
+        return self.base.columns if len(self.base.columns) else self.rows.columns
+
+    @property
+    def hidden(self) -> np.ndarray:
+        """ตำแหน่งของแถวใน base ที่ถูกแทนที่ด้วยแถวของ session"""
+        return self.base_pos[self.base_pos >= 0]
+
+    def take(self, positions, columns=None) -> pd.DataFrame:
+        """DataFrame ของแถวตามตำแหน่งใน view (สร้างเฉพาะแถวที่ขอ เรียงตามลำดับที่ขอ)"""
+        positions = np.asarray(positions, dtype=np.int64)
+        columns = list(columns) if columns is not None else list(self.columns)
+        in_base = positions < len(self.base)
+        parts = [self.base.iloc[positions[in_base]][columns],
+                 self.rows.iloc[positions[~in_base] - len(self.base)][columns]]
+        order = np.concatenate([np.flatnonzero(in_base), np.flatnonzero(~in_base)])
+        return pd.concat([p for p in parts if len(p)] or parts[:1]).iloc[np.argsort(order, kind="stable")]
+
+    def to_frame(self) -> pd.DataFrame:
+        """library ทั้งหมดเป็น DataFrame เดียว (แถวที่แก้ไขแทนที่ตำแหน่งเดิม แถวใหม่ต่อท้าย) สร้างสำเนาใหม่ทุกครั้ง
+        ใช้เมื่อต้องการทั้งตารางจริง ๆ เช่น export หรือสร้างดัชนีใหม่ทั้งก้อน
+        """
+        if not len(self.rows):
+            return self.base.copy()
+        if self.base.empty:
+            return self.rows.copy()
+        merged = self.base
+        replaced = self.base_pos >= 0
+        if replaced.any():
+            merged = self.base.copy()
+            for c in merged.columns:
+                if isinstance(merged[c].dtype, pd.CategoricalDtype):
+                    merged[c] = merged[c].astype(str)  # ค่าใหม่อาจไม่อยู่ใน categories เดิม
+                merged.iloc[self.base_pos[replaced], merged.columns.get_loc(c)] = self.rows[c].to_numpy()[replaced]
+        if not replaced.all():
+            merged = pd.concat([merged, self.rows[~replaced]], ignore_index=True)
+        # concat ของ category ที่ categories ต่างกันได้ object -> แปลงกลับให้ dtype เหมือนเดิม
+        return compact_findings(merged)
+
+def overlay_findings(base_df: pd.DataFrame, new_df: pd.DataFrame, base_version: str = ""):
+    """เหมือน merge_findings แต่ไม่แตะ/ไม่คัดลอก base_df คืน (FindingsView, MergeReport ที่ยังไม่มี version)"""
+    rows, pos, report = _match_findings(base_df, new_df)
+    if len(rows):
+        rows = compact_findings(rows)
+    return FindingsView(base_df, rows, pos, base_version), report
+
+def load_library(base_path: str = FINDINGS_DB_PATH, uploaded=None, columns=FINDINGS_COLUMNS):
+    """ฐานข้อมูลหลัก (ถ้ามีไฟล์) รวมกับไฟล์ที่อัปโหลด (path หรือ file object ที่มี .name) แบบ upsert
+
+    คืน (DataFrame, MergeReport) โดย report.version เป็น ID ของ library ที่ cache ปลายทางใช้เป็นคีย์ได้
+    """
+    findings_df, hashes = pd.DataFrame(), []
+    if base_path and os.path.exists(base_path):
+        hashes.append(source_hash(base_path))
+        findings_df, _ = load_findings_file(base_path, base_path, columns, content_hash=hashes[-1])
+    report = MergeReport()
+    if uploaded is not None:
+        name = uploaded if isinstance(uploaded, str) else uploaded.name
+        hashes.append(source_hash(uploaded))
+        uploaded_df, _ = load_findings_file(uploaded, name, columns, content_hash=hashes[-1])
+        findings_df, report = merge_findings(findings_df, uploaded_df)
+    report.version = library_version(*hashes)
+    return findings_df, report
+
+def load_findings(base_path: str = FINDINGS_DB_PATH, uploaded=None, columns=FINDINGS_COLUMNS) -> pd.DataFrame:
+    """เหมือน load_library แต่คืนเฉพาะ DataFrame"""
+    return load_library(base_path, uploaded, columns)[0]
+
+def create_excel_template() -> bytes:
+    """ไฟล์ Excel เปล่าที่มีหัวคอลัมน์ตามโครงสร้าง FindingsLibrary"""
+    df = pd.DataFrame(columns=FINDINGS_COLUMNS)
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        df.to_excel(writer, index=False, sheet_name='FindingsLibrary')
+    return output.getvalue()
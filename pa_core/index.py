@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+"""ดัชนีค้นหา FindingsLibrary: TF-IDF แบบ fit ทั้งชุด, แบบ incremental (hashing) และ LSA
+
+ดัชนีที่ fit แล้วจะถูกเก็บลงดิสก์ (คีย์ด้วย hash ของเนื้อหา FindingsLibrary)
+เพื่อให้ process ใหม่โหลดได้ทันทีโดยไม่ต้อง fit ซ้ำ และ worker หลายตัวบนเครื่องเดียวกัน
+แชร์หน้าหน่วยความจำของ CSR arrays เดียวกันผ่าน memory-map
+sklearn/scipy ถูก import เมื่อใช้งานครั้งแรกเท่านั้น
+"""
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .analyzers import ANALYZERS, DEFAULT_ANALYZER, TokenStore, _pretokenized
+from .profiling import stage
+
+# ----------------- Index Settings -----------------
+INDEX_DIR = os.environ.get("PA_INDEX_DIR", ".index_cache")
+INDEX_FORMAT_VERSION = 4
+INDEX_TEXT_COLS = ["issue_title", "issue_detail", "cause_detail", "recommendation"]
+TFIDF_PARAMS = {"max_features": 20000}
+# "incremental" = hashing features + document frequency ที่เติมแถวใหม่ได้โดยไม่ fit ใหม่
+# "tfidf" = TfidfVectorizer แบบ fit ทั้งชุด (พฤติกรรมเดิม)
+INDEX_MODE = os.environ.get("PA_INDEX_MODE", "incremental")
+HASH_N_FEATURES = 2 ** 18
+# จำนวนแถวที่ส่งให้ hasher ต่อครั้งระหว่าง fit/append
+INDEX_CHUNK_ROWS = int(os.environ.get("PA_INDEX_CHUNK_ROWS", "20000"))
+# สัดส่วนแถวที่เติมเข้ามาหลัง compaction ครั้งล่าสุด ที่จะทำให้คำนวณ idf และน้ำหนักใหม่ทั้งชุด
+INDEX_DRIFT_THRESHOLD = float(os.environ.get("PA_INDEX_DRIFT", "0.1"))
+# จำนวนมิติของ LSA (TruncatedSVD) สำหรับ backend แบบ dense
+LSA_COMPONENTS = int(os.environ.get("PA_LSA_DIM", "256"))
+
+_TOKEN_STORES = {}
+
+def get_token_store(analyzer: str) -> TokenStore:
+    """TokenStore หนึ่งตัวต่อ analyzer ต่อ process"""
+    if analyzer not in _TOKEN_STORES:
+        _TOKEN_STORES[analyzer] = TokenStore(
+            analyzer, os.path.join(INDEX_DIR, f"tokens-{analyzer}-v{INDEX_FORMAT_VERSION}.pkl")
+        )
+    return _TOKEN_STORES[analyzer]
+
+# ----------------- Persisted TF-IDF Index -----------------
+def findings_text(findings_df: pd.DataFrame) -> pd.Series:
+    texts = findings_df[INDEX_TEXT_COLS[0]].fillna("")
+    for c in INDEX_TEXT_COLS[1:]:
+        texts = texts + " " + findings_df[c].fillna("")
+    return texts
+
+def iter_findings_text(findings_df: pd.DataFrame, start: int = 0, chunk_rows: int = INDEX_CHUNK_ROWS):
+    """ข้อความที่ใช้ทำดัชนีทีละแถว ต่อสตริงทีละ chunk_rows แถว (ไม่สร้างสำเนาข้อความของทั้งตารางพร้อมกัน)"""
+    for lo in range(start, len(findings_df), chunk_rows):
+        yield from findings_text(findings_df.iloc[lo:lo + chunk_rows]).tolist()
+
+def findings_row_keys(findings_df: pd.DataFrame) -> np.ndarray:
+    """row_keys จากคอลัมน์ข้อความโดยตรง (ไม่ต้องต่อข้อความของทุกแถวก่อน hash) คอลัมน์ที่ไม่มีนับเป็นข้อความว่าง"""
+    text = findings_df.reindex(columns=INDEX_TEXT_COLS).fillna("")
+    return pd.util.hash_pandas_object(text, index=False, categorize=False).to_numpy(dtype=np.uint64)
+
+def findings_content_hash(findings_df: pd.DataFrame, analyzer: str = DEFAULT_ANALYZER,
+                          mode: str = INDEX_MODE, version: str = None) -> str:
+    """Hash ของข้อความที่ใช้ทำดัชนี + analyzer/พารามิเตอร์ของ vectorizer (ใช้เป็นคีย์ของ artifact)
+
+    ถ้าให้ version (ID ของ library จาก pa_core.findings.load_library) จะใช้แทนการ hash ข้อความทุกแถว
+    """
+    h = hashlib.sha256()
+    params = TFIDF_PARAMS if mode == "tfidf" else {"n_features": HASH_N_FEATURES}
+    h.update(json.dumps({"v": INDEX_FORMAT_VERSION, "mode": mode, "analyzer": analyzer, "params": params},
+                        sort_keys=True).encode("utf-8"))
+    if version:
+        h.update(f"library:{version}".encode("utf-8"))
+        return h.hexdigest()[:32]
+    cols = [c for c in INDEX_TEXT_COLS if c in findings_df.columns]
+    # ข้อความแทบไม่ซ้ำกัน categorize=False จึงเร็วกว่า (ค่า hash เท่าเดิม)
+    h.update(pd.util.hash_pandas_object(findings_df[cols].fillna(""), index=False,
+                                        categorize=False).values.tobytes())
+    return h.hexdigest()[:32]
+
+def _index_path(key: str, mode: str = INDEX_MODE) -> str:
+    return os.path.join(INDEX_DIR, f"{mode}-v{INDEX_FORMAT_VERSION}-{key}")
+
+def save_index_artifact(path: str, meta: dict, arrays: dict, terms=None) -> None:
+    """เขียน arrays (.npy), vocabulary และ meta.json ลงโฟลเดอร์แบบ atomic (เขียนที่ temp แล้ว rename)"""
+    parent = os.path.dirname(path) or "."
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+    try:
+        if terms is not None:
+            with open(os.path.join(tmp, "vocab.json"), "w", encoding="utf-8") as f:
+                json.dump(terms, f, ensure_ascii=False)
+        for name, arr in arrays.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), arr)
+        meta = dict(meta, format_version=INDEX_FORMAT_VERSION,
+                    created=datetime.now().isoformat(timespec="seconds"))
+        # meta.json เขียนเป็นไฟล์สุดท้าย ใช้เป็นตัวบอกว่า artifact สมบูรณ์
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, path)
+    except OSError:
+        # process อื่นเขียน artifact เดียวกันเสร็จก่อน หรือดิสก์เขียนไม่ได้ -> ใช้ดัชนีในหน่วยความจำต่อ
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def load_index_artifact(path: str, names):
+    """โหลด meta และ arrays แบบ memory-map (อ่านอย่างเดียว) คืน None ถ้าไม่มี/เวอร์ชันไม่ตรง/ไฟล์เสีย"""
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format_version") != INDEX_FORMAT_VERSION or meta.get("analyzer") not in ANALYZERS:
+            return None
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in names}
+        return meta, arrays
+    except (OSError, ValueError):
+        return None
+
+def _csr_arrays(X) -> dict:
+    import scipy.sparse as sp
+    X = sp.csr_matrix(X)
+    return {"data": X.data, "indices": X.indices, "indptr": X.indptr}
+
+def _csr_from_arrays(arrays: dict, shape):
+    import scipy.sparse as sp
+    return sp.csr_matrix((arrays["data"], arrays["indices"], arrays["indptr"]), shape=tuple(shape), copy=False)
+
+def save_tfidf_index(path: str, vec: "TfidfVectorizer", X, analyzer: str = DEFAULT_ANALYZER) -> None:
+    terms = [None] * len(vec.vocabulary_)
+    for term, i in vec.vocabulary_.items():
+        terms[i] = term
+    meta = {"analyzer": analyzer, "params": TFIDF_PARAMS, "shape": list(X.shape), "nnz": int(X.nnz)}
+    save_index_artifact(path, meta, dict(_csr_arrays(X), idf=vec.idf_), terms=terms)
+
+def load_tfidf_index(path: str):
+    loaded = load_index_artifact(path, ["data", "indices", "indptr", "idf"])
+    if loaded is None:
+        return None
+    meta, arrays = loaded
+    try:
+        with open(os.path.join(path, "vocab.json"), encoding="utf-8") as f:
+            terms = json.load(f)
+    except (OSError, ValueError):
+        return None
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    vec = TfidfVectorizer(analyzer=ANALYZERS[meta["analyzer"]], **TFIDF_PARAMS)
+    vec.vocabulary_ = {t: i for i, t in enumerate(terms)}
+    vec.idf_ = np.asarray(arrays["idf"])
+    return vec, _csr_from_arrays(arrays, meta["shape"])
+
+# ----------------- Incremental (Append-only) Index -----------------
+def _hash_counts(tokens, chunk_rows: int = INDEX_CHUNK_ROWS):
+    """นับ token ลง hashing features ทีละ chunk_rows แถว (buffer ชั่วคราวของ hasher ไม่โตตามจำนวนแถวทั้งหมด)"""
+    import scipy.sparse as sp
+    from sklearn.feature_extraction.text import HashingVectorizer
+    hasher = HashingVectorizer(analyzer=_pretokenized, n_features=HASH_N_FEATURES,
+                               alternate_sign=False, norm=None)
+    tokens = iter(tokens)
+    parts = []
+    while True:
+        chunk = list(itertools.islice(tokens, chunk_rows))
+        if not chunk and parts:
+            break
+        parts.append(hasher.transform(chunk).tocsr())
+        if len(chunk) < chunk_rows:
+            break
+    return parts[0] if len(parts) == 1 else sp.vstack(parts, format="csr")
+
+def _smooth_idf(doc_freq: np.ndarray, n_docs: int) -> np.ndarray:
+    # สูตรเดียวกับ TfidfTransformer(smooth_idf=True)
+    return np.log((1 + n_docs) / (1 + doc_freq)) + 1.0
+
+def _weight_rows(counts, idf: np.ndarray):
+    import scipy.sparse as sp
+    from sklearn.preprocessing import normalize
+    return normalize(counts @ sp.diags(idf), norm="l2", copy=False).tocsr()
+
+class IncrementalIndex:
+    """TF-IDF บน hashing features (feature space คงที่) ที่เติมแถวใหม่ต่อท้ายได้
+
+    เก็บ document frequency ปัจจุบันไว้ ส่วนน้ำหนักของแถวใช้ idf ชุดเดียวกันทั้งเมทริกซ์ (idf ณ compaction
+    ครั้งล่าสุด) เมื่อสัดส่วนแถวที่เติมเกิน INDEX_DRIFT_THRESHOLD จะ compact: ปรับน้ำหนักทุกแถวด้วย idf ใหม่
+    จาก X เดิมโดยตรง (ไม่ต้องตัดคำหรือ vectorize ใหม่) ใช้แทน vectorizer ได้ผ่าน transform()
+    """
+
+    def __init__(self, analyzer, X, idf, doc_freq, row_keys, compacted_rows):
+        self.analyzer = analyzer
+        self.X = X
+        self.idf = idf
+        self.doc_freq = doc_freq
+        self.row_keys = row_keys
+        self.compacted_rows = compacted_rows
+
+    def __len__(self):
+        return self.X.shape[0]
+
+    @classmethod
+    def fit(cls, analyzer: str, tokens, keys: np.ndarray) -> "IncrementalIndex":
+        counts = _hash_counts(tokens)
+        doc_freq = np.bincount(counts.indices, minlength=HASH_N_FEATURES).astype(np.int64)
+        idf = _smooth_idf(doc_freq, counts.shape[0])
+        return cls(analyzer, _weight_rows(counts, idf), idf, doc_freq, keys, counts.shape[0])
+
+    @property
+    def drift(self) -> float:
+        n = len(self)
+        return (n - self.compacted_rows) / n if n else 0.0
+
+    def transform(self, texts):
+        return _weight_rows(_hash_counts(map(ANALYZERS[self.analyzer], texts)), self.idf)
+
+    def append(self, tokens, keys: np.ndarray) -> "IncrementalIndex":
+        """คืนดัชนีใหม่ที่มีแถวเพิ่ม (ดัชนีเดิมไม่ถูกแก้ เพราะอาจแชร์อยู่กับ session อื่น)"""
+        import scipy.sparse as sp
+        counts = _hash_counts(tokens)
+        doc_freq = self.doc_freq + np.bincount(counts.indices, minlength=HASH_N_FEATURES)
+        X = sp.vstack([self.X, _weight_rows(counts, self.idf)], format="csr")
+        out = IncrementalIndex(self.analyzer, X, self.idf, doc_freq,
+                               np.concatenate([self.row_keys, keys]), self.compacted_rows)
+        return out.compact() if out.drift > INDEX_DRIFT_THRESHOLD else out
+
+    def compact(self) -> "IncrementalIndex":
+        # แถวใน X = tf*idf_old/norm ดังนั้นคูณด้วย idf_new/idf_old แล้ว normalize ใหม่ = tf*idf_new ที่ normalize แล้ว
+        import scipy.sparse as sp
+        from sklearn.preprocessing import normalize
+        idf = _smooth_idf(self.doc_freq, len(self))
+        X = normalize(self.X @ sp.diags(idf / self.idf), norm="l2", copy=False).tocsr()
+        return IncrementalIndex(self.analyzer, X, idf, self.doc_freq, self.row_keys, len(self))
+
+    def save(self, path: str) -> None:
+        meta = {"analyzer": self.analyzer, "n_features": HASH_N_FEATURES, "shape": list(self.X.shape),
+                "nnz": int(self.X.nnz), "compacted_rows": int(self.compacted_rows)}
+        save_index_artifact(path, meta, dict(_csr_arrays(self.X), idf=self.idf,
+                                             doc_freq=self.doc_freq, row_keys=self.row_keys))
+
+    @classmethod
+    def load(cls, path: str):
+        loaded = load_index_artifact(path, ["data", "indices", "indptr", "idf", "doc_freq", "row_keys"])
+        if loaded is None:
+            return None
+        meta, arrays = loaded
+        if meta.get("n_features") != HASH_N_FEATURES:
+            return None
+        return cls(meta["analyzer"], _csr_from_arrays(arrays, meta["shape"]), arrays["idf"],
+                   arrays["doc_freq"], arrays["row_keys"], meta["compacted_rows"])
+
+# ดัชนีแบบ incremental ที่สร้างล่าสุดต่อ analyzer (ทั้ง process) ใช้หาฐานที่จะเติมแถวต่อ
+_INDEX_REGISTRY = {}
+
+def _find_prefix_index(keys: np.ndarray, analyzer: str):
+    best = None
+    for idx in _INDEX_REGISTRY.get(analyzer, []):
+        n = len(idx)
+        if n <= len(keys) and (best is None or n > len(best)) and np.array_equal(idx.row_keys, keys[:n]):
+            best = idx
+    return best
+
+def build_incremental_index(findings_df: pd.DataFrame, analyzer: str = DEFAULT_ANALYZER,
+                            content_hash: str = None) -> IncrementalIndex:
+    if content_hash is None:
+        content_hash = findings_content_hash(findings_df, analyzer, "incremental")
+    path = _index_path(content_hash, "incremental")
+    with stage("index.load"):
+        idx = IncrementalIndex.load(path)
+    if idx is None:
+        keys = findings_row_keys(findings_df)
+        store = get_token_store(analyzer)
+        base = _find_prefix_index(keys, analyzer)
+        if base is None:
+            with stage("index.fit", rows=len(keys)):
+                idx = IncrementalIndex.fit(analyzer, store.tokenize(iter_findings_text(findings_df), keys), keys)
+        elif len(base) == len(keys):
+            idx = base
+        else:
+            # แถวเดิมครบ (เช่น FindingsLibrary.csv + ไฟล์อัปโหลด) -> vectorize เฉพาะแถวใหม่
+            new_keys = keys[len(base):]
+            with stage("index.append", rows=len(new_keys)):
+                idx = base.append(store.tokenize(iter_findings_text(findings_df, len(base)), new_keys), new_keys)
+        idx.save(path)
+        store.save()
+    recent = _INDEX_REGISTRY.setdefault(analyzer, [])
+    if idx not in recent:
+        recent.append(idx)
+        del recent[:-4]
+    return idx
+
+# ดัชนีที่ใช้ล่าสุดใน process นี้ (คีย์ด้วย content hash) เพื่อไม่ต้องโหลดจากดิสก์ซ้ำ
+_RECENT_INDEXES = OrderedDict()
+_RECENT_INDEXES_MAX = 4
+
+def reset_index_caches() -> None:
+    """ล้างดัชนี/token store ที่ถือไว้ในหน่วยความจำของ process (ไม่ลบ artifact บนดิสก์) ใช้ใน benchmark"""
+    _RECENT_INDEXES.clear()
+    _INDEX_REGISTRY.clear()
+    _TOKEN_STORES.clear()
+
+def extend_incremental_index(base: IncrementalIndex, rows_df: pd.DataFrame) -> IncrementalIndex:
+    """ดัชนีของแถวใน base ต่อท้ายด้วย rows_df (ตำแหน่งแถวเดียวกับ FindingsView) โดยตัดคำเฉพาะ rows_df
+
+    artifact คีย์ด้วย row_keys ของทุกแถว จึงโหลดจากดิสก์ได้เมื่อเปิด session ใหม่กับไฟล์อัปโหลดเดิม
+    """
+    keys = findings_row_keys(rows_df)
+    h = hashlib.sha256()
+    h.update(json.dumps({"v": INDEX_FORMAT_VERSION, "mode": "incremental", "analyzer": base.analyzer,
+                         "params": {"n_features": HASH_N_FEATURES}}, sort_keys=True).encode("utf-8"))
+    h.update(np.ascontiguousarray(base.row_keys).tobytes())
+    h.update(keys.tobytes())
+    content_hash = h.hexdigest()[:32]
+    key = ("incremental", base.analyzer, content_hash)
+    if key in _RECENT_INDEXES:
+        _RECENT_INDEXES.move_to_end(key)
+        return _RECENT_INDEXES[key][0]
+    path = _index_path(content_hash, "incremental")
+    with stage("index.load"):
+        idx = IncrementalIndex.load(path)
+    if idx is None:
+        store = get_token_store(base.analyzer)
+        with stage("index.append", rows=len(keys)):
+            idx = base.append(store.tokenize(iter_findings_text(rows_df), keys), keys)
+        idx.save(path)
+        store.save()
+    _RECENT_INDEXES[key] = (idx, idx.X)
+    while len(_RECENT_INDEXES) > _RECENT_INDEXES_MAX:
+        _RECENT_INDEXES.popitem(last=False)
+    return idx
+
+def build_tfidf_index(findings_df: pd.DataFrame, analyzer: str = DEFAULT_ANALYZER, version: str = None):
+    """คืน (vectorizer, X) ของ findings_df จากหน่วยความจำ, จากดิสก์ หรือ fit ใหม่ตามลำดับ"""
+    with stage("index", analyzer=analyzer, mode=INDEX_MODE) as rec:
+        content_hash = findings_content_hash(findings_df, analyzer, version=version)
+        key = (INDEX_MODE, analyzer, content_hash)
+        if key in _RECENT_INDEXES:
+            rec["source"] = "memory"
+            _RECENT_INDEXES.move_to_end(key)
+            return _RECENT_INDEXES[key]
+        result = _build_tfidf_index(findings_df, analyzer, content_hash)
+    _RECENT_INDEXES[key] = result
+    while len(_RECENT_INDEXES) > _RECENT_INDEXES_MAX:
+        _RECENT_INDEXES.popitem(last=False)
+    return result
+
+def _build_tfidf_index(findings_df: pd.DataFrame, analyzer: str, content_hash: str):
+    if INDEX_MODE == "incremental":
+        idx = build_incremental_index(findings_df, analyzer, content_hash)
+        return idx, idx.X
+    path = _index_path(content_hash)
+    with stage("index.load"):
+        loaded = load_tfidf_index(path)
+    if loaded is not None:
+        return loaded
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    with stage("index.fit", rows=len(findings_df)):
+        store = get_token_store(analyzer)
+        tokens = store.tokenize(iter_findings_text(findings_df), findings_row_keys(findings_df))
+        vec = TfidfVectorizer(analyzer=_pretokenized, **TFIDF_PARAMS)
+        X = vec.fit_transform(tokens)
+        # หลัง fit แล้วสลับเป็น analyzer จริงเพื่อใช้แปลงข้อความค้นหา
+        vec.set_params(analyzer=ANALYZERS[analyzer])
+        store.save()
+        save_tfidf_index(path, vec, X, analyzer)
+    return vec, X
+
+# ----------------- Dense LSA Backend -----------------
+def fit_lsa(X, n_components: int = LSA_COMPONENTS):
+    """ลดมิติ X ด้วย TruncatedSVD เหลือ float32 ไม่เกิน n_components มิติ (แถว normalize แล้ว)
+
+    fit เฉพาะคอลัมน์ที่มีค่าจริง (hashing features ส่วนใหญ่ว่าง) คืน (components, active_cols, Z)
+    หรือ None ถ้าข้อมูลน้อยเกินกว่าจะลดมิติได้
+    """
+    from sklearn.decomposition import TruncatedSVD
+    from sklearn.preprocessing import normalize
+    active_cols = np.unique(np.asarray(X.indices)).astype(np.int32)
+    k = min(n_components, len(active_cols) - 1, X.shape[0] - 1)
+    if k < 2:
+        return None
+    svd = TruncatedSVD(n_components=k, algorithm="randomized", random_state=0)
+    Z = svd.fit_transform(X[:, active_cols]).astype(np.float32)
+    return svd.components_.astype(np.float32), active_cols, normalize(Z, copy=False)
+
+def _lsa_path(findings_df: pd.DataFrame, analyzer: str, n_components: int, version: str = None) -> str:
+    key = findings_content_hash(findings_df, analyzer, version=version)
+    return os.path.join(INDEX_DIR, f"lsa{n_components}-{INDEX_MODE}-v{INDEX_FORMAT_VERSION}-{key}")
+
+def build_lsa(findings_df: pd.DataFrame, X, analyzer: str = DEFAULT_ANALYZER, n_components: int = LSA_COMPONENTS,
+              version: str = None):
+    """โหลด LSA ที่เคยคำนวณจากดิสก์ (Z เป็น memory-map) หรือ fit ใหม่แล้วบันทึก"""
+    path = _lsa_path(findings_df, analyzer, n_components, version)
+    with stage("lsa.load"):
+        loaded = load_index_artifact(path, ["components", "active_cols", "Z"])
+    if loaded is not None:
+        arrays = loaded[1]
+        return np.asarray(arrays["components"]), np.asarray(arrays["active_cols"]), arrays["Z"]
+    with stage("lsa.fit", rows=X.shape[0]):
+        lsa = fit_lsa(X, n_components)
+        if lsa is not None:
+            components, active_cols, Z = lsa
+            meta = {"analyzer": analyzer, "n_components": int(Z.shape[1]), "shape": list(Z.shape)}
+            save_index_artifact(path, meta, {"components": components, "active_cols": active_cols, "Z": Z})
+    return lsa
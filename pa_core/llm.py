@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""เรียก LLM (Typhoon ผ่าน OpenAI-compatible API) โดย import openai เมื่อใช้งานครั้งแรก
+
+คำตอบถูกแคชบนดิสก์ (pa_core.llm_cache) คำขอเดิมซ้ำจึงได้คำตอบทันทีโดยไม่เรียก API
+ส่ง refresh=True เพื่อขอคำตอบใหม่ (ผลใหม่จะแทนที่ของเดิมในแคช) หรือ use_cache=False เพื่อไม่ใช้แคชเลย
+
+client หนึ่งตัวต่อ API key ถูกใช้ซ้ำทั้ง process (connection pool แบบ keep-alive ไม่ต้อง TLS handshake ใหม่ทุกครั้ง)
+จำนวนคำขอที่ค้างอยู่พร้อมกันทั้ง process ถูกจำกัดด้วย semaphore และ 429/5xx/เชื่อมต่อไม่ได้ จะลองใหม่
+แบบ exponential backoff + jitter (ตาม Retry-After ถ้ามี)
+"""
+import contextvars
+import os
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from .llm_cache import cache_key, get_response_cache
+from .profiling import stage
+
+# เปลี่ยนได้ด้วย PA_LLM_BASE_URL (เช่น ชี้ไป mock server ระหว่างทดสอบ)
+TYPHOON_BASE_URL = os.environ.get("PA_LLM_BASE_URL", "https://api.opentyphoon.ai/v1")
+DEFAULT_MODEL = "typhoon-v2.1-12b-instruct"
+DEFAULT_PARAMS = {"temperature": 0.7, "top_p": 0.9, "max_tokens": 1024}
+
+# ----------------- Client Pool / Concurrency / Retries -----------------
+LLM_MAX_INFLIGHT = int(os.environ.get("PA_LLM_MAX_INFLIGHT", "4"))
+LLM_MAX_RETRIES = int(os.environ.get("PA_LLM_MAX_RETRIES", "4"))
+# timeout ต่อคำขอ (วินาที) และเวลารอคิว semaphore สูงสุดก่อนยอมแพ้
+LLM_TIMEOUT = float(os.environ.get("PA_LLM_TIMEOUT", "60"))
+LLM_QUEUE_TIMEOUT = float(os.environ.get("PA_LLM_QUEUE_TIMEOUT", "120"))
+LLM_BACKOFF_BASE = 0.5
+LLM_BACKOFF_MAX = 20.0
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+_INFLIGHT = threading.BoundedSemaphore(LLM_MAX_INFLIGHT)
+_CLIENTS = OrderedDict()
+_CLIENTS_MAX = 32
+_CLIENTS_LOCK = threading.Lock()
+
+def get_client(api_key: str, base_url: str = None):
+    """OpenAI client ที่ใช้ซ้ำต่อ (api_key, base_url) ปิด retry ของ SDK เพราะ _request() จัดการเอง"""
+    key = (api_key, base_url or TYPHOON_BASE_URL)
+    with _CLIENTS_LOCK:
+        if key in _CLIENTS:
+            _CLIENTS.move_to_end(key)
+            return _CLIENTS[key]
+    from openai import OpenAI
+    client = OpenAI(api_key=api_key, base_url=key[1], timeout=LLM_TIMEOUT, max_retries=0)
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.setdefault(key, client)
+        # client ที่หลุดออกไม่ถูก close ทันที เพราะอาจมีคำขอของ session อื่นใช้อยู่
+        while len(_CLIENTS) > _CLIENTS_MAX:
+            _CLIENTS.popitem(last=False)
+    return client
+
+def _retry_delay(attempt: int, error: Exception):
+    """วินาทีที่ควรรอก่อนลองครั้งถัดไป หรือ None ถ้า error นี้ไม่ควรลองใหม่"""
+    from openai import APIConnectionError, APIStatusError
+    retry_after = None
+    if isinstance(error, APIStatusError):
+        if error.status_code not in RETRY_STATUS:
+            return None
+        retry_after = error.response.headers.get("retry-after")
+    elif not isinstance(error, APIConnectionError):  # รวม APITimeoutError
+        return None
+    # full jitter: สุ่มในช่วง [0, base * 2^attempt] เพื่อไม่ให้ทุก session ยิงซ้ำพร้อมกัน
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+    try:
+        delay = max(delay, min(float(retry_after), LLM_BACKOFF_MAX))
+    except (TypeError, ValueError):
+        pass
+    return delay
+
+@contextmanager
+def _request(api_key: str, rec: dict, **request):
+    """เรียก chat.completions.create โดยถือ slot ของ semaphore ตลอดช่วงที่ใช้ response (รวมการอ่าน stream)
+
+    ระหว่างรอ backoff จะคืน slot ให้คำขออื่นก่อน จำนวนครั้งที่ลองใหม่บันทึกไว้ที่ rec["retries"]
+    """
+    client = get_client(api_key)
+    attempt = 0
+    while True:
+        if not _INFLIGHT.acquire(timeout=LLM_QUEUE_TIMEOUT):
+            raise TimeoutError("มีคำขอไปยัง LLM ค้างอยู่มากเกินไป โปรดลองใหม่อีกครั้ง")
+        try:
+            response = client.chat.completions.create(**request)
+            break
+        except Exception as e:
+            _INFLIGHT.release()
+            delay = _retry_delay(attempt, e) if attempt < LLM_MAX_RETRIES else None
+            if delay is None:
+                raise
+            attempt += 1
+            rec["retries"] = attempt
+            time.sleep(delay)
+    try:
+        yield response
+    finally:
+        if request.get("stream"):
+            response.close()
+        _INFLIGHT.release()
+
+def chat(api_key: str, messages: list, model: str = DEFAULT_MODEL, use_cache: bool = True,
+         refresh: bool = False, **params) -> str:
+    """ส่ง messages หนึ่งครั้งและคืนข้อความคำตอบ (params: temperature, top_p, max_tokens)"""
+    params = dict(DEFAULT_PARAMS, **params)
+    with stage("llm.chat", model=model) as rec:
+        cache = get_response_cache() if use_cache else None
+        key = cache_key(model, messages, params, TYPHOON_BASE_URL, api_key) if cache else None
+        text = cache.get(key) if cache and not refresh else None
+        rec["cache"] = "hit" if text is not None else "miss"
+        if text is None:
+            with _request(api_key, rec, model=model, messages=messages, **params) as response:
+                text = response.choices[0].message.content
+            if cache:
+                cache.put(key, text, model)
+        return text
+
+class ChatStream:
+    """คำตอบแบบ stream: วนลูปได้ข้อความทีละส่วน (delta) ตามที่ได้รับจาก API
+
+    ระหว่างวนจะบันทึก time-to-first-token (ttft_ms) และจำนวน chunk ลง stage "llm.chat_stream"
+    ของ profiler และสะสมข้อความทั้งหมดไว้ที่ .text ถ้าพบในแคช (.cached) จะได้ข้อความทั้งหมดเป็น delta เดียว
+    คำตอบจะถูกบันทึกลงแคชเมื่อ stream จบครบเท่านั้น
+    """
+
+    def __init__(self, api_key: str, messages: list, model: str = DEFAULT_MODEL, use_cache: bool = True,
+                 refresh: bool = False, **params):
+        self.api_key = api_key
+        self.messages = messages
+        self.model = model
+        self.params = dict(DEFAULT_PARAMS, **params)
+        self.cache = get_response_cache() if use_cache else None
+        self.refresh = refresh
+        self.text = ""
+        self.ttft_ms = None
+        self.cached = False
+
+    def __iter__(self):
+        with stage("llm.chat_stream", model=self.model) as rec:
+            start = time.perf_counter()
+            key = (cache_key(self.model, self.messages, self.params, TYPHOON_BASE_URL, self.api_key)
+                   if self.cache else None)
+            text = self.cache.get(key) if self.cache and not self.refresh else None
+            rec["cache"] = "hit" if text is not None else "miss"
+            if text is not None:
+                self.cached = True
+                self.ttft_ms = rec["ttft_ms"] = (time.perf_counter() - start) * 1000
+                self.text = text
+                yield text
+                return
+            chunks = 0
+            with _request(self.api_key, rec, model=self.model, messages=self.messages, stream=True,
+                          **self.params) as response:
+                for chunk in response:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if not delta:
+                        continue
+                    if self.ttft_ms is None:
+                        self.ttft_ms = rec["ttft_ms"] = (time.perf_counter() - start) * 1000
+                    chunks += 1
+                    self.text += delta
+                    yield delta
+            rec["chunks"] = chunks
+            if self.cache and self.text:
+                self.cache.put(key, self.text, self.model)
+
+def chat_stream(api_key: str, messages: list, model: str = DEFAULT_MODEL, use_cache: bool = True,
+                refresh: bool = False, **params) -> ChatStream:
+    """เหมือน chat() แต่ใช้ stream=True เพื่อแสดงคำตอบได้ตั้งแต่ token แรก"""
+    return ChatStream(api_key, messages, model, use_cache=use_cache, refresh=refresh, **params)
+
+def stream_many(api_key: str, requests: dict, cancel: threading.Event = None, **params):
+    """ส่งหลายคำขอพร้อมกัน (หนึ่ง thread ต่อคำขอ ผ่าน semaphore/แคชเดียวกับ chat_stream) แล้ว yield
+    เหตุการณ์ตามลำดับที่เกิดขึ้นจริงให้ thread ที่เรียก (เช่น script ของ Streamlit ที่ต้องวาด UI เอง)
+
+    requests: {key: kwargs ของ chat_stream เช่น {"messages": [...], "max_tokens": 768}} รวมกับ params ร่วม
+    เหตุการณ์: (key, "delta", ข้อความ), (key, "done", ChatStream) หรือ (key, "error", exception)
+    คำขอหนึ่งล้มเหลวไม่กระทบคำขออื่น
+    cancel: set() เพื่อหยุดทุกคำขอ (thread ตรวจระหว่าง delta แล้วปิด stream โดยไม่บันทึกคำตอบที่ไม่ครบลงแคช)
+    ถูก set เองเมื่อผู้เรียกเลิกวน (เช่น Streamlit หยุด script เพราะผู้ใช้กดปุ่มอื่น) คำขอที่ยังไม่เริ่มถูกยกเลิก
+    """
+    events = queue.Queue()
+    cancel = cancel or threading.Event()
+
+    def run(key, kwargs):
+        if cancel.is_set():
+            return
+        stream = chat_stream(api_key, **dict(params, **kwargs))
+        deltas = iter(stream)
+        try:
+            for delta in deltas:
+                if cancel.is_set():
+                    deltas.close()
+                    return
+                events.put((key, "delta", delta))
+        except Exception as e:
+            events.put((key, "error", e))
+        else:
+            events.put((key, "done", stream))
+
+    pool = ThreadPoolExecutor(max_workers=max(1, len(requests)), thread_name_prefix="pa-llm")
+    try:
+        for key, kwargs in requests.items():
+            # คัดลอก context เพื่อให้ stage ใน thread ลงบันทึกใน profiler ของ rerun นี้
+            pool.submit(contextvars.copy_context().run, run, key, kwargs)
+        remaining = len(requests)
+        while remaining:
+            try:
+                event = events.get(timeout=0.1)
+            except queue.Empty:
+                if cancel.is_set():
+                    return
+                continue
+            if event[1] != "delta":
+                remaining -= 1
+            yield event
+    finally:
+        cancel.set()
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""แคชคำตอบของ LLM บนดิสก์ คีย์ด้วย hash ของ (endpoint, model, messages, temperature, top_p, max_tokens)
+
+หนึ่งคำตอบต่อหนึ่งไฟล์ JSON (เขียนแบบ atomic) ใช้ mtime ของไฟล์เป็นเวลาที่ใช้ล่าสุด (LRU)
+evict() ลบไฟล์ที่เก่ากว่า LLM_CACHE_MAX_AGE_DAYS และลบไฟล์ที่ใช้นานที่สุดจนขนาดรวมไม่เกิน LLM_CACHE_MAX_MB
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+LLM_CACHE_DIR = os.environ.get("PA_LLM_CACHE_DIR", ".llm_cache")
+LLM_CACHE_MAX_MB = float(os.environ.get("PA_LLM_CACHE_MAX_MB", "50"))
+LLM_CACHE_MAX_AGE_DAYS = float(os.environ.get("PA_LLM_CACHE_MAX_AGE_DAYS", "30"))
+CACHE_KEY_PARAMS = ("temperature", "top_p", "max_tokens")
+
+def cache_key(model: str, messages: list, params: dict, base_url: str = "", api_key: str = "") -> str:
+    """base_url แยกคำตอบของแต่ละ endpoint (เช่น API จริงกับ mock server) ที่ใช้ชื่อ model เดียวกัน
+
+    api_key แยกแคชของแต่ละบัญชี (ผู้ใช้ที่ใส่ key ของตัวเองไม่ได้คำตอบที่จ่ายด้วย key ของคนอื่น) เก็บเพียง hash ของ key
+    """
+    key_hash = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+    payload = {"base_url": (base_url or "").rstrip("/"), "api_key": key_hash, "model": model, "messages": messages,
+               **{p: params.get(p) for p in CACHE_KEY_PARAMS}}
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """แคชคำตอบบนดิสก์พร้อมตัวนับ hit/miss ของ process (ใช้ร่วมกันได้หลาย thread)"""
+
+    def __init__(self, path: str = LLM_CACHE_DIR, max_mb: float = LLM_CACHE_MAX_MB,
+                 max_age_days: float = LLM_CACHE_MAX_AGE_DAYS):
+        self.path = path
+        self.max_bytes = max_mb * 1e6
+        self.max_age_s = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key: str):
+        """ข้อความที่แคชไว้ หรือ None (ไม่มี/หมดอายุ/ไฟล์เสีย)"""
+        path = self._file(key)
+        text = None
+        try:
+            if time.time() - os.path.getmtime(path) <= self.max_age_s:
+                with open(path, encoding="utf-8") as f:
+                    text = json.load(f)["text"]
+                os.utime(path)  # ใช้ล่าสุด
+        except (OSError, ValueError, KeyError):
+            text = None
+        with self._lock:
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return text
+
+    def put(self, key: str, text: str, model: str = "") -> None:
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.path, prefix=".tmp-", suffix=".json")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"model": model, "created": time.time(), "text": text}, f, ensure_ascii=False)
+            os.replace(tmp, self._file(key))
+        except OSError:
+            return
+        self.evict()
+
+    def evict(self) -> int:
+        """ลบรายการที่หมดอายุ แล้วลบรายการที่ใช้นานที่สุดจนขนาดรวมไม่เกินเพดาน คืนจำนวนที่ลบ"""
+        try:
+            entries = []
+            for name in os.listdir(self.path):
+                if name.endswith(".json") and not name.startswith(".tmp-"):
+                    st = os.stat(os.path.join(self.path, name))
+                    entries.append((st.st_mtime, st.st_size, name))
+        except OSError:
+            return 0
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        now = time.time()
+        removed = 0
+        for mtime, size, name in entries:
+            if now - mtime <= self.max_age_s and total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0.0}
+
+_DEFAULT_CACHE = None
+
+def get_response_cache() -> ResponseCache:
+    """แคชเดียวของทั้ง process (สร้างเมื่อใช้ครั้งแรก)"""
+    global _DEFAULT_CACHE
+    if _DEFAULT_CACHE is None:
+        _DEFAULT_CACHE = ResponseCache()
+    return _DEFAULT_CACHE
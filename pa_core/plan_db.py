@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""บันทึกแผน (ข้อมูลแผน/6W2H, ตารางของแผน, คำแนะนำจาก PA Assist) ลง SQLite เพื่อเปิดกลับมาใช้ได้
+
+ไฟล์เดียวที่ PLAN_DB_PATH ใช้ WAL (ผู้อ่านไม่ถูกบล็อกระหว่างมีผู้เขียน และการเขียนแต่ละครั้งเป็นธุรกรรมสั้น ๆ)
+แต่ละตารางใน plan_store.PLAN_TABLES เป็นตารางของ SQLite ที่มีคอลัมน์เดียวกัน คีย์หลัก (plan_id, ID ของแถว)
+การเพิ่มแถวเป็น upsert ทันที (write-through) และการเปิดแผนอ่านทีละตารางเมื่อมีผู้ใช้ตารางนั้นครั้งแรก
+
+    db = get_plan_db()
+    db.save_plan(plan)
+    tables = PlanTables(plan["plan_id"], db)   # แถวที่เพิ่มถูกบันทึกลง db ทันที
+"""
+import json
+import os
+import queue
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from .plan_store import PLAN_TABLES
+
+PLAN_DB_PATH = os.environ.get("PA_PLAN_DB", os.path.join(".plan_db", "plans.sqlite3"))
+# วินาทีที่รอเมื่อมีผู้เขียนคนอื่นถือ lock อยู่ (การเขียนแต่ละครั้งสั้นมาก ปกติรอไม่ถึงมิลลิวินาที)
+PLAN_DB_BUSY_TIMEOUT = float(os.environ.get("PA_PLAN_DB_BUSY_TIMEOUT", "5"))
+PLAN_DB_POOL_SIZE = 4
+ASSIST_KEYS = ("gen_issues", "gen_findings", "gen_report")
+
+def _table_sql(name: str, spec) -> str:
+    ints = dict(spec.dtypes)
+    cols = ", ".join(f"{c} {'INTEGER' if c in ints else 'TEXT'}" for c in spec.columns if c != "plan_id")
+    return f"CREATE TABLE IF NOT EXISTS {name} (plan_id TEXT NOT NULL, {cols}, PRIMARY KEY (plan_id, {spec.columns[0]}))"
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS plans (plan_id TEXT PRIMARY KEY, plan_title TEXT, data TEXT NOT NULL, "
+    "created_at REAL NOT NULL, updated_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS plans_updated ON plans (updated_at)",
+    "CREATE TABLE IF NOT EXISTS assist (plan_id TEXT NOT NULL, key TEXT NOT NULL, text TEXT NOT NULL, "
+    "updated_at REAL NOT NULL, PRIMARY KEY (plan_id, key))",
+] + [_table_sql(name, spec) for name, spec in PLAN_TABLES.items()]
+
+class PlanDB:
+    """ที่เก็บแผนบน SQLite ใช้ร่วมกันได้หลาย thread/session (connection pool ขนาด PLAN_DB_POOL_SIZE)"""
+
+    def __init__(self, path: str = PLAN_DB_PATH, pool_size: int = PLAN_DB_POOL_SIZE):
+        self.path = path
+        self._pool = queue.LifoQueue()
+        self._slots = queue.Queue()
+        for _ in range(pool_size):
+            self._slots.put(None)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connection() as conn:
+            for sql in _SCHEMA:
+                conn.execute(sql)
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None: แต่ละคำสั่งเป็นธุรกรรมของตัวเอง (ไม่ถือ lock ค้างระหว่างคำสั่ง)
+        conn = sqlite3.connect(self.path, timeout=PLAN_DB_BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        """ยืม connection จาก pool (สร้างใหม่เมื่อยังไม่ครบ pool_size) แล้วคืนเมื่อใช้เสร็จ"""
+        self._slots.get()
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            try:
+                conn = self._connect()
+            except Exception:
+                self._slots.put(None)
+                raise
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+            self._slots.put(None)
+
+    # ----------------- Plans -----------------
+    def save_plan(self, plan: dict) -> None:
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT INTO plans (plan_id, plan_title, data, created_at, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (plan_id) DO UPDATE SET plan_title = excluded.plan_title, data = excluded.data, "
+                "updated_at = excluded.updated_at",
+                (plan["plan_id"], plan.get("plan_title", ""), json.dumps(plan, ensure_ascii=False), now, now),
+            )
+
+    def get_plan(self, plan_id: str):
+        """dict ของแผน หรือ None ถ้าไม่มี"""
+        with self._connection() as conn:
+            row = conn.execute("SELECT data FROM plans WHERE plan_id = ?", (plan_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_plans(self, limit: int = 100) -> list:
+        """แผนที่แก้ไขล่าสุดก่อน: [{"plan_id", "plan_title", "updated_at"}, ...]"""
+        with self._connection() as conn:
+            rows = conn.execute("SELECT plan_id, plan_title, updated_at FROM plans ORDER BY updated_at DESC LIMIT ?",
+                                (limit,)).fetchall()
+        return [{"plan_id": r[0], "plan_title": r[1] or "", "updated_at": r[2]} for r in rows]
+
+    # ----------------- Plan Tables -----------------
+    def upsert_row(self, table: str, values: dict) -> None:
+        """เพิ่มหรือแทนที่หนึ่งแถวของตาราง (คีย์ plan_id + ID ของแถว)"""
+        cols = PLAN_TABLES[table].columns
+        placeholders = ", ".join("?" for _ in cols)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in cols if c not in (cols[0], "plan_id"))
+        with self._connection() as conn:
+            conn.execute(
+                f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({placeholders}) "
+                f"ON CONFLICT (plan_id, {cols[0]}) DO UPDATE SET {updates}",
+                [values.get(c, "") for c in cols],
+            )
+
+    def load_rows(self, table: str, plan_id: str) -> list:
+        """แถวของตารางของแผนนี้ตามลำดับที่เพิ่ม (tuple ตามลำดับคอลัมน์ใน PLAN_TABLES)"""
+        cols = ", ".join(PLAN_TABLES[table].columns)
+        with self._connection() as conn:
+            return conn.execute(f"SELECT {cols} FROM {table} WHERE plan_id = ? ORDER BY rowid", (plan_id,)).fetchall()
+
+    # ----------------- Assist -----------------
+    def save_assist(self, plan_id: str, texts: dict) -> None:
+        now = time.time()
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT INTO assist (plan_id, key, text, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (plan_id, key) DO UPDATE SET text = excluded.text, updated_at = excluded.updated_at",
+                [(plan_id, key, text, now) for key, text in texts.items()],
+            )
+
+    def load_assist(self, plan_id: str) -> dict:
+        with self._connection() as conn:
+            rows = conn.execute("SELECT key, text FROM assist WHERE plan_id = ?", (plan_id,)).fetchall()
+        return dict(rows)
+
+_DEFAULT_DB = None
+
+def get_plan_db() -> PlanDB:
+    """PlanDB เดียวของทั้ง process (สร้างเมื่อใช้ครั้งแรก)"""
+    global _DEFAULT_DB
+    if _DEFAULT_DB is None:
+        _DEFAULT_DB = PlanDB()
+    return _DEFAULT_DB
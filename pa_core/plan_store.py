@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""ตารางของแผน (Logic Model, Methods, KPIs, Risks, ประเด็นตรวจสอบ) แบบ record store
+
+แต่ละตารางเก็บแถวเป็น tuple ตามลำดับคอลัมน์ที่กำหนด เพิ่มแถวได้ใน O(1) และออก ID ด้วยตัวนับที่เพิ่มขึ้นอย่างเดียว
+(ไม่ต้องอ่าน ID เดิมทุกแถวเพื่อหาค่าสูงสุด) DataFrame สร้างเมื่อมีผู้ขอและถูกเก็บไว้จนกว่าตารางจะเปลี่ยน
+
+    tables = PlanTables()
+    tables["kpis"].append(plan_id="PLN-1", name="ร้อยละผู้รับบริการพึงพอใจ", level="outcome")  # -> "KPI-001"
+    tables["kpis"].frame()   # DataFrame (แชร์ระหว่างผู้เรียก ห้ามแก้ไข)
+"""
+import re
+import sqlite3
+from dataclasses import dataclass
+
+import pandas as pd
+
+@dataclass(frozen=True)
+class TableDef:
+    prefix: str            # คำนำหน้า ID เช่น "LG" -> LG-001
+    columns: tuple         # คอลัมน์แรกเป็น ID
+    dtypes: tuple = ()     # (คอลัมน์, dtype) ที่ไม่ใช่ข้อความ
+
+PLAN_TABLES = {
+    "logic_items": TableDef("LG", ("item_id", "plan_id", "type", "description", "metric", "unit", "target", "source")),
+    "methods": TableDef("MT", ("method_id", "plan_id", "type", "tool_ref", "sampling", "questions", "linked_issue",
+                               "data_source", "frequency")),
+    "kpis": TableDef("KPI", ("kpi_id", "plan_id", "level", "name", "formula", "numerator", "denominator", "unit",
+                             "baseline", "target", "frequency", "data_source", "quality_requirements")),
+    "risks": TableDef("RSK", ("risk_id", "plan_id", "description", "category", "likelihood", "impact", "mitigation",
+                              "hypothesis"), dtypes=(("likelihood", "int8"), ("impact", "int8"))),
+    "audit_issues": TableDef("ISS", ("issue_id", "plan_id", "title", "rationale", "linked_kpi", "proposed_methods",
+                                     "source_finding_id", "issue_detail", "recommendation")),
+}
+
+_ID_NUMBER_RE = re.compile(r"-(\d+)$")
+
+class RecordTable:
+    """แถวของตารางหนึ่งตาราง: list ของ tuple + ตัวนับ ID + DataFrame ที่สร้างไว้ล่าสุด
+
+    version เพิ่มทุกครั้งที่ตารางเปลี่ยน ใช้เป็นคีย์ของสิ่งที่คำนวณจากตาราง (เช่น ไฟล์ดาวน์โหลด) ได้
+    """
+    __slots__ = ("name", "spec", "records", "next_seq", "version", "on_append", "_frame", "_positions")
+
+    def __init__(self, name: str, spec: TableDef, on_append=None):
+        self.name = name
+        self.spec = spec
+        self.records = []
+        self.next_seq = 1
+        self.version = 0
+        self.on_append = on_append  # on_append(ตาราง, dict ของแถว) ถูกเรียกหลังเพิ่มแถวผ่าน append()
+        self._frame = None
+        self._positions = {}  # ID -> ตำแหน่งใน records
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def empty(self) -> bool:
+        return not self.records
+
+    @property
+    def id_column(self) -> str:
+        return self.spec.columns[0]
+
+    def allocate_id(self) -> str:
+        seq, self.next_seq = self.next_seq, self.next_seq + 1
+        return f"{self.spec.prefix}-{seq:03d}"
+
+    def append(self, **values) -> str:
+        """เพิ่มหนึ่งแถว (คอลัมน์ที่ไม่ได้ระบุเป็น "") คืน ID ของแถว ถ้าไม่ได้ส่ง ID มาจะออกให้ใหม่
+
+        ID ที่มีอยู่แล้วแทนที่แถวเดิมในตำแหน่งเดิม (upsert เหมือน PlanDB.upsert_row)
+        """
+        unknown = set(values) - set(self.spec.columns)
+        if unknown:
+            raise KeyError(f"ตาราง {self.name} ไม่มีคอลัมน์ {sorted(unknown)}")
+        record_id = values.get(self.id_column) or self.allocate_id()
+        values[self.id_column] = record_id
+        self._observe_id(record_id)
+        record = tuple(values.get(c, "") for c in self.spec.columns)
+        self._put(record)
+        self._changed()
+        if self.on_append is not None:
+            self.on_append(self, dict(zip(self.spec.columns, record)))
+        return record_id
+
+    def load(self, records) -> None:
+        """เพิ่มแถวที่บันทึกไว้แล้ว (tuple ตามลำดับคอลัมน์) โดยไม่เรียก on_append"""
+        for record in records:
+            self._observe_id(record[0])
+            self._put(tuple(record))
+        self._changed()
+
+    def _put(self, record: tuple) -> None:
+        pos = self._positions.get(record[0])
+        if pos is None:
+            self._positions[record[0]] = len(self.records)
+            self.records.append(record)
+        else:
+            self.records[pos] = record
+
+    def _observe_id(self, record_id) -> None:
+        m = _ID_NUMBER_RE.search(str(record_id))
+        if m and int(m.group(1)) >= self.next_seq:
+            self.next_seq = int(m.group(1)) + 1
+
+    def _changed(self) -> None:
+        self.version += 1
+        self._frame = None
+
+    def frame(self) -> pd.DataFrame:
+        """DataFrame ของตาราง (สร้างครั้งเดียวต่อ version ผู้เรียกทุกคนได้ object เดียวกัน ห้ามแก้ไข)"""
+        if self._frame is None:
+            df = pd.DataFrame.from_records(self.records, columns=list(self.spec.columns))
+            for col, dtype in self.spec.dtypes:
+                if self.records:
+                    df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(dtype)
+            self._frame = df
+        return self._frame
+
+class PlanTables:
+    """ตารางทั้งหมดของแผนหนึ่งแผน (ตาม PLAN_TABLES) เข้าถึงด้วยชื่อตาราง: tables["risks"]
+
+    ถ้าส่ง db (pa_core.plan_db.PlanDB) มา แต่ละตารางถูกอ่านจาก db เมื่อถูกเข้าถึงครั้งแรก และแถวที่เพิ่มถูก
+    upsert ลง db ทันที ถ้าบันทึกไม่สำเร็จ แถวยังอยู่ในหน่วยความจำและ error ล่าสุดเก็บไว้ที่ .save_error
+    """
+
+    def __init__(self, plan_id: str = "", db=None):
+        self.plan_id = plan_id
+        self.db = db
+        self.save_error = None
+        on_append = self._write_through if db is not None else None
+        self.tables = {name: RecordTable(name, spec, on_append) for name, spec in PLAN_TABLES.items()}
+        self._loaded = set() if db is not None else set(self.tables)
+
+    def __getitem__(self, name: str) -> RecordTable:
+        table = self.tables[name]
+        if name not in self._loaded:
+            self._loaded.add(name)
+            table.load(self.db.load_rows(name, self.plan_id))
+        return table
+
+    def __iter__(self):
+        return (self[name] for name in self.tables)
+
+    @property
+    def version(self) -> tuple:
+        return tuple(t.version for t in self)
+
+    def frames(self, *names) -> dict:
+        return {name: self[name].frame() for name in names or self.tables}
+
+    def _write_through(self, table: RecordTable, values: dict) -> None:
+        try:
+            self.db.upsert_row(table.name, values)
+            self.save_error = None
+        except (sqlite3.Error, OSError) as e:
+            self.save_error = e
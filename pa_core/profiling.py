@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""จับเวลาและ RSS ของแต่ละขั้นตอนใน rerun หนึ่งรอบ และเขียนผลเป็น JSON-lines (หมุนไฟล์เมื่อใหญ่เกิน)
+
+    profiler = start_profiler()
+    with stage("load_findings"):
+        ...
+    profiler.write_log()
+
+stage()/profiled() ใช้ profiler ที่ start ไว้ใน context ปัจจุบัน (thread ของ rerun นั้น)
+ถ้ายังไม่มี profiler จะไม่ทำอะไร โค้ดใน pa_core จึงใส่ stage ไว้ได้โดยไม่มีต้นทุนเมื่อไม่ได้วัด
+"""
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+PROFILE_LOG_PATH = os.environ.get("PA_PROFILE_LOG", os.path.join(".profile_log", "reruns.jsonl"))
+PROFILE_LOG_MAX_BYTES = int(os.environ.get("PA_PROFILE_LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def current_rss() -> int:
+    """RSS ปัจจุบันของ process (ไบต์) จาก /proc ถ้ามี ไม่เช่นนั้นใช้ค่าสูงสุดจาก getrusage"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == "darwin" else rss * 1024
+
+class Profiler:
+    """เก็บเวลา (ms) และ RSS ที่เปลี่ยนไป (MB) ของแต่ละ stage ตามลำดับที่เริ่ม stage ซ้อนกันได้ (depth)
+
+    ใช้จากหลาย thread ได้ (เช่น คำขอ LLM ที่ทำพร้อมกัน) depth นับแยกต่อ thread
+    """
+
+    def __init__(self):
+        self.records = []
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        self._start_rss = current_rss()
+        self._local = threading.local()
+
+    @contextmanager
+    def stage(self, name: str, **tags):
+        """yield dict ของ stage นี้ เพื่อเติม tag ระหว่างทำงานได้ (เช่น rec["source"] = "disk")"""
+        depth = getattr(self._local, "depth", 0)
+        rec = {"stage": name, "depth": depth, **tags}
+        self.records.append(rec)
+        self._local.depth = depth + 1
+        rss = current_rss()
+        start = time.perf_counter()
+        try:
+            yield rec
+        except Exception as e:
+            rec["error"] = type(e).__name__
+            raise
+        finally:
+            rec["ms"] = (time.perf_counter() - start) * 1000
+            rec["rss_delta_mb"] = (current_rss() - rss) / 1e6
+            self._local.depth = depth
+
+    def summary(self, **meta) -> dict:
+        rss = current_rss()
+        return {
+            "timestamp": self.started_at.isoformat(timespec="seconds"),
+            "total_ms": (time.perf_counter() - self._start) * 1000,
+            "rss_mb": rss / 1e6,
+            "rss_delta_mb": (rss - self._start_rss) / 1e6,
+            **meta,
+            "stages": self.records,
+        }
+
+    def write_log(self, path: str = PROFILE_LOG_PATH, max_bytes: int = PROFILE_LOG_MAX_BYTES, **meta) -> dict:
+        """ต่อท้าย summary หนึ่งบรรทัด เมื่อไฟล์ใหญ่เกิน max_bytes ย้ายไปเป็น <path>.1 (เก็บไว้รุ่นเดียว)
+
+        path ว่าง = ไม่เขียนไฟล์ คืน summary เสมอ
+        """
+        summary = self.summary(**meta)
+        if not path:
+            return summary
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            if os.path.exists(path) and os.path.getsize(path) > max_bytes:
+                os.replace(path, path + ".1")
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(summary, ensure_ascii=False) + "\n")
+        except OSError:
+            pass
+        return summary
+
+_ACTIVE = contextvars.ContextVar("pa_profiler", default=None)
+
+def start_profiler() -> Profiler:
+    """สร้าง Profiler ใหม่และตั้งเป็นตัวที่ stage()/profiled() ใช้ใน context นี้ (เรียกต้น rerun)"""
+    profiler = Profiler()
+    _ACTIVE.set(profiler)
+    return profiler
+
+@contextmanager
+def stage(name: str, **tags):
+    profiler = _ACTIVE.get()
+    if profiler is None:
+        yield dict(tags)
+        return
+    with profiler.stage(name, **tags) as rec:
+        yield rec
+
+def profiled(name: str = None):
+    """decorator: จับเวลาทุกครั้งที่เรียกฟังก์ชันเป็น stage ชื่อ name (ค่าเริ่มต้นคือชื่อฟังก์ชัน)"""
+    def decorate(fn):
+        label = name or fn.__qualname__
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
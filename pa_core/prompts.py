@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""สร้าง prompt สำหรับ 6W2H และ PA Assist และแยกผลลัพธ์ของ LLM กลับเป็นฟิลด์"""
+import pandas as pd
+
+from .context import PLAN_CONTEXT_TOKENS, build_plan_context
+
+SIXW2H_KEYS = ["who", "whom", "what", "where", "when", "why", "how", "how_much"]
+
+ASSIST_SYSTEM_PROMPT = "คุณคือผู้เชี่ยวชาญด้านการตรวจสอบผลสัมฤทธิ์และประสิทธิภาพการดำเนินงาน (Performance Audit) กรุณาตอบโดยมุ่งเน้นการสร้างคำแนะนำตามรูปแบบที่ต้องการเท่านั้น"
+
+# (คีย์ใน session state, แท็กที่ให้ LLM ครอบแต่ละส่วน)
+ASSIST_SECTIONS = [
+    ("gen_issues", "ประเด็นการตรวจสอบที่ควรให้ความสำคัญ"),
+    ("gen_findings", "ข้อตรวจพบที่คาดว่าจะพบ"),
+    ("gen_report", "ร่างรายงานตรวจสอบที่จะเจอ"),
+]
+
+def build_6w2h_prompt(text: str) -> str:
+    return f"""
+จากข้อความด้านล่างนี้ กรุณาสรุปและแยกแยะข้อมูลให้เป็น 6W2H ได้แก่ Who, Whom, What, Where, When, Why, How, และ How much โดยให้อยู่ในรูปแบบ key-value ที่ชัดเจน
+ข้อความ:
+---
+{text}
+---
+รูปแบบที่ต้องการ:
+Who: [ข้อความ]
+Whom: [ข้อความ]
+What: [ข้อความ]
+Where: [ข้อความ]
+When: [ข้อความ]
+Why: [ข้อความ]
+How: [ข้อความ]
+How Much: [ข้อความ]
+"""
+
+def parse_6w2h(llm_output: str) -> dict:
+    """แยกบรรทัด 'Key: value' เป็น dict ที่ใช้คีย์เดียวกับ plan (who, whom, ..., how_much)"""
+    out = {}
+    for line in llm_output.strip().split('\n'):
+        if ':' in line:
+            key, value = line.split(':', 1)
+            normalized_key = key.strip().lower().replace(' ', '_')
+            if normalized_key in SIXW2H_KEYS:
+                out[normalized_key] = value.strip()
+    return out
+
+def build_plan_summary(plan: dict, logic_df: pd.DataFrame, audit_issues_df: pd.DataFrame,
+                       kpis_df: pd.DataFrame = None, risks_df: pd.DataFrame = None,
+                       budget: int = PLAN_CONTEXT_TOKENS) -> str:
+    """ข้อมูลแผนแบบกระชับสำหรับใส่ใน prompt ไม่เกิน budget token (ดู pa_core.context.build_plan_context)"""
+    tables = {"logic_items": logic_df, "audit_issues": audit_issues_df, "kpis": kpis_df, "risks": risks_df}
+    return build_plan_context(plan, tables, budget=budget).text
+
+def build_assist_messages(plan_summary: str) -> list:
+    user_prompt = f"""
+จากข้อมูลแผนการตรวจสอบด้านล่างนี้ กรุณาช่วยสร้างคำแนะนำ 3 อย่าง ได้แก่
+1. ประเด็นการตรวจสอบที่ควรให้ความสำคัญ
+2. ข้อตรวจพบที่คาดว่าจะพบ (พร้อมระบุระดับโอกาสที่จะเจอ: สูง/กลาง/ต่ำ)
+3. ร่างรายงานตรวจสอบที่จะเจอ
+---
+{plan_summary}
+---
+กรุณาสร้างคำตอบตามรูปแบบด้านล่างนี้เท่านั้น:
+<ประเด็นการตรวจสอบที่ควรให้ความสำคัญ>
+[ข้อความสำหรับส่วนที่ 1]
+</ประเด็นการตรวจสอบที่ควรให้ความสำคัญ>
+
+<ข้อตรวจพบที่คาดว่าจะพบ>
+[ข้อความสำหรับส่วนที่ 2]
+</ข้อตรวจพบที่คาดว่าจะพบ>
+
+<ร่างรายงานตรวจสอบที่จะเจอ>
+[ข้อความสำหรับส่วนที่ 3]
+</ร่างรายงานตรวจสอบที่จะเจอ>
+"""
+    return [
+        {"role": "system", "content": ASSIST_SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt}
+    ]
+
+# โหมดสร้างแยกส่วน: คำสั่งและงบ token ของแต่ละส่วน
+ASSIST_SECTION_INSTRUCTIONS = {
+    "gen_issues": "ประเด็นการตรวจสอบที่ควรให้ความสำคัญ",
+    "gen_findings": "ข้อตรวจพบที่คาดว่าจะพบ (พร้อมระบุระดับโอกาสที่จะเจอ: สูง/กลาง/ต่ำ)",
+    "gen_report": "ร่างรายงานตรวจสอบที่จะเจอ",
+}
+ASSIST_SECTION_MAX_TOKENS = {"gen_issues": 768, "gen_findings": 768, "gen_report": 1024}
+
+def build_section_messages(plan_summary: str, key: str) -> list:
+    """messages สำหรับสร้างเพียงส่วนเดียว (key ใน ASSIST_SECTIONS)
+
+    ข้อมูลแผนอยู่ต้น prompt เหมือนกันทุกส่วน คำสั่งเฉพาะส่วนอยู่ท้าย (prefix ร่วมกันได้ฝั่ง server)
+    """
+    tag = dict(ASSIST_SECTIONS)[key]
+    user_prompt = f"""
+ข้อมูลแผนการตรวจสอบ:
+---
+{plan_summary}
+---
+จากข้อมูลแผนการตรวจสอบข้างต้น กรุณาสร้าง{ASSIST_SECTION_INSTRUCTIONS[key]}
+กรุณาสร้างคำตอบตามรูปแบบด้านล่างนี้เท่านั้น:
+<{tag}>
+[ข้อความ]
+</{tag}>
+"""
+    return [
+        {"role": "system", "content": ASSIST_SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt}
+    ]
+
+def parse_section(text: str, key: str) -> str:
+    """ข้อความของส่วน key จากคำตอบของ build_section_messages (ถ้าไม่มีแท็กใช้ทั้งคำตอบ)"""
+    return extract_section(text, dict(ASSIST_SECTIONS)[key]) or text.strip()
+
+def extract_section(text: str, tag: str) -> str:
+    """ข้อความระหว่าง <tag> และ </tag> (ถ้ายังไม่มีแท็กปิดจะคืนถึงท้ายข้อความ, ไม่มีแท็กเปิดคืน "")"""
+    start = text.find(f"<{tag}>")
+    if start < 0:
+        return ""
+    start += len(tag) + 2
+    end = text.find(f"</{tag}>", start)
+    return (text[start:] if end < 0 else text[start:end]).strip()
+
+def parse_assist_sections(full_response: str) -> dict:
+    return {key: extract_section(full_response, tag) for key, tag in ASSIST_SECTIONS}
+
+class AssistStreamParser:
+    """แยกสามส่วนของคำตอบ PA Assist ระหว่างที่ข้อความยังทยอยมา (feed ทีละ delta)
+
+    .sections คือข้อความล่าสุดของแต่ละส่วน (ตัดแท็กปิดที่มาไม่ครบออก) และ .complete คือชุดของส่วนที่ปิดแท็กแล้ว
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.sections = {key: "" for key, _ in ASSIST_SECTIONS}
+        self.complete = set()
+
+    def feed(self, delta: str) -> list:
+        """เติมข้อความแล้วคืนคีย์ของส่วนที่เปลี่ยน"""
+        self.text += delta
+        changed = []
+        for key, tag in ASSIST_SECTIONS:
+            if key in self.complete:
+                continue
+            value = extract_section(self.text, tag)
+            if f"</{tag}>" in self.text:
+                self.complete.add(key)
+            else:
+                # อาจมีแท็กปิดมาแค่ครึ่งเดียว เช่น "</ข้อตร" -> ยังไม่แสดงส่วนนั้น
+                cut = value.rfind("<")
+                if cut >= 0 and ">" not in value[cut:]:
+                    value = value[:cut].rstrip()
+            if value != self.sections[key] or key in self.complete:
+                self.sections[key] = value
+                changed.append(key)
+        return changed
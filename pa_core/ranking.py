@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""จัดอันดับ findings: similarity จากดัชนี + priors (ความรุนแรง/ความใหม่) + top-k"""
+import numpy as np
+import pandas as pd
+
+from .analyzers import DEFAULT_ANALYZER
+from .index import IncrementalIndex, build_lsa, build_tfidf_index, extend_incremental_index, findings_text
+
+# คะแนนรวม = sim*w_sim + ความรุนแรง*w_severity + ความใหม่*w_recency
+RANKING_WEIGHTS = {"sim": 0.65, "severity": 0.25, "recency": 0.10}
+RESULT_COLS = [
+    "finding_id","year","unit","program","issue_title","issue_detail",
+    "cause_category","cause_detail","recommendation","outcomes_impact","severity"
+]
+
+def compute_priors(findings_df: pd.DataFrame, year_range=None) -> dict:
+    """คะแนนตั้งต้นรายแถว (ความรุนแรง/ความใหม่ ปรับเป็น 0-1) คำนวณครั้งเดียวตอนสร้างดัชนี
+
+    year_range: (ปีต่ำสุด, ปีสูงสุด) ที่ใช้ปรับความใหม่ (ค่าเริ่มต้นคือช่วงปีของ findings_df เอง)
+    """
+    n = len(findings_df)
+    if "severity" in findings_df.columns:
+        sev_norm = findings_df["severity"].to_numpy(dtype=np.float32) / 5
+    else:
+        sev_norm = np.full(n, 3 / 5, dtype=np.float32)
+    year_norm = np.zeros(n, dtype=np.float32)
+    if "year" in findings_df.columns and n:
+        year = findings_df["year"].to_numpy(dtype=np.float32)
+        lo, hi = year_range if year_range is not None else (year.min(), year.max())
+        if hi != lo:
+            year_norm = np.clip((year - lo) / np.float32(hi - lo), 0, 1)
+    return {"severity": sev_norm, "recency": year_norm}
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """ตำแหน่งของ top_k คะแนนสูงสุด เรียงจากมากไปน้อย (argpartition O(n) แล้วเรียงเฉพาะผู้ชนะ)
+
+    แถวที่คะแนนไม่ใช่ตัวเลขจำกัด (-inf = แถวที่ถูกซ่อน/ถูกแทนที่) ไม่ถูกคืน แม้ top_k จะมากกว่าจำนวนแถวที่เหลือ
+    """
+    k = min(top_k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+    top = top[np.isfinite(scores[top])]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+class RankingEngine:
+    """จัดอันดับ findings จากดัชนีที่สร้างแล้ว: sparse matvec + priors ที่คำนวณไว้ + top-k
+
+    แถวของ X และเวกเตอร์คำค้น normalize (L2) แล้ว ผลคูณจึงเท่ากับ cosine similarity
+    """
+
+    def __init__(self, findings_df: pd.DataFrame, vec, X, priors: dict = None):
+        self.findings_df = findings_df
+        self.vec = vec
+        self.X = X
+        self.priors = priors if priors is not None else compute_priors(findings_df)
+        self.result_cols = [c for c in RESULT_COLS if c in findings_df.columns]
+
+    def __len__(self):
+        return len(self.findings_df)
+
+    @property
+    def docs(self):
+        """เมทริกซ์ของแถวในคลัง (หนึ่งแถวต่อ finding) ที่ score() ใช้"""
+        return self.X
+
+    def encode(self, texts):
+        """เวกเตอร์ของข้อความ (คำค้น หรือแถวใหม่ของ session) ใน space เดียวกับ docs"""
+        return self.vec.transform(texts)
+
+    def score(self, docs, Q) -> np.ndarray:
+        # sparse x sparse ครั้งเดียวทุกคำค้น แปลงเป็น dense เฉพาะผลลัพธ์ (n_rows x n_queries)
+        return (docs @ Q.T).toarray()
+
+    def similarities(self, query_text: str, rows: np.ndarray = None) -> np.ndarray:
+        qv = self.vec.transform([query_text])
+        return (self.X if rows is None else self.X[rows]) @ qv.toarray().ravel()
+
+    def similarity_matrix(self, texts, rows: np.ndarray = None) -> np.ndarray:
+        """similarity ของหลายคำค้นพร้อมกัน (n_rows x n_queries) ด้วยการคูณเมทริกซ์ครั้งเดียว"""
+        return self.score(self.docs if rows is None else self.docs[rows], self.encode(texts))
+
+    def blend(self, sims: np.ndarray, weights: dict = None, rows: np.ndarray = None) -> np.ndarray:
+        w = dict(RANKING_WEIGHTS, **(weights or {}))
+        prior = self.priors["severity"] * w["severity"] + self.priors["recency"] * w["recency"]
+        if rows is not None:
+            prior = prior[rows]
+        return sims * w["sim"] + (prior[:, None] if sims.ndim == 2 else prior)
+
+    def materialize(self, rows: np.ndarray, scores: np.ndarray, sims: np.ndarray) -> pd.DataFrame:
+        """สร้าง DataFrame เฉพาะแถวที่ชนะ (คอลัมน์ตามผลลัพธ์เดิม + score, sim_score ของแถวเหล่านั้นตามลำดับ)"""
+        out = self.findings_df.iloc[rows][self.result_cols].copy()
+        out["score"] = scores
+        out["sim_score"] = sims
+        return out
+
+    def search(self, query_text: str, top_k: int = 8, weights: dict = None, rows: np.ndarray = None) -> pd.DataFrame:
+        """rows: ตำแหน่งแถวที่เรียงแล้ว (เช่น จาก FacetIndex.select) ให้คำนวณคะแนนเฉพาะแถวเหล่านี้ None = ทุกแถว"""
+        sims = self.similarities(query_text, rows)
+        scores = self.blend(sims, weights, rows)
+        top = top_k_indices(scores, min(top_k, len(self) if rows is None else len(rows)))
+        return self.materialize(top if rows is None else rows[top], scores[top], sims[top])
+
+    def search_batch(self, queries: pd.DataFrame, top_k: int = 3, weights: dict = None,
+                     dedupe: bool = False, rows: np.ndarray = None) -> pd.DataFrame:
+        """ค้นหาหลายคำค้นในครั้งเดียว (queries มีคอลัมน์ query_id, source, text)
+
+        คืนผลต่อรายการ (top_k ต่อคำค้น) ต่อกันเป็น DataFrame เดียว ถ้า dedupe=True
+        ข้อตรวจพบหนึ่งรายการจะถูกแนะนำให้เพียงคำค้นเดียว (คำค้นที่มาก่อนได้ก่อน) rows เหมือนใน search()
+        """
+        if queries.empty:
+            return pd.DataFrame()
+        sims = self.similarity_matrix(queries["text"].tolist(), rows)
+        scores = self.blend(sims, weights, rows)
+        n = len(self) if rows is None else len(rows)
+        used = set()
+        parts = []
+        for j, q in enumerate(queries.itertuples(index=False)):
+            col_scores, col_sims = scores[:, j], sims[:, j]
+            cand = top_k_indices(col_scores, min(top_k + (len(used) if dedupe else 0), n))
+            if dedupe:
+                cand = np.array([r for r in cand if r not in used][:top_k], dtype=np.int64)
+                used.update(cand.tolist())
+            part = self.materialize(cand if rows is None else rows[cand], col_scores[cand], col_sims[cand])
+            part.insert(0, "rank", np.arange(1, len(part) + 1))
+            part.insert(0, "query_text", q.text)
+            part.insert(0, "source", q.source)
+            part.insert(0, "query_id", q.query_id)
+            parts.append(part)
+        return pd.concat(parts)
+
+class LsaRankingEngine(RankingEngine):
+    """ค้นหาด้วยเวกเตอร์ LSA แบบ dense: หนึ่ง matvec ขนาด n x k (BLAS) แทน sparse cosine บน feature ทั้งหมด"""
+
+    def __init__(self, findings_df: pd.DataFrame, vec, lsa, priors: dict = None):
+        # ไม่เก็บ X ไว้ ใช้เพียง Z (หน่วยความจำคงที่ k*4 ไบต์ต่อแถว)
+        super().__init__(findings_df, vec, None, priors)
+        components, self.active_cols, self.Z = lsa
+        # คอลัมน์ของ feature space -> แถวของ components.T (-1 = คอลัมน์ที่ไม่มีในคลัง)
+        # ใช้แทนการ slice คอลัมน์ของ sparse query ซึ่งช้าเมื่อ vocabulary ใหญ่
+        n_features = len(vec.idf_) if hasattr(vec, "idf_") else len(vec.idf)
+        self._col_pos = np.full(n_features, -1, dtype=np.int64)
+        self._col_pos[self.active_cols] = np.arange(len(self.active_cols))
+        self.components = components
+
+    @property
+    def docs(self):
+        return self.Z
+
+    def encode(self, texts):
+        return self.embed(texts)
+
+    def score(self, docs, Q) -> np.ndarray:
+        return docs @ Q.T
+
+    def embed(self, texts) -> np.ndarray:
+        import scipy.sparse as sp
+        from sklearn.preprocessing import normalize
+        qv = self.vec.transform(texts).tocsr()
+        pos = self._col_pos[qv.indices]
+        keep = pos >= 0
+        # ดึงเฉพาะแถวของ components.T ที่คำค้นใช้ (nnz x k, float32) แล้วรวมต่อคำค้นด้วย sparse matmul
+        # ไม่คูณกับ components ทั้งก้อน (scipy จะแปลงทั้งเมทริกซ์เป็น float64 ทุกครั้งที่ dtype ไม่ตรงกัน)
+        used = np.ascontiguousarray(self.components[:, pos[keep]].T)
+        indptr = np.concatenate(([0], np.cumsum(keep)))[qv.indptr]
+        weights = sp.csr_matrix((qv.data[keep].astype(np.float32), np.arange(len(used)), indptr),
+                                shape=(qv.shape[0], len(used)))
+        return normalize(weights @ used, copy=False)
+
+    def similarities(self, query_text: str, rows: np.ndarray = None) -> np.ndarray:
+        return (self.Z if rows is None else self.Z[rows]) @ self.embed([query_text])[0]
+
+    def similarity_matrix(self, texts, rows: np.ndarray = None) -> np.ndarray:
+        return (self.Z if rows is None else self.Z[rows]) @ self.embed(texts).T
+
+class OverlayRankingEngine(RankingEngine):
+    """ค้นหาใน FindingsView: ใช้ engine ของ base ที่แชร์กันทั้ง process ร่วมกับเวกเตอร์ของแถวที่ session อัปโหลด
+
+    แถวของ session ถูกแปลงด้วย vectorizer/idf (หรือ LSA components) ของ base จึงไม่ต้องสร้างดัชนีของ library ใหม่
+    และไม่ต้องคัดลอก base แถวของ base ที่ถูกแทนที่ได้คะแนน -inf (ไม่ถูกเลือก) ตำแหน่งแถวเป็นตามลำดับของ FindingsView
+    index: ดัชนีแบบ incremental ของตำแหน่งทั้งหมดของ view (base + แถวของ session เติมต่อท้ายด้วย append)
+    ถ้าให้มา ใช้ idf ของดัชนีนั้น (รวม compaction เมื่อแถวที่เติมเกินเกณฑ์) แทนการ encode แถวของ session เอง
+    """
+
+    def __init__(self, base: RankingEngine, view, index: IncrementalIndex = None):
+        self.base = base
+        self.view = view
+        self.index = index
+        self.findings_df = view.rows
+        self.vec = base.vec
+        self.result_cols = base.result_cols
+        self.n_base = len(view.base)
+        self.hidden = view.hidden
+        if index is not None:
+            self.vec, self.X = index, index.X
+        else:
+            self.X = base.encode(findings_text(view.rows).tolist()) if len(view.rows) else None
+        # ความใหม่ของแถวใหม่เทียบกับช่วงปีของ base (คะแนนของ base ไม่เปลี่ยนเพราะมีแถวอัปโหลด)
+        year = view.base["year"] if "year" in view.base.columns and self.n_base else None
+        self.priors = compute_priors(view.rows, (year.min(), year.max()) if year is not None else None)
+
+    def __len__(self):
+        return len(self.view)
+
+    def _split(self, rows: np.ndarray):
+        """แยกตำแหน่งของ view (เรียงแล้ว) เป็น (แถวของ base, แถวของ session) None = ทุกแถว"""
+        if rows is None:
+            return None, None
+        cut = np.searchsorted(rows, self.n_base)
+        return rows[:cut], rows[cut:] - self.n_base
+
+    def similarities(self, query_text: str, rows: np.ndarray = None) -> np.ndarray:
+        return self.similarity_matrix([query_text], rows)[:, 0]
+
+    def similarity_matrix(self, texts, rows: np.ndarray = None) -> np.ndarray:
+        if self.index is not None:
+            # แถวของดัชนี = ตำแหน่งของ view
+            return self.score(self.X if rows is None else self.X[rows], self.index.transform(texts))
+        Q = self.base.encode(texts)
+        base_rows, own_rows = self._split(rows)
+        parts = [self.base.score(self.base.docs if base_rows is None else self.base.docs[base_rows], Q)]
+        if self.X is not None:
+            parts.append(self.base.score(self.X if own_rows is None else self.X[own_rows], Q))
+        return np.concatenate(parts)
+
+    def blend(self, sims: np.ndarray, weights: dict = None, rows: np.ndarray = None) -> np.ndarray:
+        base_rows, own_rows = self._split(rows)
+        n_base = self.n_base if base_rows is None else len(base_rows)
+        scores = np.concatenate([self.base.blend(sims[:n_base], weights, base_rows),
+                                 super().blend(sims[n_base:], weights, own_rows)])
+        scores[self.hidden if rows is None else np.isin(rows, self.hidden)] = -np.inf
+        return scores
+
+    def materialize(self, rows: np.ndarray, scores: np.ndarray, sims: np.ndarray) -> pd.DataFrame:
+        out = self.view.take(rows, self.result_cols)
+        out["score"] = scores
+        out["sim_score"] = sims
+        return out
+
+RANKING_BACKENDS = {"sparse": "TF-IDF (sparse cosine)", "lsa": "LSA (dense embedding)"}
+
+def build_ranking_engine(findings_df: pd.DataFrame, analyzer: str = DEFAULT_ANALYZER,
+                         backend: str = "sparse", version: str = None, base_engine: RankingEngine = None) -> RankingEngine:
+    """version: ID ของ library (MergeReport.version) ใช้เป็นคีย์ของดัชนีแทนการ hash ข้อความทุกแถว
+
+    findings_df เป็น FindingsView ได้: สร้าง engine ของ base (version = view.base_version) แล้วซ้อนแถวของ session
+    backend sparse ในโหมด incremental เติมแถวของ session ต่อท้ายดัชนีของ base (IncrementalIndex.append) และเก็บลงดิสก์
+    base_engine: engine ของ view.base ที่ผู้เรียกแคชไว้แล้ว (เช่น st.cache_resource คีย์ base_version) ใช้แทนการสร้างใหม่
+    """
+    from .findings import FindingsView
+    if isinstance(findings_df, FindingsView):
+        if findings_df.base.empty:
+            # ไม่มี base (ไม่มีไฟล์หลัก) -> ทุกแถวมาจากไฟล์ที่อัปโหลด สร้างดัชนีจากแถวเหล่านั้นโดยตรง
+            return build_ranking_engine(findings_df.to_frame(), analyzer, backend, version=version)
+        base = base_engine or build_ranking_engine(findings_df.base, analyzer, backend,
+                                                   version=findings_df.base_version or None)
+        if not len(findings_df.rows):
+            return base
+        if type(base) is RankingEngine and isinstance(base.vec, IncrementalIndex):
+            return OverlayRankingEngine(base, findings_df, extend_incremental_index(base.vec, findings_df.rows))
+        return OverlayRankingEngine(base, findings_df)
+    vec, X = build_tfidf_index(findings_df, analyzer, version=version)
+    priors = compute_priors(findings_df)
+    if backend == "lsa":
+        lsa = build_lsa(findings_df, X, analyzer, version=version)
+        # ข้อมูลน้อยเกินกว่าจะลดมิติ -> ใช้ sparse แทน
+        if lsa is not None:
+            return LsaRankingEngine(findings_df, vec, lsa, priors)
+    return RankingEngine(findings_df, vec, X, priors)
+
+def recall_at_k(engine: RankingEngine, queries, relevant_rows, k: int = 8) -> float:
+    """สัดส่วนคำค้นที่แถวเป้าหมาย (ตำแหน่งแถว) ติดอยู่ใน top-k ตาม similarity ล้วน (ไม่รวม priors)"""
+    if not len(queries):
+        return 0.0
+    hits = sum(int(row in top_k_indices(engine.similarities(q), k)) for q, row in zip(queries, relevant_rows))
+    return hits / len(queries)
+
+def plan_queries(logic_df: pd.DataFrame, kpis_df: pd.DataFrame, risks_df: pd.DataFrame) -> pd.DataFrame:
+    """แปลงแต่ละแถวของ Logic Model / KPIs / Risks เป็นคำค้นหนึ่งรายการ (ข้ามแถวที่ไม่มีข้อความ)"""
+    rows = []
+    for _, r in logic_df.iterrows():
+        rows.append((r["item_id"], f"Logic: {r['type']}", f"{r['description']} {r['metric']}"))
+    for _, r in kpis_df.iterrows():
+        rows.append((r["kpi_id"], "KPI", f"{r['name']} {r['formula']}"))
+    for _, r in risks_df.iterrows():
+        rows.append((r["risk_id"], "Risk", f"{r['description']} {r['hypothesis']}"))
+    queries = pd.DataFrame(rows, columns=["query_id", "source", "text"])
+    queries["text"] = queries["text"].str.strip()
+    return queries[queries["text"] != ""].reset_index(drop=True)
+
+def search_candidates(query_text, findings_df, vec, X, top_k=8, weights=None):
+    return RankingEngine(findings_df, vec, X).search(query_text, top_k=top_k, weights=weights)
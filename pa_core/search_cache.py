@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""แคชผลการค้นหา top-k ในหน่วยความจำของ process (LRU จำกัดจำนวนรายการ) ใช้ร่วมกันทุก session
+
+คีย์ = (version ของ library/ดัชนี, คำค้นที่ยุบช่องว่างแล้ว, top_k, น้ำหนักการจัดอันดับ, ตัวกรอง)
+library เปลี่ยน -> version เปลี่ยน -> คีย์เดิมไม่ถูกใช้อีกและหลุดออกไปเองตาม LRU ไม่ต้องล้างแคชเอง
+
+    cache = get_search_cache()
+    results = cache.search(engine, query, top_k=8, weights=weights, rows=rows, filters=filters,
+                           version=(library_version, analyzer, backend))
+    cache.stats()   # {"hits", "misses", "hit_rate", "entries", "evictions"}
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from .ranking import RANKING_WEIGHTS
+
+SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get("PA_SEARCH_CACHE_ENTRIES", "512"))
+
+def normalize_query(text: str) -> str:
+    """ยุบช่องว่าง/ขึ้นบรรทัดใหม่ที่ต่อกันเป็นช่องว่างเดียว และตัดช่องว่างหัวท้าย"""
+    return " ".join(str(text).split())
+
+def search_key(version, query_text: str, top_k: int, weights: dict = None, filters: dict = None, rows=None) -> tuple:
+    """คีย์ของการค้นหาหนึ่งครั้ง ตัวกรองใช้ค่าที่เลือก (เรียงแล้ว) ถ้าไม่มี filters แต่มี rows ใช้ hash ของ rows แทน"""
+    w = dict(RANKING_WEIGHTS, **(weights or {}))
+    if filters is not None:
+        subset = tuple(sorted((k, tuple(sorted(v))) for k, v in filters.items() if v))
+    elif rows is not None:
+        subset = hashlib.blake2b(rows.tobytes(), digest_size=16).hexdigest()
+    else:
+        subset = ()
+    return (version, normalize_query(query_text), int(top_k),
+            tuple(sorted((k, round(float(v), 6)) for k, v in w.items())), subset)
+
+class SearchCache:
+    """LRU ของผลการค้นหา (DataFrame ขนาด top_k แถว) พร้อมตัวนับ hit/miss ของ process (ใช้ร่วมกันได้หลาย thread)"""
+
+    def __init__(self, max_entries: int = SEARCH_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """สำเนาของผลที่แคชไว้ หรือ None"""
+        with self._lock:
+            results = self._entries.get(key)
+            if results is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return results.copy()
+
+    def put(self, key, results) -> None:
+        with self._lock:
+            self._entries[key] = results.copy()
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def search(self, engine, query_text: str, top_k: int = 8, weights: dict = None, rows=None,
+               filters: dict = None, version=None):
+        """engine.search() ผ่านแคช version ต้องระบุ library และดัชนีได้ครบ (ถ้าไม่มี version จะไม่ใช้แคช)
+
+        คืน (ผลลัพธ์, มาจากแคชหรือไม่)
+        """
+        if not version or self.max_entries <= 0:
+            return engine.search(query_text, top_k=top_k, weights=weights, rows=rows), False
+        key = search_key(version, query_text, top_k, weights, filters, rows)
+        results = self.get(key)
+        if results is not None:
+            return results, True
+        results = engine.search(query_text, top_k=top_k, weights=weights, rows=rows)
+        self.put(key, results)
+        return results, False
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0.0,
+                    "entries": len(self._entries), "evictions": self.evictions}
+
+_DEFAULT_CACHE = None
+
+def get_search_cache() -> SearchCache:
+    """แคชเดียวของทั้ง process (สร้างเมื่อใช้ครั้งแรก)"""
+    global _DEFAULT_CACHE
+    if _DEFAULT_CACHE is None:
+        _DEFAULT_CACHE = SearchCache()
+    return _DEFAULT_CACHE
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""fixture ร่วมของชุดทดสอบ: แยกโฟลเดอร์แคช/ดัชนี/store ของแต่ละเทสต์ไว้ใน tmp_path"""
+import pytest
+
+from benchmarks.mock_llm import serve
+from pa_core import findings, index, llm, llm_cache
+
+@pytest.fixture(autouse=True)
+def isolated_dirs(tmp_path, monkeypatch):
+    """ดัชนี, token store, Parquet store และแคช LLM เขียนลง tmp_path และล้างดัชนีที่ค้างในหน่วยความจำ"""
+    monkeypatch.setattr(index, "INDEX_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(findings, "FINDINGS_STORE_DIR", str(tmp_path / "store"))
+    monkeypatch.setattr(llm_cache, "_DEFAULT_CACHE", llm_cache.ResponseCache(str(tmp_path / "llm_cache")))
+    index.reset_index_caches()
+    yield tmp_path
+    index.reset_index_caches()
+
+@pytest.fixture
+def mock_llm(monkeypatch):
+    """เริ่ม mock server (benchmarks.mock_llm) และชี้ pa_core.llm ไปที่ server นั้น (backoff สั้นเพื่อให้เทสต์เร็ว)"""
+    servers = []
+
+    def start(**options):
+        server = serve(**options)
+        servers.append(server)
+        monkeypatch.setattr(llm, "TYPHOON_BASE_URL", server.base_url)
+        return server
+
+    monkeypatch.setattr(llm, "LLM_BACKOFF_BASE", 0.001)
+    yield start
+    for server in servers:
+        server.shutdown()
+
+@pytest.fixture
+def library():
+    """library สังเคราะห์ 300 แถวในรูปแบบเดียวกับที่อ่านจาก Parquet"""
+    from benchmarks.synthetic import make_findings
+    return findings.compact_findings(make_findings(300, seed=0))
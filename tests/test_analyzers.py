@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""analyzer ภาษาไทย (normalize_text, analyze_thai_char) และ token cache แบบ log ของ pickle (TokenStore)"""
+import os
+import pickle
+
+import pandas as pd
+import pytest
+
+from pa_core import analyzers
+from pa_core.analyzers import TokenStore, analyze_thai_char, normalize_text, row_keys
+
+def test_normalize_text():
+    assert normalize_text("ปี ๒๕๖๗") == "ปี 2567"
+    assert normalize_text("เเผนงาน") == "แผนงาน"
+    assert normalize_text("ทํางาน") == "ทำงาน"
+    assert normalize_text("ตรวจ\u200bสอบ\ufeff KPI") == "ตรวจสอบ kpi"
+
+def test_thai_char_ngrams_and_latin_words():
+    assert analyze_thai_char("ตรวจ") == [" ตร", "ตรว", "รวจ", "วจ "]
+    assert analyze_thai_char("KPI ข้อ 1 x") == ["kpi", " ข้", "ข้อ", "้อ "]
+    assert analyze_thai_char("๑๒ แผน") == ["12", " แผ", "แผน", "ผน "]
+
+def test_default_analyzer_is_pinned():
+    assert analyzers.DEFAULT_ANALYZER == os.environ.get("PA_ANALYZER", "thai_char")
+
+@pytest.fixture
+def cached_analyzer(monkeypatch):
+    """analyzer ปลอมที่แคชเหมือน thai_word (ไม่ต้องติดตั้ง pythainlp) และนับจำนวนแถวที่ถูกตัดคำจริง"""
+    calls = []
+    def fake(text):
+        calls.append(text)
+        return text.split()
+    monkeypatch.setitem(analyzers.ANALYZERS, "fake", fake)
+    monkeypatch.setattr(analyzers, "CACHED_ANALYZERS", {"fake"})
+    return calls
+
+def _texts(*rows):
+    return pd.Series(list(rows))
+
+def _log_chunks(path):
+    chunks = []
+    with open(path, "rb") as f:
+        while True:
+            try:
+                chunks.append(pickle.load(f))
+            except EOFError:
+                return chunks
+
+def test_save_appends_only_new_rows(tmp_path, cached_analyzer):
+    path = str(tmp_path / "tokens.pkl")
+    store = TokenStore("fake", path)
+    assert list(store.tokenize(_texts("a b", "c"))) == [["a", "b"], ["c"]]
+    store.save()
+    store = TokenStore("fake", path)
+    assert list(store.tokenize(_texts("a b", "c", "d e"))) == [["a", "b"], ["c"], ["d", "e"]]
+    assert cached_analyzer == ["a b", "c", "d e"]  # แถวที่อยู่ในแคชไม่ถูกตัดคำซ้ำ
+    store.save()
+    # ไฟล์เป็น log: ช่วงแรกมีสองแถวเดิม ช่วงที่สองมีเฉพาะแถวใหม่
+    assert [len(c) for c in _log_chunks(path)] == [2, 1]
+    assert TokenStore("fake", path).tokens == store.tokens
+
+def test_eviction_keeps_recent_rows_and_rewrites_log(tmp_path, cached_analyzer):
+    path = str(tmp_path / "tokens.pkl")
+    store = TokenStore("fake", path, max_rows=3)
+    list(store.tokenize(_texts("a", "b", "c")))
+    store.save()
+    # ใช้ "a" อีกครั้งแล้วเพิ่มสองแถวใหม่ -> แถวที่ใช้ล่าสุดน้อยที่สุด ("b", "c") ถูกตัดทิ้ง
+    list(store.tokenize(_texts("a", "d", "e")))
+    keys = row_keys(_texts("a", "b", "c", "d", "e")).tolist()
+    assert list(store.tokens) == [keys[0], keys[3], keys[4]]
+    store.save()
+    chunks = _log_chunks(path)
+    assert len(chunks) == 1 and list(chunks[0]) == list(store.tokens)
+    # โหลดไฟล์ที่เกิน max_rows -> ตัดแถวเก่าที่สุดทิ้งทันที
+    small = TokenStore("fake", path, max_rows=2)
+    assert list(small.tokens) == [keys[3], keys[4]]
+
+def test_legacy_list_entries_are_migrated(tmp_path, cached_analyzer):
+    path = str(tmp_path / "tokens.pkl")
+    key = int(row_keys(_texts("a b"))[0])
+    with open(path, "wb") as f:
+        pickle.dump({key: ["a", "b"]}, f)
+    store = TokenStore("fake", path)
+    assert store.tokens == {key: "a\x1fb"}
+    assert list(store.tokenize(_texts("a b"))) == [["a", "b"]]
+    assert cached_analyzer == []
+    store.save()
+    assert _log_chunks(path) == [{key: "a\x1fb"}]
+
+def test_corrupt_log_keeps_readable_prefix(tmp_path, cached_analyzer):
+    path = str(tmp_path / "tokens.pkl")
+    store = TokenStore("fake", path)
+    list(store.tokenize(_texts("a")))
+    store.save()
+    with open(path, "ab") as f:
+        f.write(b"\x80\x05garbage")
+    store = TokenStore("fake", path)
+    assert len(store.tokens) == 1
+    list(store.tokenize(_texts("b")))
+    store.save()
+    assert [len(c) for c in _log_chunks(path)] == [2]
+
+def test_uncached_analyzer_skips_the_store(tmp_path):
+    store = TokenStore("thai_char", str(tmp_path / "tokens.pkl"))
+    texts = _texts("ตรวจ", "ตรวจ")
+    assert list(store.tokenize(texts)) == [analyze_thai_char("ตรวจ")] * 2
+    assert not store.tokens and not store.pending
+    store.save()
+    assert not os.path.exists(store.path)
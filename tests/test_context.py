@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""บริบทของแผนสำหรับ PA Assist ภายในงบ token (pa_core.context)"""
+import pandas as pd
+
+from pa_core.context import build_plan_context, count_tokens
+
+LONG = "การจัดซื้อจัดจ้างล่าช้าและไม่โปร่งใส " * 30
+PLAN = {"plan_title": LONG, "objectives": LONG, "scope": LONG, "when": "ปีงบประมาณ 2567", "why": LONG}
+TABLES = {
+    "logic_items": pd.DataFrame({"description": [f"ผลผลิตที่ {i}" for i in range(40)], "type": "Output"}),
+    "risks": pd.DataFrame({"description": [f"ความเสี่ยงที่ {i}" for i in range(40)], "category": "การเงิน"}),
+}
+
+def test_fits_budget_with_tables():
+    ctx = build_plan_context(PLAN, TABLES, budget=1000)
+    assert count_tokens(ctx.text) <= ctx.tokens <= 1000
+    assert ctx.report["logic_items"]["rows"] > 0
+    assert ctx.truncated
+
+def test_header_counts_toward_budget_and_is_truncated():
+    for budget in (20, 100, 300):
+        ctx = build_plan_context(PLAN, TABLES, budget=budget)
+        assert count_tokens(ctx.text) <= budget
+        assert ctx.report["plan"]["tokens"] <= budget
+        assert ctx.report["plan"]["rows"] < ctx.report["plan"]["total_rows"] == 5
+        assert ctx.truncated
+    # ช่องยาวถูกตัดก่อน ช่องสั้นยังอยู่ครบ
+    assert "ปีงบประมาณ 2567" in build_plan_context(PLAN, {}, budget=300).text
+
+def test_everything_fits_without_truncation():
+    ctx = build_plan_context({"plan_title": "แผนทดสอบ"}, TABLES, budget=5000)
+    assert not ctx.truncated
+    assert ctx.report["plan"] == {"tokens": count_tokens("ชื่อแผน/เรื่องที่จะตรวจ: แผนทดสอบ"), "rows": 0, "total_rows": 0}
+    assert ctx.report["risks"]["rows"] == 40
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""ตัวกรอง findings ตามค่าของคอลัมน์ (pa_core.facets)"""
+import numpy as np
+import pandas as pd
+
+from pa_core.facets import FacetIndex
+from pa_core.findings import compact_findings, overlay_findings
+
+def _mask(df, filters):
+    mask = np.ones(len(df), dtype=bool)
+    for col, values in filters.items():
+        if values:
+            mask &= df[col].isin(values).to_numpy()
+    return mask
+
+def test_select_matches_boolean_mask(library):
+    facets = FacetIndex.from_findings(library)
+    units = facets.values("unit")[:2]
+    filters = {"year": facets.values_between("year", 2560, 2565), "severity": [4, 5], "unit": units}
+    rows = facets.select(filters)
+    np.testing.assert_array_equal(rows, np.flatnonzero(_mask(library, filters)))
+    assert np.all(np.diff(rows) > 0)
+
+def test_empty_filters_select_everything(library):
+    facets = FacetIndex.from_findings(library)
+    assert facets.select({}) is None
+    assert facets.select({"unit": [], "year": None}) is None
+    assert facets.select({"no_such_column": ["x"]}) is None
+    assert len(facets.select({"unit": ["ไม่มีหน่วยงานนี้"]})) == 0
+
+def test_counts_ignore_own_filter(library):
+    facets = FacetIndex.from_findings(library)
+    filters = {"severity": [5], "year": [2566, 2567]}
+    counts = facets.counts("severity", filters)
+    expected = library[library["year"].isin([2566, 2567])]["severity"].value_counts()
+    assert counts == {int(k): int(v) for k, v in expected.sort_index().items()}
+    assert sum(facets.counts("unit").values()) == len(library)
+
+def test_view_positions_skip_replaced_rows(library):
+    edited = library.iloc[[0, 1]].copy()
+    edited["severity"] = np.int8(1)
+    new = library.iloc[[2]].copy()
+    new["finding_id"] = "N-1"
+    view, _ = overlay_findings(library, compact_findings(pd.concat([edited, new], ignore_index=True)))
+    facets = FacetIndex.from_findings(view)
+    assert facets.n_rows == len(library) + 3  # ตำแหน่งของ view: base ทั้งหมด แล้วแถวของ session ทั้งหมด
+    rows = facets.select({"severity": [1]})
+    # แถวเดิมที่ถูกแทนที่ (0, 1) ไม่ผ่านตัวกรอง แถวที่แก้ไขอยู่หลัง base
+    assert not np.isin([0, 1], rows).any()
+    assert {len(library), len(library) + 1} <= set(rows.tolist())
+    assert sum(facets.counts("unit").values()) == len(view)
+
+def test_view_without_base_library(library):
+    # regression: ไม่มี FindingsLibrary.csv -> base เป็น DataFrame() เปล่า ไม่มีคอลัมน์
+    view, _ = overlay_findings(pd.DataFrame(), library.iloc[:40].reset_index(drop=True))
+    facets = FacetIndex.from_findings(view)
+    assert facets.n_rows == 40
+    assert sum(facets.counts("severity").values()) == 40
+    np.testing.assert_array_equal(facets.select({"severity": [5]}),
+                                  np.flatnonzero(library["severity"].iloc[:40].to_numpy() == 5))
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""upsert ไฟล์ที่อัปโหลดเข้ากับ library, version ของ library, dtype แบบกระชับ และ FindingsView (base ที่แชร์ + แถวของ session)"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from pa_core.findings import (
+    CATEGORY_COLUMNS, FindingsView, clean_findings, compact_findings, library_version, load_library, merge_findings,
+    overlay_findings,
+)
+
+def _upload(library):
+    """แก้ไข 2 แถว, ซ้ำของเดิม 1 แถว, แถวใหม่ 3 แถว (หนึ่งแถวซ้ำกันเองในไฟล์)"""
+    edited = library.iloc[[3, 10]].copy()
+    edited["recommendation"] = "ข้อเสนอแนะที่แก้ไขแล้ว"
+    same = library.iloc[[20]].copy()
+    new = pd.DataFrame({"finding_id": ["N-1", "N-2", "N-2"], "issue_title": ["ใหม่ 1", "ใหม่ 2 (เก่า)", "ใหม่ 2"],
+                        "year": [2568, 2568, 2568], "severity": [4, 2, 2]})
+    return compact_findings(pd.concat([edited, same, new], ignore_index=True))
+
+def test_merge_upserts_by_finding_id(library):
+    merged, report = merge_findings(library, _upload(library))
+    assert (report.added, report.updated, report.duplicates) == (2, 2, 2)
+    assert len(merged) == len(library) + 2
+    # แถวที่แก้ไขอยู่ตำแหน่งเดิม แถวใหม่ต่อท้าย ลำดับของ base ไม่เปลี่ยน
+    assert merged["finding_id"].iloc[:len(library)].tolist() == library["finding_id"].tolist()
+    assert merged["recommendation"].iloc[[3, 10]].eq("ข้อเสนอแนะที่แก้ไขแล้ว").all()
+    assert merged["finding_id"].iloc[-2:].tolist() == ["N-1", "N-2"]
+    assert merged["issue_title"].iloc[-1] == "ใหม่ 2"  # ซ้ำกันในไฟล์ -> เก็บแถวสุดท้าย
+
+def test_rows_without_id_match_on_normalized_text(library):
+    base = library.assign(finding_id="")
+    again = base.iloc[[5]].copy()
+    again["issue_title"] = "  " + again["issue_title"].astype(str) + "  "
+    merged, report = merge_findings(base, again)
+    assert (report.added, report.updated) == (0, 1)
+    assert len(merged) == len(base)
+
+def test_merge_without_changes_returns_the_base(library):
+    merged, report = merge_findings(library, library.iloc[:50].copy())
+    assert merged is library
+    assert (report.added, report.updated, report.duplicates) == (0, 0, 50)
+
+def test_library_version_follows_source_hashes():
+    assert library_version("a", "b") == library_version("a", "b")
+    assert library_version("a", "b") != library_version("b", "a")
+    assert library_version("a") != library_version("a", "b")
+
+def test_load_library_versions_base_and_upload(tmp_path, library):
+    pytest.importorskip("pyarrow")
+    base_path = tmp_path / "FindingsLibrary.csv"
+    library.to_csv(base_path, index=False)
+    upload_path = tmp_path / "upload.csv"
+    _upload(library).to_csv(upload_path, index=False)
+
+    base_df, base_report = load_library(str(base_path))
+    merged, report = load_library(str(base_path), str(upload_path))
+    assert len(base_df) == len(library)
+    assert (report.added, report.updated) == (2, 2)
+    assert report.version != base_report.version
+    assert load_library(str(base_path), str(upload_path))[1].version == report.version
+
+def test_compact_dtypes(library):
+    assert library["year"].dtype == np.int16 and library["severity"].dtype == np.int8
+    assert all(isinstance(library[c].dtype, pd.CategoricalDtype) for c in CATEGORY_COLUMNS)
+
+def test_year_out_of_int16_range_becomes_unknown():
+    df = clean_findings(pd.DataFrame({"year": ["2567", "25670101", "ไม่ทราบ"], "severity": [9, None, "2"]}))
+    assert df["year"].tolist() == [2567, 0, 0]
+    assert df["severity"].tolist() == [5, 3, 2]
+    compact = compact_findings(pd.DataFrame({"year": [2567, 70000, np.nan], "severity": [1, 2, 3]}))
+    assert compact["year"].dtype == np.int16
+    assert compact["year"].tolist() == [2567, 0, 0]
+
+def test_overlay_matches_merge_without_copying_base(library):
+    upload = _upload(library)
+    view, report = overlay_findings(library, upload, base_version="v1")
+    merged, _ = merge_findings(library, upload)
+    assert view.base is library
+    assert len(view) == len(merged)
+    assert sorted(view.hidden.tolist()) == [3, 10]
+    pd.testing.assert_frame_equal(view.to_frame().astype(str), merged.astype(str))
+    # take: ตำแหน่งของ view = แถวของ base ก่อน แล้วจึงแถวของ session
+    rows = view.take([len(library) + 2, 0, len(library)], ["finding_id"])
+    assert rows["finding_id"].tolist() == ["N-1", library["finding_id"].iat[0], library["finding_id"].iat[3]]
+
+def test_overlay_on_empty_base():
+    upload = compact_findings(pd.DataFrame({"finding_id": ["A", "B"], "issue_title": ["x", "y"],
+                                            "year": [2567, 2568], "severity": [3, 5]}))
+    view, report = overlay_findings(pd.DataFrame(), upload)
+    assert report.added == 2 and len(view) == 2
+    assert view.to_frame()["finding_id"].tolist() == ["A", "B"]
+    assert isinstance(view, FindingsView) and not len(view.hidden)
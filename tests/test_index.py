@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""ดัชนีค้นหาบนดิสก์ (โหลดกลับแบบ memory-map โดยไม่ fit ใหม่) และการเติมแถวใหม่ (รวมไฟล์ที่อัปโหลด) ต่อท้ายดัชนีแบบ incremental"""
+import mmap
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_findings
+from pa_core import index
+from pa_core.analyzers import DEFAULT_ANALYZER
+from pa_core.findings import compact_findings, overlay_findings
+from pa_core.index import (
+    IncrementalIndex, build_incremental_index, build_tfidf_index, findings_row_keys, iter_findings_text,
+)
+from pa_core.profiling import start_profiler
+from pa_core.ranking import build_ranking_engine
+
+def _fresh_fit(df):
+    keys = findings_row_keys(df)
+    store = index.get_token_store(DEFAULT_ANALYZER)
+    return IncrementalIndex.fit(DEFAULT_ANALYZER, store.tokenize(iter_findings_text(df), keys), keys)
+
+def _grow(library, n_new):
+    extra = make_findings(n_new, seed=1)
+    extra["finding_id"] = "X-" + extra["finding_id"]
+    return pd.concat([library, extra], ignore_index=True)
+
+def _stages(profiler):
+    return [r["stage"] for r in profiler.records]
+
+def _is_mapped(arr) -> bool:
+    while arr is not None:
+        if isinstance(arr, (np.memmap, mmap.mmap)):
+            return True
+        arr = getattr(arr, "base", None)
+    return False
+
+def test_saved_index_loads_from_disk(library):
+    built = build_incremental_index(library)
+    index.reset_index_caches()
+    profiler = start_profiler()
+    loaded = build_incremental_index(library)
+    assert "index.fit" not in _stages(profiler)
+    assert loaded is not built
+    assert (loaded.X != built.X).nnz == 0
+    np.testing.assert_array_equal(loaded.row_keys, built.row_keys)
+
+def test_fitted_tfidf_round_trips(library, monkeypatch):
+    monkeypatch.setattr(index, "INDEX_MODE", "tfidf")
+    vec, X = build_tfidf_index(library)
+    index.reset_index_caches()
+    profiler = start_profiler()
+    vec2, X2 = build_tfidf_index(library)
+    assert "index.fit" not in _stages(profiler)
+    assert _is_mapped(X2.data) and _is_mapped(X2.indices)
+    assert (X2 != X).nnz == 0
+    query = library["issue_title"].iat[0]
+    np.testing.assert_allclose(vec2.transform([query]).toarray(), vec.transform([query]).toarray())
+
+def test_changed_text_gets_a_new_artifact(library):
+    build_incremental_index(library)
+    df = library.copy()
+    df.loc[0, "issue_title"] = "หัวข้อที่แก้ไข"
+    index.reset_index_caches()
+    profiler = start_profiler()
+    build_incremental_index(df)
+    assert "index.fit" in _stages(profiler)
+
+def test_append_reuses_base_rows_without_refit(library):
+    base = build_incremental_index(library)
+    profiler = start_profiler()
+    grown = build_incremental_index(_grow(library, 10))
+    assert "index.append" in _stages(profiler) and "index.fit" not in _stages(profiler)
+    assert len(grown) == len(library) + 10
+    assert grown.compacted_rows == len(library)  # drift 10/310 < เกณฑ์ -> ยังไม่ compact
+    np.testing.assert_array_equal(grown.idf, base.idf)
+    assert (grown.X[:len(library)] != base.X).nnz == 0
+    np.testing.assert_array_equal(grown.row_keys[:len(library)], base.row_keys)
+
+def test_compacts_past_drift_threshold(library):
+    build_incremental_index(library)
+    df = _grow(library, 100)
+    grown = build_incremental_index(df)
+    assert grown.compacted_rows == len(df) and grown.drift == 0.0
+    # หลัง compact น้ำหนักเท่ากับการ fit ใหม่ทั้งชุด (โดยไม่ต้องตัดคำแถวเดิมซ้ำ)
+    refit = _fresh_fit(df)
+    np.testing.assert_allclose(grown.idf, refit.idf)
+    assert abs(grown.X - refit.X).max() < 1e-6
+
+def test_doc_freq_tracks_appended_rows(library):
+    build_incremental_index(library)
+    df = _grow(library, 10)
+    grown = build_incremental_index(df)
+    np.testing.assert_array_equal(grown.doc_freq, _fresh_fit(df).doc_freq)
+
+def test_changed_row_is_not_treated_as_a_prefix(library):
+    build_incremental_index(library)
+    df = _grow(library, 10)
+    df.loc[0, "issue_title"] = "หัวข้อที่แก้ไข"
+    profiler = start_profiler()
+    build_incremental_index(df)
+    assert "index.fit" in _stages(profiler) and "index.append" not in _stages(profiler)
+
+def test_appended_index_is_saved(library):
+    build_incremental_index(library)
+    df = _grow(library, 10)
+    grown = build_incremental_index(df)
+    index.reset_index_caches()
+    profiler = start_profiler()
+    loaded = build_incremental_index(df)
+    assert "index.append" not in _stages(profiler) and "index.fit" not in _stages(profiler)
+    assert (loaded.X != grown.X).nnz == 0 and loaded.compacted_rows == grown.compacted_rows
+
+def _upload_view(library, n_new):
+    edited = library.iloc[:3].copy()
+    edited["issue_title"] = "หัวข้อที่แก้ไข"
+    extra = _grow(library, n_new).iloc[len(library):]
+    upload = compact_findings(pd.concat([edited, extra], ignore_index=True))
+    return overlay_findings(library, upload, base_version="base")[0]
+
+def test_upload_appends_to_the_base_index(library):
+    build_ranking_engine(library, version="base")
+    view = _upload_view(library, 10)
+    profiler = start_profiler()
+    engine = build_ranking_engine(view, version="upload")
+    stages = _stages(profiler)
+    assert "index.append" in stages and "index.fit" not in stages
+    append = next(r for r in profiler.records if r["stage"] == "index.append")
+    assert append["rows"] == len(view.rows)
+    assert len(engine.index) == len(view.base) + len(view.rows)
+    # session ใหม่ (process ใหม่) ที่อัปโหลดไฟล์เดิม โหลดดัชนีที่เติมแล้วจากดิสก์
+    index.reset_index_caches()
+    profiler = start_profiler()
+    build_ranking_engine(view, version="upload")
+    assert "index.append" not in _stages(profiler) and "index.fit" not in _stages(profiler)
+
+def test_large_upload_compacts_and_matches_a_full_fit(library):
+    view = _upload_view(library, 100)
+    engine = build_ranking_engine(view)
+    assert engine.index.drift == 0.0
+    # แถวของดัชนี = ตำแหน่งของ view (base ทั้งหมด แล้วแถวของ session)
+    full = _fresh_fit(pd.concat([library, view.rows], ignore_index=True))
+    query = view.rows["issue_title"].iat[5]
+    expected = (full.X @ full.transform([query]).T).toarray().ravel()
+    np.testing.assert_allclose(engine.similarities(query), expected, atol=1e-6)
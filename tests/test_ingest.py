@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""แปลงไฟล์ CSV/XLSX เป็น Parquet ทีละช่วง (pa_core.findings.ingest_findings_file) ผลต้องเท่ากับการอ่านทั้งไฟล์"""
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from benchmarks.synthetic import make_findings
+from pa_core import findings
+from pa_core.findings import (
+    FINDINGS_COLUMNS, _conform, _iter_xlsx, compact_findings, ingest_findings_file, read_columnar,
+    read_findings_file,
+)
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    """ช่วงละ 50 แถว (memory_mb เล็กมาก -> จำนวนแถวต่อช่วงเท่ากับค่าต่ำสุด)"""
+    monkeypatch.setattr(findings, "INGEST_MIN_CHUNK_ROWS", 50)
+    return 1e-6
+
+def _messy_csv(tmp_path, n=230):
+    df = make_findings(n, seed=3).drop(columns=["cause_category"])
+    df[["year", "severity"]] = df[["year", "severity"]].astype(str)
+    df.loc[5, "year"] = "25670101"  # เกินช่วง int16 -> ไม่ทราบปี
+    df.loc[6, "year"] = "ไม่ระบุ"
+    df.loc[7, "severity"] = "9"
+    df.loc[8, "issue_title"] = None
+    df["note"] = "หมายเหตุ"  # คอลัมน์เพิ่มเติมเก็บเป็นข้อความ
+    path = tmp_path / "findings.csv"
+    df.to_csv(path, index=False)
+    return str(path)
+
+def _read_whole(path, name):
+    df, _ = read_findings_file(path, name)
+    return compact_findings(_conform(df))
+
+def test_csv_spans_several_row_groups(tmp_path, small_chunks):
+    path = _messy_csv(tmp_path)
+    calls = []
+    parquet, sheet = ingest_findings_file(path, "findings.csv", memory_mb=small_chunks,
+                                          progress=lambda fraction, rows: calls.append((fraction, rows)))
+    assert sheet is None
+    assert pq.ParquetFile(parquet).num_row_groups == len(calls) == 5
+    assert [rows for _, rows in calls] == [50, 100, 150, 200, 230]
+    fractions = [fraction for fraction, _ in calls]
+    assert fractions == sorted(fractions) and fractions[-1] == 1.0
+
+def test_parquet_schema_is_explicit(tmp_path, small_chunks):
+    parquet, _ = ingest_findings_file(_messy_csv(tmp_path), "findings.csv", memory_mb=small_chunks)
+    schema = pq.read_schema(parquet)
+    assert schema.names == FINDINGS_COLUMNS + ["note"]
+    assert schema.field("year").type == pa.int16() and schema.field("severity").type == pa.int8()
+    assert all(schema.field(c).type == pa.string() for c in schema.names if c not in ("year", "severity"))
+    assert schema.metadata[b"pa_source"] == b"findings.csv"
+
+def test_chunked_ingest_equals_reading_the_whole_file(tmp_path, small_chunks):
+    path = _messy_csv(tmp_path)
+    parquet, _ = ingest_findings_file(path, "findings.csv", memory_mb=small_chunks)
+    got = read_columnar(parquet, FINDINGS_COLUMNS + ["note"])
+    expected = _read_whole(path, "findings.csv")
+    assert got["year"].dtype == np.int16 and got["severity"].dtype == np.int8
+    assert got["year"].iat[5] == got["year"].iat[6] == 0 and got["severity"].iat[7] == 5
+    assert got["cause_category"].eq("").all()
+    pd.testing.assert_frame_equal(got.astype(str), expected.astype(str))
+
+def test_same_content_is_converted_once(tmp_path, small_chunks):
+    path = _messy_csv(tmp_path)
+    first, _ = ingest_findings_file(path, "findings.csv", memory_mb=small_chunks)
+    calls = []
+    again, _ = ingest_findings_file(path, "findings.csv", progress=lambda *a: calls.append(a))
+    assert again == first and calls == []
+
+def test_xlsx_chunked_ingest_equals_reading_the_whole_file(tmp_path, small_chunks):
+    pytest.importorskip("openpyxl")
+    df = make_findings(120, seed=4)
+    path = str(tmp_path / "findings.xlsx")
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({"อ่านฉัน": ["ชีตอื่น"]}).to_excel(writer, sheet_name="Notes", index=False)
+        df.to_excel(writer, sheet_name="Data", index=False)
+    parquet, sheet = ingest_findings_file(path, "findings.xlsx", memory_mb=small_chunks)
+    assert sheet == "Data" and pq.ParquetFile(parquet).num_row_groups == 3
+    pd.testing.assert_frame_equal(read_columnar(parquet).astype(str), _read_whole(path, "findings.xlsx").astype(str))
+
+class _Sheet:
+    """worksheet แบบ read-only ของ openpyxl เท่าที่ _iter_xlsx ใช้"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.max_row = len(rows)
+
+    def iter_rows(self, values_only=True):
+        return iter(self.rows)
+
+def test_iter_xlsx_pads_short_rows_and_skips_blank_rows(small_chunks):
+    rows = [("finding_id", None, "year")] + [(f"F-{i}", "x", 2567) for i in range(60)]
+    rows[3] = (None, "", None)
+    rows[4] = ("F-short",)
+    chunks = list(_iter_xlsx(_Sheet(rows), small_chunks))
+    assert [len(df) for df, _ in chunks] == [49, 10]
+    assert chunks[-1][1] == 1.0
+    first = chunks[0][0]
+    assert list(first.columns) == ["finding_id", "Unnamed: 1", "year"]
+    assert first.iloc[2].tolist() == ["F-short", None, None]
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""pa_core.llm กับ mock server (benchmarks.mock_llm): retry/backoff, เพดานคำขอพร้อมกัน, stream และหลาย stream พร้อมกัน"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("openai")
+
+from benchmarks.mock_llm import SIXW2H_ANSWER
+from pa_core import llm
+from pa_core.llm_cache import cache_key, get_response_cache
+from pa_core.profiling import start_profiler
+from pa_core.prompts import ASSIST_SECTIONS, build_section_messages, parse_section
+
+MESSAGES = [{"role": "user", "content": "สรุป 6W2H ของแผนทดสอบ"}]
+
+def test_retries_transient_errors_then_succeeds(mock_llm):
+    server = mock_llm(error_rate=0.5, seed=7)  # seed นี้: สองคำขอแรกได้ 429 คำขอที่สามสำเร็จ
+    profiler = start_profiler()
+    assert llm.chat("test-key", MESSAGES, use_cache=False) == SIXW2H_ANSWER
+    assert profiler.records[0]["retries"] == server.stats["errors"] == 2
+    assert server.stats["requests"] == 3
+
+def test_gives_up_after_max_retries(mock_llm, monkeypatch):
+    from openai import RateLimitError
+    monkeypatch.setattr(llm, "LLM_MAX_RETRIES", 2)
+    server = mock_llm(error_rate=1.0)
+    with pytest.raises(RateLimitError):
+        llm.chat("test-key", MESSAGES, use_cache=False)
+    assert server.stats["requests"] == 3
+
+def test_does_not_retry_client_errors(mock_llm):
+    from openai import BadRequestError
+    server = mock_llm(error_rate=1.0, error_status=400)
+    with pytest.raises(BadRequestError):
+        llm.chat("test-key", MESSAGES, use_cache=False)
+    assert server.stats["requests"] == 1
+
+def test_semaphore_caps_inflight_requests(mock_llm, monkeypatch):
+    monkeypatch.setattr(llm, "_INFLIGHT", threading.BoundedSemaphore(2))
+    server = mock_llm(latency=0.05, chunk_delay=0.001)
+
+    def one(i):
+        messages = [{"role": "user", "content": f"คำขอที่ {i}"}]
+        if i % 2:
+            return "".join(llm.chat_stream("test-key", messages, use_cache=False))
+        return llm.chat("test-key", messages, use_cache=False)
+
+    with ThreadPoolExecutor(8) as pool:
+        answers = list(pool.map(one, range(8)))
+    assert answers == [SIXW2H_ANSWER] * 8
+    assert server.stats["requests"] == 8
+    assert server.stats["max_inflight"] <= 2
+
+def test_clients_are_reused_per_key_and_endpoint(mock_llm):
+    server = mock_llm()
+    client = llm.get_client("test-key")
+    assert llm.get_client("test-key") is client
+    assert llm.get_client("test-key", server.base_url) is client
+    assert llm.get_client("other-key") is not client
+
+def test_stream_yields_deltas_and_records_ttft(mock_llm):
+    mock_llm(chunk_delay=0.001)
+    profiler = start_profiler()
+    stream = llm.chat_stream("test-key", MESSAGES, use_cache=False)
+    deltas = list(stream)
+    assert len(deltas) > 1
+    assert stream.text == "".join(deltas) == SIXW2H_ANSWER
+    assert stream.ttft_ms is not None and not stream.cached
+    rec = profiler.records[0]
+    assert rec["stage"] == "llm.chat_stream" and rec["chunks"] == len(deltas) and rec["ttft_ms"] == stream.ttft_ms
+
+def _section_requests():
+    return {key: {"messages": build_section_messages("แผนทดสอบ", key)} for key, _ in ASSIST_SECTIONS}
+
+def test_stream_many_keeps_sections_that_succeed(mock_llm):
+    failing, failing_tag = ASSIST_SECTIONS[1]
+    server = mock_llm(chunk_delay=0.001, error_status=400, fail_marker=f"<{failing_tag}>")
+    events = list(llm.stream_many("test-key", _section_requests(), use_cache=False))
+    outcomes = {key: value for key, kind, value in events if kind != "delta"}
+    assert set(outcomes) == {key for key, _ in ASSIST_SECTIONS}
+    assert type(outcomes[failing]).__name__ == "BadRequestError"
+    for key, tag in ASSIST_SECTIONS:
+        if key != failing:
+            assert parse_section(outcomes[key].text, key) == f"ตัวอย่าง{tag}"
+    assert not any(key == failing for key, kind, _ in events if kind == "delta")
+    assert server.stats["requests"] == len(ASSIST_SECTIONS)
+
+def test_stream_many_cancels_when_the_caller_stops(mock_llm):
+    server = mock_llm(chunk_delay=0.05)
+    events = llm.stream_many("test-key", _section_requests())
+    assert next(events)[1] == "delta"
+    started = time.perf_counter()
+    events.close()
+    assert time.perf_counter() - started < 0.5  # ไม่รอให้ stream ที่เหลือจบ
+    # stream ที่ถูกยกเลิกไม่ครบ จึงไม่ถูกบันทึกลงแคช
+    assert get_response_cache().get(
+        cache_key(llm.DEFAULT_MODEL, _section_requests()[ASSIST_SECTIONS[0][0]]["messages"], llm.DEFAULT_PARAMS,
+                  server.base_url, "test-key")) is None
+
+def test_stream_many_stops_on_external_cancel(mock_llm):
+    mock_llm(chunk_delay=0.05)
+    cancel = threading.Event()
+    seen = []
+    for key, kind, _ in llm.stream_many("test-key", _section_requests(), cancel=cancel, use_cache=False):
+        seen.append(kind)
+        cancel.set()
+    assert "done" not in seen
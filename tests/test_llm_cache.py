@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""แคชคำตอบของ LLM บนดิสก์ (pa_core.llm_cache) และการใช้แคชใน pa_core.llm (แยกตาม endpoint และ API key)"""
+import os
+import time
+
+import pytest
+
+from benchmarks.mock_llm import SIXW2H_ANSWER
+from pa_core import llm
+from pa_core.llm_cache import ResponseCache, cache_key, get_response_cache
+
+MESSAGES = [{"role": "user", "content": "สวัสดี"}]
+PARAMS = {"temperature": 0.7, "top_p": 0.9, "max_tokens": 1024}
+
+def test_key_covers_model_messages_params_and_endpoint():
+    key = cache_key("m", MESSAGES, PARAMS, "https://a/v1")
+    assert key == cache_key("m", list(MESSAGES), dict(PARAMS), "https://a/v1/")
+    assert key != cache_key("other", MESSAGES, PARAMS, "https://a/v1")
+    assert key != cache_key("m", [{"role": "user", "content": "ลาก่อน"}], PARAMS, "https://a/v1")
+    assert key != cache_key("m", MESSAGES, dict(PARAMS, temperature=0.2), "https://a/v1")
+    assert key != cache_key("m", MESSAGES, PARAMS, "http://127.0.0.1:8765/v1")
+    assert key != cache_key("m", MESSAGES, PARAMS, "https://a/v1", api_key="other-key")
+    # พารามิเตอร์อื่น (เช่น stream) ไม่มีผลต่อคำตอบที่แคช
+    assert key == cache_key("m", MESSAGES, dict(PARAMS, stream=True), "https://a/v1")
+
+def test_put_get_and_stats(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    key = cache_key("m", MESSAGES, PARAMS)
+    assert cache.get(key) is None
+    cache.put(key, "คำตอบ", "m")
+    assert cache.get(key) == "คำตอบ"
+    assert ResponseCache(str(tmp_path)).get(key) == "คำตอบ"  # อยู่บนดิสก์ ข้าม process ได้
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+def test_corrupt_or_expired_entries_are_misses(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_age_days=1)
+    cache.put("broken", "x")
+    with open(os.path.join(tmp_path, "broken.json"), "w") as f:
+        f.write("{not json")
+    assert cache.get("broken") is None
+    cache.put("old", "x")
+    old = time.time() - 2 * 86400
+    os.utime(os.path.join(tmp_path, "old.json"), (old, old))
+    assert cache.get("old") is None
+    assert cache.evict() == 1
+    assert not os.path.exists(os.path.join(tmp_path, "old.json"))
+
+def test_evicts_least_recently_used_beyond_size_cap(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_mb=0.0025)  # ~2.5 KB: พอสำหรับสองรายการ
+    now = time.time()
+    for i, key in enumerate(["a", "b"]):
+        cache.put(key, "ข" * 300)
+        os.utime(os.path.join(tmp_path, f"{key}.json"), (now - 100 + i, now - 100 + i))
+    assert cache.get("a") is not None  # a ถูกใช้ล่าสุด b จึงเก่าที่สุด
+    cache.put("c", "ข" * 300)
+    assert sorted(os.listdir(tmp_path)) == ["a.json", "c.json"]
+
+def test_cached_answer_skips_the_server(mock_llm):
+    pytest.importorskip("openai")
+    server = mock_llm()
+    assert llm.chat("test-key", MESSAGES) == SIXW2H_ANSWER
+    stream = llm.chat_stream("test-key", MESSAGES)
+    assert "".join(stream) == SIXW2H_ANSWER and stream.cached
+    assert server.stats["requests"] == 1
+    assert get_response_cache().stats()["hits"] == 1
+
+def test_cache_is_per_endpoint(mock_llm):
+    pytest.importorskip("openai")
+    first = mock_llm()
+    llm.chat("test-key", MESSAGES)
+    second = mock_llm()
+    llm.chat("test-key", MESSAGES)
+    assert first.stats["requests"] == second.stats["requests"] == 1
+
+def test_cache_is_per_api_key(mock_llm):
+    pytest.importorskip("openai")
+    server = mock_llm()
+    llm.chat("key-a", MESSAGES)
+    llm.chat("key-b", MESSAGES)
+    llm.chat("key-a", MESSAGES)
+    assert server.stats["requests"] == 2
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_refresh_skips_the_read_but_replaces_the_entry(mock_llm, streaming):
+    pytest.importorskip("openai")
+    server = mock_llm()
+    cache = get_response_cache()
+    key = cache_key(llm.DEFAULT_MODEL, MESSAGES, llm.DEFAULT_PARAMS, server.base_url, "test-key")
+    cache.put(key, "คำตอบเก่า", llm.DEFAULT_MODEL)
+    if streaming:
+        stream = llm.chat_stream("test-key", MESSAGES, refresh=True)
+        assert "".join(stream) == SIXW2H_ANSWER and not stream.cached
+    else:
+        assert llm.chat("test-key", MESSAGES, refresh=True) == SIXW2H_ANSWER
+    assert server.stats["requests"] == 1
+    assert cache.get(key) == SIXW2H_ANSWER
+    assert llm.chat("test-key", MESSAGES) == SIXW2H_ANSWER and server.stats["requests"] == 1
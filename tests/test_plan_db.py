@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""ที่เก็บแผนบน SQLite (pa_core.plan_db): แผน, ตารางของแผนแบบ write-through, คำแนะนำ PA Assist และ connection pool"""
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import pytest
+
+from pa_core.plan_db import ASSIST_KEYS, PlanDB
+from pa_core.plan_store import PLAN_TABLES, PlanTables
+
+@pytest.fixture
+def db_path(isolated_dirs):
+    return str(isolated_dirs / "plan_db" / "plans.sqlite3")
+
+def test_save_and_list_plans(db_path):
+    db = PlanDB(db_path)
+    db.save_plan({"plan_id": "P1", "plan_title": "แผนแรก", "objectives": "ก"})
+    db.save_plan({"plan_id": "P2", "plan_title": "แผนสอง"})
+    db.save_plan({"plan_id": "P1", "plan_title": "แผนแรก (แก้ไข)", "objectives": "ข"})
+    assert db.get_plan("P1") == {"plan_id": "P1", "plan_title": "แผนแรก (แก้ไข)", "objectives": "ข"}
+    assert db.get_plan("ไม่มี") is None
+    assert [p["plan_id"] for p in db.list_plans()] == ["P1", "P2"]
+    assert [p["plan_id"] for p in db.list_plans(limit=1)] == ["P1"]
+
+def test_upsert_row_and_load_rows(db_path):
+    db = PlanDB(db_path)
+    db.upsert_row("risks", {"risk_id": "RSK-001", "plan_id": "P1", "description": "ก", "likelihood": 4})
+    db.upsert_row("risks", {"risk_id": "RSK-002", "plan_id": "P1", "description": "ข"})
+    db.upsert_row("risks", {"risk_id": "RSK-001", "plan_id": "P2", "description": "แผนอื่น"})
+    db.upsert_row("risks", {"risk_id": "RSK-001", "plan_id": "P1", "description": "ก (แก้ไข)", "likelihood": 5})
+    rows = db.load_rows("risks", "P1")
+    # แก้ไขแถวเดิมไม่เปลี่ยนลำดับ คอลัมน์ที่ไม่ได้ส่งเป็น ""
+    assert [r[:3] for r in rows] == [("RSK-001", "P1", "ก (แก้ไข)"), ("RSK-002", "P1", "ข")]
+    assert rows[0][PLAN_TABLES["risks"].columns.index("likelihood")] == 5
+    assert len(rows[1]) == len(PLAN_TABLES["risks"].columns) and rows[1][3] == ""
+    assert db.load_rows("risks", "P3") == []
+
+def test_save_and_load_assist(db_path):
+    db = PlanDB(db_path)
+    db.save_assist("P1", {key: f"ข้อความ {key}" for key in ASSIST_KEYS})
+    db.save_assist("P1", {"gen_report": "รายงานใหม่"})
+    assist = db.load_assist("P1")
+    assert assist["gen_report"] == "รายงานใหม่" and assist["gen_issues"] == "ข้อความ gen_issues"
+    assert db.load_assist("P2") == {}
+
+def test_reopened_database_keeps_plan_tables(db_path):
+    db = PlanDB(db_path)
+    db.save_plan({"plan_id": "P1", "plan_title": "แผน"})
+    tables = PlanTables("P1", db)
+    tables["kpis"].append(plan_id="P1", name="ร้อยละความพึงพอใจ")
+    tables["kpis"].append(plan_id="P1", name="ระยะเวลารอคอย")
+    tables["kpis"].append(kpi_id="KPI-001", plan_id="P1", name="ร้อยละความพึงพอใจ (แก้ไข)")
+    assert tables.save_error is None
+
+    reopened = PlanDB(db_path)  # เหมือนเริ่ม process ใหม่
+    again = PlanTables("P1", reopened)
+    assert again["kpis"].frame()["name"].tolist() == ["ร้อยละความพึงพอใจ (แก้ไข)", "ระยะเวลารอคอย"]
+    assert again["kpis"].append(plan_id="P1", name="ใหม่") == "KPI-003"
+    assert again["risks"].empty
+    assert reopened.get_plan("P1")["plan_title"] == "แผน"
+
+def test_tables_are_read_lazily(db_path):
+    db = PlanDB(db_path)
+    db.upsert_row("methods", {"method_id": "MT-001", "plan_id": "P1", "type": "สัมภาษณ์"})
+    tables = PlanTables("P1", db)
+    assert not tables.tables["methods"].records  # ยังไม่ถูกอ่านจนกว่าจะถูกใช้
+    assert len(tables["methods"]) == 1
+
+def test_connections_use_wal_and_are_pooled(db_path):
+    db = PlanDB(db_path, pool_size=2)
+    with db._connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        first = conn
+    with db._connection() as conn:
+        assert conn is first  # คืนเข้า pool แล้วถูกยืมซ้ำ
+
+def test_pool_caps_connections_under_concurrency(db_path):
+    db = PlanDB(db_path, pool_size=2)
+    inflight, peak, lock = [0], [0], threading.Lock()
+    connection = db._connection
+
+    def counting_connection():
+        cm = connection()
+        conn = cm.__enter__()
+        with lock:
+            inflight[0] += 1
+            peak[0] = max(peak[0], inflight[0])
+        try:
+            yield conn
+        finally:
+            with lock:
+                inflight[0] -= 1
+            cm.__exit__(None, None, None)
+
+    db._connection = contextmanager(counting_connection)
+
+    def write(i):
+        db.upsert_row("audit_issues", {"issue_id": f"ISS-{i:03d}", "plan_id": "P1", "title": f"ประเด็น {i}"})
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(write, range(40)))
+    assert len(db.load_rows("audit_issues", "P1")) == 40
+    assert peak[0] <= 2
+    # connection ทั้งหมดถูกคืนเข้า pool (ไม่เกิน pool_size) และทุก slot ว่าง
+    assert 1 <= db._pool.qsize() <= 2 and db._slots.qsize() == 2
+
+def test_failed_connect_returns_the_slot(db_path):
+    db = PlanDB(db_path, pool_size=1)
+    with db._connection():
+        pass
+    db._pool.get_nowait()  # ทิ้ง connection ที่มีอยู่ให้ต้อง connect ใหม่
+
+    def broken():
+        raise sqlite3.OperationalError("unable to open database file")
+
+    db._connect = broken
+    with pytest.raises(sqlite3.OperationalError):
+        db.get_plan("P1")
+    assert db._slots.qsize() == 1  # slot ถูกคืน การเรียกครั้งต่อไปไม่ค้าง
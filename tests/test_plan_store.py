@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""ตารางของแผนแบบ record store (pa_core.plan_store): ออก ID, upsert, version และ DataFrame ที่สร้างไว้"""
+import sqlite3
+
+import numpy as np
+import pytest
+
+from pa_core.plan_store import PLAN_TABLES, PlanTables, RecordTable
+
+def _risks():
+    return RecordTable("risks", PLAN_TABLES["risks"])
+
+def test_append_allocates_ids_and_fills_missing_columns():
+    table = _risks()
+    assert table.empty and table.version == 0
+    assert table.append(plan_id="P", description="งบล่าช้า", likelihood=4) == "RSK-001"
+    assert table.append(plan_id="P", description="ข้อมูลไม่ครบ") == "RSK-002"
+    assert len(table) == 2 and table.version == 2
+    assert table.records[1] == ("RSK-002", "P", "ข้อมูลไม่ครบ", "", "", "", "", "")
+    with pytest.raises(KeyError):
+        table.append(no_such_column="x")
+    assert len(table) == 2 and table.version == 2
+
+def test_append_with_existing_id_updates_in_place():
+    table = _risks()
+    table.append(description="เดิม")
+    table.append(description="อื่น")
+    version = table.version
+    assert table.append(risk_id="RSK-001", description="แก้ไขแล้ว", impact=5) == "RSK-001"
+    assert [r[0] for r in table.records] == ["RSK-001", "RSK-002"]
+    assert table.frame()["description"].tolist() == ["แก้ไขแล้ว", "อื่น"]
+    assert table.version == version + 1
+    assert table.append(description="ใหม่") == "RSK-003"
+
+def test_explicit_ids_advance_the_counter():
+    table = _risks()
+    table.append(risk_id="RSK-041")
+    assert table.append() == "RSK-042"
+    table.append(risk_id="ภายนอก")  # ID ที่ไม่มีตัวเลขท้ายไม่กระทบตัวนับ
+    assert table.allocate_id() == "RSK-043"
+
+def test_load_keeps_ids_without_callbacks():
+    seen = []
+    table = RecordTable("risks", PLAN_TABLES["risks"], on_append=lambda t, row: seen.append(row))
+    table.load([("RSK-007", "P", "โหลดจาก db", "", 2, 3, "", "")])
+    assert seen == [] and table.version == 1
+    assert table.append(description="ใหม่") == "RSK-008"
+    assert [row["risk_id"] for row in seen] == ["RSK-008"]
+
+def test_frame_is_cached_per_version_and_round_trips():
+    table = _risks()
+    table.append(plan_id="P", description="ก", likelihood="4", impact=5)
+    table.append(plan_id="P", description="ข", likelihood="ไม่ทราบ")
+    df = table.frame()
+    assert table.frame() is df
+    assert list(df.columns) == list(PLAN_TABLES["risks"].columns)
+    assert df["likelihood"].dtype == np.int8 and df["likelihood"].tolist() == [4, 0]
+    # frame -> load ได้ตารางเดิม
+    copy = _risks()
+    copy.load(df.itertuples(index=False, name=None))
+    assert copy.frame().equals(df)
+    table.append(description="ค")
+    assert table.frame() is not df and len(table.frame()) == 3
+
+def test_empty_frame_has_the_table_columns():
+    df = RecordTable("kpis", PLAN_TABLES["kpis"]).frame()
+    assert df.empty and list(df.columns) == list(PLAN_TABLES["kpis"].columns)
+
+def test_plan_tables_version_tracks_every_table():
+    tables = PlanTables("P")
+    before = tables.version
+    assert set(tables.tables) == set(PLAN_TABLES)
+    tables["kpis"].append(plan_id="P", name="ร้อยละความพึงพอใจ")
+    after = tables.version
+    assert after != before and sum(after) == sum(before) + 1
+    assert set(tables.frames("kpis", "risks")) == {"kpis", "risks"}
+
+class _FailingDB:
+    def load_rows(self, table, plan_id):
+        return []
+
+    def upsert_row(self, table, values):
+        raise sqlite3.OperationalError("database is locked")
+
+def test_failed_write_through_keeps_the_row_in_memory():
+    tables = PlanTables("P", _FailingDB())
+    tables["risks"].append(plan_id="P", description="ยังอยู่")
+    assert isinstance(tables.save_error, sqlite3.OperationalError)
+    assert tables["risks"].frame()["description"].tolist() == ["ยังอยู่"]
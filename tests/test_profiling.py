@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""profiler ของ rerun: stage ซ้อนกัน, การส่งต่อ profiler เข้า thread ผ่าน contextvars และการหมุนไฟล์ log"""
+import contextvars
+import json
+import threading
+
+import pytest
+
+from pa_core.profiling import profiled, stage, start_profiler
+
+def test_nested_stages_record_depth_and_tags():
+    profiler = start_profiler()
+    with stage("outer", rows=3) as rec:
+        rec["source"] = "disk"
+        with stage("inner"):
+            pass
+    with stage("next"):
+        pass
+    assert [(r["stage"], r["depth"]) for r in profiler.records] == [("outer", 0), ("inner", 1), ("next", 0)]
+    outer = profiler.records[0]
+    assert outer["rows"] == 3 and outer["source"] == "disk"
+    assert outer["ms"] >= profiler.records[1]["ms"]
+
+def test_errors_are_tagged_and_reraised():
+    profiler = start_profiler()
+    with pytest.raises(KeyError):
+        with stage("fails"):
+            raise KeyError("x")
+    assert profiler.records[0]["error"] == "KeyError" and "ms" in profiler.records[0]
+
+def test_profiled_decorator_uses_the_active_profiler():
+    @profiled("work")
+    def work(x):
+        return x * 2
+
+    profiler = start_profiler()
+    assert work(2) == 4
+    assert [r["stage"] for r in profiler.records] == ["work"]
+
+def test_stage_without_profiler_is_a_no_op():
+    def run():
+        with stage("idle", rows=1) as rec:
+            rec["extra"] = True
+        return rec
+    assert contextvars.Context().run(run) == {"rows": 1, "extra": True}
+
+def test_copied_context_reaches_worker_threads():
+    profiler = start_profiler()
+
+    def work(i):
+        with stage("worker", i=i):
+            with stage("worker.inner"):
+                pass
+
+    with stage("parent"):
+        threads = [threading.Thread(target=contextvars.copy_context().run, args=(work, i)) for i in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        # thread ที่ไม่ได้คัดลอก context ไม่เห็น profiler ของ rerun นี้
+        bare = threading.Thread(target=work, args=(99,))
+        bare.start()
+        bare.join()
+    workers = [r for r in profiler.records if r["stage"] == "worker"]
+    assert sorted(r["i"] for r in workers) == [0, 1, 2]
+    # depth นับแยกต่อ thread: stage ใน thread ใหม่เริ่มที่ 0 แม้ parent จะยังเปิดอยู่
+    assert {r["depth"] for r in workers} == {0}
+    assert {r["depth"] for r in profiler.records if r["stage"] == "worker.inner"} == {1}
+
+def test_write_log_appends_and_rotates(tmp_path):
+    path = str(tmp_path / "logs" / "reruns.jsonl")
+    profiler = start_profiler()
+    with stage("load"):
+        pass
+    summary = profiler.write_log(path, max_bytes=10_000, page="plan")
+    profiler.write_log(path, max_bytes=10_000)
+    with open(path, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert len(lines) == 2 and lines[0]["page"] == "plan"
+    assert lines[0]["stages"][0]["stage"] == "load" == summary["stages"][0]["stage"]
+    # ไฟล์ใหญ่เกิน max_bytes -> ย้ายเป็น .1 แล้วเริ่มไฟล์ใหม่ (เก็บไว้รุ่นเดียว)
+    profiler.write_log(path, max_bytes=10)
+    with open(path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 1
+    with open(path + ".1", encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
+    profiler.write_log(path, max_bytes=10)
+    with open(path + ".1", encoding="utf-8") as f:
+        assert len(f.readlines()) == 1
+
+def test_empty_log_path_only_returns_the_summary(tmp_path):
+    profiler = start_profiler()
+    summary = profiler.write_log("", run=1)
+    assert summary["run"] == 1 and summary["stages"] == []
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""การแยกคำตอบของ LLM: 6W2H และสามส่วนของ PA Assist ทั้งแบบข้อความเต็มและระหว่าง stream"""
+from benchmarks.mock_llm import ASSIST_ANSWER, SIXW2H_ANSWER
+from pa_core.prompts import (
+    ASSIST_SECTIONS, AssistStreamParser, extract_section, parse_6w2h, parse_assist_sections, parse_section,
+)
+
+TAGS = dict(ASSIST_SECTIONS)
+
+def _feed_all(parser, chunks):
+    changed = []
+    for chunk in chunks:
+        changed.extend(parser.feed(chunk))
+    return changed
+
+def test_parse_6w2h_keys():
+    out = parse_6w2h(SIXW2H_ANSWER + "\nหมายเหตุ: ไม่ใช่คีย์")
+    assert out["how_much"] == "10 ล้านบาท"
+    assert out["who"] == "หน่วยรับตรวจ"
+    assert set(out) == {"who", "whom", "what", "where", "when", "why", "how", "how_much"}
+
+def test_extract_section_open_closed_and_missing():
+    tag = TAGS["gen_issues"]
+    assert extract_section(f"ก่อน <{tag}>\n ข้อความ \n</{tag}> หลัง", tag) == "ข้อความ"
+    assert extract_section(f"<{tag}>ยังไม่จบ", tag) == "ยังไม่จบ"
+    assert extract_section("ไม่มีแท็ก", tag) == ""
+
+def test_stream_parser_matches_full_parse_one_char_at_a_time():
+    parser = AssistStreamParser()
+    changed = _feed_all(parser, ASSIST_ANSWER)
+    assert parser.sections == parse_assist_sections(ASSIST_ANSWER)
+    assert parser.complete == set(TAGS)
+    assert set(changed) == set(TAGS)
+
+def test_stream_parser_tags_split_across_chunks():
+    tag = TAGS["gen_findings"]
+    parser = AssistStreamParser()
+    assert parser.feed(f"<{tag[:4]}") == []
+    assert parser.feed(f"{tag[4:]}>\nพบความล่าช้า") == ["gen_findings"]
+    assert parser.sections["gen_findings"] == "พบความล่าช้า"
+    # แท็กปิดมาครึ่งเดียว: ยังไม่แสดงส่วนที่เป็นแท็ก และยังไม่นับว่าจบ
+    parser.feed(f"\n</{tag[:3]}")
+    assert parser.sections["gen_findings"] == "พบความล่าช้า"
+    assert "gen_findings" not in parser.complete
+    assert parser.feed(f"{tag[3:]}>") == ["gen_findings"]
+    assert parser.complete == {"gen_findings"}
+    # ส่วนที่จบแล้วไม่เปลี่ยนอีก แม้มีข้อความตามมา
+    assert parser.feed("ข้อความท้าย") == []
+
+def test_stream_parser_missing_closing_tags():
+    issues, report = TAGS["gen_issues"], TAGS["gen_report"]
+    parser = AssistStreamParser()
+    _feed_all(parser, [f"<{issues}>\nประเด็น 1", f"\n<{report}>\nร่างรายงาน"])
+    assert parser.complete == set()
+    assert parser.sections["gen_report"] == "ร่างรายงาน"
+    # ไม่มีแท็กปิด ส่วนก่อนหน้าจึงกินถึงท้ายข้อความ (เหมือน parse_assist_sections กับคำตอบที่ถูกตัด)
+    assert parser.sections["gen_issues"].startswith("ประเด็น 1")
+    assert parser.sections == parse_assist_sections(parser.text)
+
+def test_untagged_output():
+    text = "คำตอบที่ไม่มีแท็กเลย <ไม่ใช่แท็กของเรา>"
+    parser = AssistStreamParser()
+    assert _feed_all(parser, [text[:10], text[10:]]) == []
+    assert parser.sections == {key: "" for key in TAGS}
+    # โหมดแยกส่วน: ไม่มีแท็กใช้ทั้งคำตอบ
+    assert parse_section(" " + text + "\n", "gen_report") == text
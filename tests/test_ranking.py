@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""การจัดอันดับ: top-k, priors, การค้นหาหลายคำค้นในครั้งเดียว, engine ซ้อนแถวของ session (overlay)
+และการค้นหาเฉพาะแถวที่ผ่านตัวกรอง (rows)"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import make_queries
+from pa_core.findings import compact_findings, overlay_findings
+from pa_core.ranking import OverlayRankingEngine, build_ranking_engine, compute_priors, top_k_indices
+
+BACKENDS = ["sparse", "lsa"]
+MARKER = "ตรวจพบเครื่องสูบน้ำพลังงานแสงอาทิตย์ชำรุด"
+
+def _view(library):
+    """upload ที่แก้ไข 15 แถวแรกของ base (ข้อความมี MARKER) และเพิ่มแถวใหม่ 5 แถว"""
+    edited = library.iloc[:15].copy()
+    edited["recommendation"] = MARKER
+    new = library.iloc[:5].copy()
+    new["finding_id"] = "N-" + new["finding_id"].astype(str)
+    upload = compact_findings(pd.concat([edited, new], ignore_index=True))
+    view, _ = overlay_findings(library, upload, base_version="base")
+    return view
+
+def test_top_k_indices_sorted_and_skips_non_finite():
+    scores = np.array([0.2, -np.inf, 0.9, 0.5, -np.inf, 0.1])
+    assert top_k_indices(scores, 3).tolist() == [2, 3, 0]
+    assert top_k_indices(scores, 100).tolist() == [2, 3, 0, 5]
+    assert top_k_indices(scores, 0).tolist() == []
+
+def test_priors_scale_severity_and_recency(library):
+    priors = compute_priors(library)
+    np.testing.assert_allclose(priors["severity"], library["severity"].to_numpy() / 5, rtol=1e-6)
+    assert priors["recency"].min() == 0.0 and priors["recency"].max() == 1.0
+    newest = library["year"].to_numpy() == library["year"].max()
+    assert (priors["recency"][newest] == 1.0).all()
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_search_matches_full_sort(library, backend):
+    engine = build_ranking_engine(library, backend=backend)
+    for query in make_queries(library, 5)[0]:
+        scores = engine.blend(engine.similarities(query))
+        expected = np.argsort(-scores, kind="stable")[:8]
+        got = engine.search(query, top_k=8)
+        # argpartition + เรียงเฉพาะผู้ชนะ ได้คะแนนชุดเดียวกับการเรียงทั้งตาราง (แถวที่คะแนนเท่ากันอาจสลับกันได้)
+        np.testing.assert_allclose(got["score"], scores[expected], rtol=1e-6)
+        np.testing.assert_allclose(scores[got.index], got["score"], rtol=1e-6)
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_search_batch_matches_single_searches(library, backend):
+    engine = build_ranking_engine(library, backend=backend)
+    texts, _ = make_queries(library, 4)
+    queries = pd.DataFrame({"query_id": range(4), "source": "KPI", "text": texts})
+    batch = engine.search_batch(queries, top_k=3)
+    assert batch.groupby("query_id")["rank"].apply(list).tolist() == [[1, 2, 3]] * 4
+    for i, text in enumerate(texts):
+        single = engine.search(text, top_k=3)
+        assert batch[batch["query_id"] == i]["finding_id"].tolist() == single["finding_id"].tolist()
+
+def test_search_batch_dedupe_recommends_each_finding_once(library):
+    engine = build_ranking_engine(library)
+    text = make_queries(library, 1)[0][0]
+    queries = pd.DataFrame({"query_id": [1, 2], "source": "Risk", "text": [text, text]})
+    plain = engine.search_batch(queries, top_k=3)
+    deduped = engine.search_batch(queries, top_k=3, dedupe=True)
+    assert plain[plain["query_id"] == 1]["finding_id"].tolist() == plain[plain["query_id"] == 2]["finding_id"].tolist()
+    assert deduped["finding_id"].is_unique and len(deduped) == 6
+
+def test_overlay_engine_uses_session_rows(library):
+    # MARKER ไม่อยู่ในคำศัพท์ของ base จึงตรวจได้เฉพาะ backend แบบ sparse (LSA ฉายคำที่ไม่รู้จักเป็นศูนย์)
+    view = _view(library)
+    engine = build_ranking_engine(view)
+    assert isinstance(engine, OverlayRankingEngine) and len(engine) == len(view)
+    top = engine.search(MARKER, top_k=15)
+    assert top["recommendation"].eq(MARKER).all()
+    assert set(top["finding_id"]) == set(library["finding_id"].iloc[:15])
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_overlay_never_returns_replaced_rows(library, backend):
+    view = _view(library)
+    engine = build_ranking_engine(view, backend=backend)
+    results = engine.search(MARKER, top_k=len(view) + 50)
+    assert len(results) == len(view)
+    assert results["finding_id"].is_unique
+    assert np.isfinite(results["score"]).all()
+    # ตำแหน่งที่ขอรวมแถวที่ถูกแทนที่ (เช่น จากตัวกรอง) ก็ยังไม่ถูกคืน
+    rows = np.arange(len(view.base) + len(view.rows))
+    filtered = engine.search(MARKER, top_k=len(rows), rows=rows)
+    assert len(filtered) == len(view) and filtered["finding_id"].is_unique
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_upload_without_base_library(library, backend):
+    # regression: ไม่มี FindingsLibrary.csv -> base เป็น DataFrame() เปล่า ไม่มีคอลัมน์
+    upload = library.iloc[:40].reset_index(drop=True)
+    upload["issue_title"] = upload["issue_title"].astype(str).where(upload.index != 7, MARKER)
+    view, report = overlay_findings(pd.DataFrame(), upload)
+    assert report.added == 40
+    engine = build_ranking_engine(view, backend=backend, version="upload-only")
+    results = engine.search(MARKER, top_k=5, weights={"sim": 1.0, "severity": 0.0, "recency": 0.0})
+    assert len(results) == 5 and np.isfinite(results["score"]).all()
+    assert results["finding_id"].iat[0] == upload["finding_id"].iat[7]
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_search_on_rows_equals_filtered_full_search(library, backend):
+    engine = build_ranking_engine(library, backend=backend)
+    rows = np.flatnonzero(library["severity"].to_numpy() >= 4)
+    queries, _ = make_queries(library, 5)
+    for query in queries:
+        full = engine.search(query, top_k=len(library))
+        expected = full[full.index.isin(rows)].head(8)
+        got = engine.search(query, top_k=8, rows=rows)
+        assert got["finding_id"].tolist() == expected["finding_id"].tolist()
+        np.testing.assert_allclose(got["score"], expected["score"], rtol=1e-5)
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_overlay_reuses_cached_base_engine(library, backend):
+    view = _view(library)
+    base = build_ranking_engine(library, backend=backend, version="base")
+    engine = build_ranking_engine(view, backend=backend, base_engine=base)
+    assert engine.base is base
+    expected = build_ranking_engine(view, backend=backend).search(MARKER, top_k=10)
+    assert engine.search(MARKER, top_k=10)["finding_id"].tolist() == expected["finding_id"].tolist()
+
+def test_lsa_embed_matches_dense_projection(library):
+    from sklearn.preprocessing import normalize
+    engine = build_ranking_engine(library, backend="lsa")
+    texts = make_queries(library, 4)[0] + [MARKER]
+    qv = engine.vec.transform(texts).tocsr()[:, engine.active_cols]
+    expected = normalize(qv.toarray() @ engine.components.T.astype(np.float64))
+    np.testing.assert_allclose(engine.embed(texts), expected, atol=1e-5)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""แคชผลการค้นหา top-k (pa_core.search_cache)"""
+import numpy as np
+import pandas as pd
+
+from pa_core.search_cache import SearchCache, normalize_query, search_key
+
+class CountingEngine:
+    """engine ปลอมที่นับจำนวนครั้งที่ถูกค้นหาจริง"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def search(self, query_text, top_k=8, weights=None, rows=None):
+        self.calls += 1
+        return pd.DataFrame({"finding_id": [f"{query_text}-{i}" for i in range(top_k)], "score": np.arange(top_k, 0, -1)})
+
+def test_key_normalizes_query_and_fills_default_weights():
+    assert normalize_query("  การจัดซื้อ \n\t ล่าช้า ") == "การจัดซื้อ ล่าช้า"
+    key = search_key("v1", "การจัดซื้อ  ล่าช้า", 8)
+    assert key == search_key("v1", " การจัดซื้อ ล่าช้า\n", 8, weights={"sim": 0.65})
+    assert key != search_key("v2", "การจัดซื้อ ล่าช้า", 8)
+    assert key != search_key("v1", "การจัดซื้อ ล่าช้า", 5)
+    assert key != search_key("v1", "การจัดซื้อ ล่าช้า", 8, weights={"sim": 0.5})
+
+def test_key_uses_filter_values_or_rows():
+    a = search_key("v", "q", 8, filters={"unit": ["ก", "ข"], "year": []})
+    assert a == search_key("v", "q", 8, filters={"unit": ["ข", "ก"]})
+    assert a != search_key("v", "q", 8, filters={"unit": ["ก"]})
+    rows = np.array([1, 5, 9])
+    assert search_key("v", "q", 8, rows=rows) == search_key("v", "q", 8, rows=rows.copy())
+    assert search_key("v", "q", 8, rows=rows) != search_key("v", "q", 8, rows=rows[:2])
+
+def test_search_hits_after_first_call():
+    cache, engine = SearchCache(), CountingEngine()
+    first, hit = cache.search(engine, "คำค้น", top_k=3, version="v1")
+    assert not hit
+    again, hit = cache.search(engine, " คำค้น ", top_k=3, version="v1")
+    assert hit and engine.calls == 1
+    pd.testing.assert_frame_equal(first, again)
+    # ผลที่คืนเป็นสำเนา แก้แล้วไม่กระทบรายการในแคช
+    again.loc[0, "finding_id"] = "แก้ไข"
+    assert cache.search(engine, "คำค้น", top_k=3, version="v1")[0]["finding_id"].iat[0] == "คำค้น-0"
+    cache.search(engine, "คำค้น", top_k=3, version="v2")
+    assert engine.calls == 2
+    assert cache.stats() == {"hits": 2, "misses": 2, "hit_rate": 0.5, "entries": 2, "evictions": 0}
+
+def test_lru_eviction():
+    cache, engine = SearchCache(max_entries=2), CountingEngine()
+    for q in ["a", "b"]:
+        cache.search(engine, q, version="v")
+    cache.search(engine, "a", version="v")  # a ใช้ล่าสุด
+    cache.search(engine, "c", version="v")  # b ถูกนำออก
+    assert len(cache) == 2 and cache.stats()["evictions"] == 1
+    assert cache.search(engine, "a", version="v")[1]
+    assert not cache.search(engine, "b", version="v")[1]
+
+def test_no_version_or_disabled_bypasses_cache():
+    engine = CountingEngine()
+    cache = SearchCache()
+    cache.search(engine, "q", version=None)
+    cache.search(engine, "q", version=None)
+    disabled = SearchCache(max_entries=0)
+    disabled.search(engine, "q", version="v")
+    disabled.search(engine, "q", version="v")
+    assert engine.calls == 4 and len(cache) == 0 and len(disabled) == 0